@@ -0,0 +1,280 @@
+"""
+replay recorded orders and contract valuations against candidate thresholds, run from the repo root with
+    python backtest.py --snapshots ./logs/snapshots.jsonl.gz
+    python backtest.py --steps 0.8,1,1.2 --arbitrage 0.4,0.5 --special 0.8,0.9 --min-value 50000000,100000000
+record with RECORD_SNAPSHOTS enabled, every run under --snapshots is streamed through once for orders and once
+for contracts, recordings are sorted once per grid and each setting is a bisect into them
+"""
+
+import argparse
+import bisect
+import dataclasses
+import itertools
+import statistics
+import sys
+from typing import Iterable
+
+from eve_monitor import snapshots
+from eve_monitor.config import settings
+from eve_monitor.contract_sniper import (
+    ARBITRAGE_THRESHOLD,
+    MIN_VALUE_THRESHOLD,
+    SPECIAL_THRESHOLD,
+)
+from eve_monitor.market_monitor import load_targets
+
+DAY = 24 * 60 * 60
+# multiples of each target's threshold
+DEFAULT_STEPS = (0.5, 0.75, 0.9, 1.0, 1.1, 1.25, 1.5)
+DEFAULT_TOP = 10
+
+
+@dataclasses.dataclass
+class Outcome:
+    setting: tuple
+    alerts: int
+    profit: float  # estimated, isk
+    per_day: float  # alerts
+
+
+class Curve:
+    """items sorted by key with prefix sums of their profit, tells how many have a key up to x and their profit"""
+
+    def __init__(self, items: list[tuple[float, float]], presorted: bool = False):
+        if not presorted:
+            items = sorted(items)
+        self.keys = [key for key, _ in items]
+        self.profits = [0.0, *itertools.accumulate(profit for _, profit in items)]
+        return
+
+    def upto(self, x: float) -> tuple[int, float]:
+        i = bisect.bisect_right(self.keys, x)
+        return i, self.profits[i]
+
+
+@dataclasses.dataclass
+class Span:
+    """how many records were read and when the first and last were recorded"""
+
+    count: int = 0
+    first: float = 0.0
+    last: float = 0.0
+
+    def add(self, record: dict):
+        if self.count == 0:
+            self.first = record["at"]
+        self.last = record["at"]
+        self.count += 1
+        return
+
+    @property
+    def days(self) -> float:
+        return (self.last - self.first) / DAY
+
+
+def per_day(alerts: int, days: float) -> float:
+    return alerts / days if days else float(alerts)
+
+
+def market_orders(
+    records: Iterable[dict], span: Span
+) -> tuple[dict[int, dict[int, tuple[float, int]]], dict[int, list[float]]]:
+    """
+    type_id -> order_id -> (lowest price recorded, volume left at it),
+    and type_id -> lowest price of every snapshot, across regions
+    """
+    orders: dict[int, dict[int, tuple[float, int]]] = {}
+    best_asks: dict[int, list[float]] = {}
+    for record in records:
+        span.add(record)
+        if record["kind"] != snapshots.ORDERS or not record["orders"]:
+            continue
+        type_id = record["type_id"]
+        seen = orders.setdefault(type_id, {})
+        for order_id, price, volume in record["orders"]:
+            if order_id not in seen or price < seen[order_id][0]:
+                seen[order_id] = (price, volume)
+        best_asks.setdefault(type_id, []).append(
+            min(price for _, price, _ in record["orders"])
+        )
+    return orders, best_asks
+
+
+def backtest_market(
+    records: Iterable[dict],
+    targets: list[dict],
+    steps: list[float],
+    span: Span | None = None,
+) -> dict[int, list[Outcome]]:
+    """
+    type_id -> outcome of each step times its threshold, an order is notified once it is listed at or under threshold,
+    its profit is buying what was left at its lowest price and selling at the median lowest price of the snapshots,
+    records are read once, span is filled in with what they cover
+    """
+    span = span if span is not None else Span()
+    orders, best_asks = market_orders(records, span)
+    days = span.days
+    outcomes = {}
+    for target in targets:
+        type_id = target["type_id"]
+        if target.get("ignored", False) or type_id not in orders:
+            continue
+        reference = statistics.median(best_asks[type_id])
+        curve = Curve(
+            [
+                (price, (reference - price) * volume)
+                for price, volume in orders[type_id].values()
+            ]
+        )
+        outcomes[type_id] = []
+        for step in steps:
+            threshold = target["threshold"] * step
+            alerts, profit = curve.upto(threshold)
+            outcomes[type_id].append(
+                Outcome((threshold,), alerts, profit, per_day(alerts, days))
+            )
+    return outcomes
+
+
+class ContractGrid:
+    """
+    a contract is notified when sold * arbitrage >= price + requested and value >= min_value,
+    or it has an item of interest and sold * special >= price + requested, as in ContractSniper.watch_contract,
+    with ratio = (price + requested) / sold that is ratio <= arbitrage, or ratio <= special for contracts of interest,
+    notified contracts are counted as the union of both, profit is value - price
+    """
+
+    def __init__(self, contracts: list[dict], min_values: list[float]):
+        # (ratio, profit, value, of interest), sorted once so every curve is a slice of it
+        rows = sorted(
+            (
+                (c["price"] + c["requested"]) / c["sold"],
+                c["sold"] - c["requested"] - c["price"],
+                c["sold"] - c["requested"],
+                bool(c["of_interest"]),
+            )
+            for c in contracts
+            if c["sold"] > 0
+        )
+        self.min_values = sorted(min_values)
+        # bucket k holds contracts worth at least the k-th min_value but under the next one,
+        # split into those without and with an item of interest
+        buckets: list[tuple[list, list]] = [
+            ([], []) for _ in range(len(self.min_values) + 1)
+        ]
+        interest = []
+        for r, p, v, i in rows:
+            buckets[bisect.bisect_right(self.min_values, v)][i].append((r, p))
+            if i:
+                interest.append((r, p))
+        self.buckets = [
+            (Curve(others, True), Curve(of_interest, True))
+            for others, of_interest in buckets
+        ]
+        self.interest = Curve(interest, True)
+        return
+
+    def evaluate(
+        self, arbitrage: float, special: float, min_value: float
+    ) -> tuple[int, float]:
+        """(contracts notified, their profit), min_value is one of those the grid was built with"""
+        n, profit = self.interest.upto(special)
+        for others, of_interest in self.buckets[
+            bisect.bisect_left(self.min_values, min_value) + 1 :
+        ]:
+            # worth min_value, contracts of interest under special are already counted
+            n_others, profit_others = others.upto(arbitrage)
+            n_interest, profit_interest = of_interest.upto(arbitrage)
+            n_both, profit_both = of_interest.upto(min(arbitrage, special))
+            n += n_others + n_interest - n_both
+            profit += profit_others + profit_interest - profit_both
+        return n, profit
+
+
+def backtest_contracts(
+    records: Iterable[dict],
+    arbitrage: list[float],
+    special: list[float],
+    min_values: list[float],
+) -> list[Outcome]:
+    """outcome of every (arbitrage, special, min_value), most profitable first, records are read once"""
+    span = Span()
+    # a contract is valued once, later records of it are from another run
+    contracts = {}
+    for record in records:
+        span.add(record)
+        if record["kind"] == snapshots.CONTRACT:
+            contracts[record["contract_id"]] = record
+    grid = ContractGrid(list(contracts.values()), min_values)
+    days = span.days
+    outcomes = []
+    for setting in itertools.product(arbitrage, special, min_values):
+        alerts, profit = grid.evaluate(*setting)
+        outcomes.append(Outcome(setting, alerts, profit, per_day(alerts, days)))
+    return sorted(outcomes, key=lambda o: o.profit, reverse=True)
+
+
+def floats(value: str) -> list[float]:
+    return [float(v) for v in value.split(",")]
+
+
+def parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--snapshots", help="defaults to SNAPSHOT_FILE")
+    parser.add_argument(
+        "--steps",
+        type=floats,
+        default=list(DEFAULT_STEPS),
+        help="multiples of each market target's threshold",
+    )
+    parser.add_argument(
+        "--arbitrage", type=floats, default=[0.3, 0.4, ARBITRAGE_THRESHOLD, 0.6]
+    )
+    parser.add_argument(
+        "--special", type=floats, default=[0.7, SPECIAL_THRESHOLD, 0.9, 1.0]
+    )
+    parser.add_argument(
+        "--min-value",
+        type=floats,
+        default=[MIN_VALUE_THRESHOLD / 2, MIN_VALUE_THRESHOLD, MIN_VALUE_THRESHOLD * 2],
+    )
+    parser.add_argument(
+        "--top", type=int, default=DEFAULT_TOP, help="contract settings shown"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    path = args.snapshots or settings.snapshot_file
+    targets = load_targets()
+    names = {t["type_id"]: t["name"] for t in targets}
+    span = Span()
+    market = backtest_market(snapshots.read(path), targets, args.steps, span)
+    print(f"{span.count} records over {span.days:.1f} days from {path}")
+    for type_id, outcomes in market.items():
+        print(f"\n{names[type_id]} ({type_id})")
+        for o in outcomes:
+            print(
+                f"\tthreshold {o.setting[0]:>15,.0f} alerts {o.alerts:>6} ({o.per_day:.1f}/day)"
+                + f" profit {o.profit:>18,.0f}"
+            )
+
+    outcomes = backtest_contracts(
+        snapshots.read(path), args.arbitrage, args.special, args.min_value
+    )
+    if outcomes:
+        print("\ncontracts, arbitrage special min_value")
+    current = (ARBITRAGE_THRESHOLD, SPECIAL_THRESHOLD, MIN_VALUE_THRESHOLD)
+    for o in outcomes[: args.top]:
+        arbitrage, special, min_value = o.setting
+        print(
+            f"\t{arbitrage:.2f} {special:.2f} {min_value:>15,.0f} alerts {o.alerts:>6} ({o.per_day:.1f}/day)"
+            + f" profit {o.profit:>18,.0f}"
+            + (" (current)" if o.setting == current else "")
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""
+per contract logging cost on the feature thread, run from the repo root with
+    python -m benchmarks.bench_logging --contracts 20000
+before builds contract details eagerly and writes log files on the calling thread,
+after logs lazy messages through the queue and listener set up by tasks.config_logging
+"""
+
+import argparse
+import logging
+import logging.handlers
+import os
+import sys
+import tempfile
+import time
+
+import requests
+
+from eve_monitor import log_queue
+from eve_monitor.contract_sniper import ContractSniper
+from eve_monitor.log_queue import LazyMessage
+
+from .synthetic import SyntheticUniverse
+
+LOG_FORMAT = "%(asctime)s %(name)15s %(levelname)s\t%(message)s"
+BEFORE = "before"
+AFTER = "after"
+
+
+def file_handlers(directory: str) -> list[logging.Handler]:
+    """main and error log files, like tasks.config_logging"""
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers: list[logging.Handler] = [
+        logging.handlers.RotatingFileHandler(
+            os.path.join(directory, name), "a+", 10 * 1024 * 1024, 1, "utf-8"
+        )
+        for name in ("main.log", "error.log")
+    ]
+    handlers[1].setLevel(logging.WARNING)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def prepare(universe: SyntheticUniverse, n: int) -> list[tuple[dict, str, float]]:
+    """contracts with their item list and value, as watch_contract has them before logging"""
+    prepared = []
+    for contract in universe.contracts(n):
+        items = universe.contract_items(contract["contract_id"])
+        sold = "\n".join(
+            f"Type {item['type_id']}\t{item['quantity']}"
+            for item in items
+            if item["is_included"]
+        )
+        prepared.append(
+            (contract, sold, universe.contract_value(contract["contract_id"]))
+        )
+    return prepared
+
+
+def run(
+    mode: str,
+    sniper: ContractSniper,
+    log: logging.Logger,
+    contracts: list[tuple[dict, str, float]],
+    info_every: int,
+) -> float:
+    """seconds spent logging on this thread for every contract, the hot path of watch_contract"""
+    location = ("Station", "System", 0.9, " (3 jumps)", "Region")
+    start = time.perf_counter()
+    for i, (contract, sold, value) in enumerate(contracts):
+        contract_id, title = contract["contract_id"], contract["title"]
+        if mode == BEFORE:
+            log.debug(f"Processing contract {contract_id} {title}")
+            msg = sniper.describe_contract(
+                contract, value, location, sold, value, "", 0.0
+            )
+            log.debug(msg)
+        else:
+            log.debug("Processing contract %s %s", contract_id, title)
+            log.debug(
+                LazyMessage(
+                    sniper.describe_contract,
+                    contract,
+                    value,
+                    location,
+                    sold,
+                    value,
+                    "",
+                    0.0,
+                )
+            )
+        if info_every and i % info_every == 0:
+            log.info("Found item of interest %s in contract %s", 34, contract_id)
+    return time.perf_counter() - start
+
+
+def measure(
+    mode: str, contracts: list, info_every: int, directory: str
+) -> tuple[float, float]:
+    """(seconds on the logging thread, seconds until every record is written)"""
+    log = logging.getLogger(f"bench.{mode}")
+    log.propagate = False
+    log.setLevel(logging.INFO)
+    handlers = file_handlers(os.path.join(directory, mode))
+    if mode == BEFORE:
+        for handler in handlers:
+            log.addHandler(handler)
+    else:
+        log_queue.attach(log, handlers)
+    sniper = ContractSniper({}, requests.Session())
+    start = time.perf_counter()
+    elapsed = run(mode, sniper, log, contracts, info_every)
+    log_queue.stop()
+    for handler in handlers:
+        handler.close()
+    return elapsed, time.perf_counter() - start
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--contracts", type=int, default=20_000)
+    parser.add_argument(
+        "--info-every", type=int, default=10, help="one info record per n contracts"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    contracts = prepare(SyntheticUniverse(seed=args.seed), args.contracts)
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in (BEFORE, AFTER):
+            os.makedirs(os.path.join(directory, mode))
+            elapsed, written = measure(mode, contracts, args.info_every, directory)
+            print(
+                f"{mode:7} {elapsed / len(contracts) * 1e6:7.2f} us per contract on the feature thread"
+                + f", {written:.2f}s until written"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+import dataclasses
+import hashlib
+import json
+import re
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from .synthetic import (
+    FIRST_ORDER_ID,
+    FIRST_REGION_ID,
+    FIRST_TYPE_ID,
+    SyntheticUniverse,
+    fake_types,
+)
+
+PAGE_SIZE = 1000
+ORDERS_PER_KEY = 1000  # order ids reserved per type and region
+APPRAISAL_NAME = re.compile(r"^Type (\d+)$")
+
+
+@dataclasses.dataclass
+class FakeEsiConfig:
+    """shape of the fake universe and how badly the server behaves"""
+
+    regions: int = 70
+    types: int = 100
+    orders_per_type: int = 20  # per region
+    contracts: int = 20_000  # spread over all regions
+    systems: int = 50
+    stations: int = 50
+    latency: float = 0.0  # seconds added to every response
+    expires: int = 300  # seconds in Expires header
+    error_every: int = 0  # start a burst of 503 every n requests, 0 to disable
+    error_burst: int = 3
+    seed: int = 0
+
+
+class FakeEsi:
+    """
+    deterministic stand in for the parts of ESI and the appraisal api used by the features,
+    pages with X-Pages, answers If-None-Match with 304 and sets Expires, like ESI does
+    orders, contracts and appraisals come from a synthetic universe of the fake static data
+    """
+
+    def __init__(
+        self,
+        config: FakeEsiConfig | None = None,
+        universe: SyntheticUniverse | None = None,
+    ):
+        self.config = config or FakeEsiConfig()
+        self.universe = universe or SyntheticUniverse(
+            fake_types(self.config.types),
+            self.config.seed,
+            self.config.regions,
+            self.config.systems,
+            self.config.stations,
+        )
+        self.requests = 0
+        self.not_modified = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+        self.burst_left = 0
+        self.contract_pages = self.build_contracts()
+        # (region_id, order_type) -> orders of every type, built once as clients page through them
+        self.bulk_orders: dict[tuple[int, str], list[dict]] = {}
+        self.routes = [
+            (re.compile(r"/markets/(\d+)/orders/$"), self.market_orders),
+            (re.compile(r"/contracts/public/items/(\d+)$"), self.contract_items),
+            (re.compile(r"/contracts/public/(\d+)$"), self.public_contracts),
+            (re.compile(r"/characters/(\d+)/$"), self.character),
+            (re.compile(r"/universe/regions/$"), self.regions),
+            (re.compile(r"/universe/regions/(\d+)/$"), self.region),
+        ]
+        self.server: ThreadingHTTPServer | None = None
+        return
+
+    @property
+    def region_ids(self) -> list[int]:
+        return list(range(FIRST_REGION_ID, FIRST_REGION_ID + self.config.regions))
+
+    @property
+    def type_ids(self) -> list[int]:
+        return self.universe.type_ids
+
+    @property
+    def url(self) -> str:
+        assert self.server, "server not started"
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def esi_url(self) -> str:
+        return self.url + "/latest"
+
+    @property
+    def appraisal_url(self) -> str:
+        return self.url + "/appraisal"
+
+    def start(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        return
+
+    def handler(self) -> type[BaseHTTPRequestHandler]:
+        esi = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep alive, so connection reuse by the client is measured too
+            protocol_version = "HTTP/1.1"
+            # headers and body are written separately, avoid waiting on delayed acks
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                esi.handle(self, "GET")
+                return
+
+            def do_POST(self):
+                esi.handle(self, "POST")
+                return
+
+            def log_message(self, *_):
+                return
+
+        return Handler
+
+    def handle(self, req: BaseHTTPRequestHandler, method: str):
+        url = urlparse(req.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        body = b""
+        if "Content-Length" in req.headers:
+            body = req.rfile.read(int(req.headers["Content-Length"]))
+        with self.lock:
+            self.requests += 1
+            error = self.inject_error()
+        if self.config.latency:
+            time.sleep(self.config.latency)
+        if error:
+            return self.respond(req, 503, {"error": "injected"})
+
+        if method == "POST" and url.path == "/appraisal":
+            return self.respond(req, 200, self.appraisal(body.decode("utf-8")))
+        path = url.path.removeprefix("/latest")
+        for pattern, route in self.routes:
+            match = pattern.match(path)
+            if method == "GET" and match:
+                content, pages = route(*map(int, match.groups()), params=params)
+                return self.respond(
+                    req, 200 if content is not None else 404, content, pages
+                )
+        return self.respond(req, 404, {"error": "not found"})
+
+    def inject_error(self) -> bool:
+        if self.burst_left:
+            self.burst_left -= 1
+            self.errors += 1
+            return True
+        if self.config.error_every and self.requests % self.config.error_every == 0:
+            self.burst_left = self.config.error_burst - 1
+            self.errors += 1
+            return True
+        return False
+
+    def respond(self, req, status: int, content, pages: int | None = None):
+        body = json.dumps(content).encode("utf-8")
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if status == 200 and req.headers.get("If-None-Match") == etag:
+            with self.lock:
+                self.not_modified += 1
+            status, body = 304, b""
+        req.send_response(status)
+        req.send_header("Content-Type", "application/json")
+        req.send_header("Content-Length", str(len(body)))
+        if status in (200, 304):
+            req.send_header("ETag", etag)
+            req.send_header(
+                "Expires", formatdate(time.time() + self.config.expires, usegmt=True)
+            )
+        if pages is not None:
+            req.send_header("X-Pages", str(pages))
+        req.end_headers()
+        req.wfile.write(body)
+        return
+
+    def market_orders(self, region_id: int, params: dict):
+        """orders of a type, or pages of every type's orders like the bulk region snapshot without type_id"""
+        order_type = params.get("order_type", "all")
+        if "type_id" not in params:
+            key = (region_id, order_type)
+            if key not in self.bulk_orders:
+                self.bulk_orders[key] = [
+                    order
+                    for type_id in self.type_ids
+                    for order in self.type_orders(region_id, type_id, order_type)
+                ]
+            orders = self.bulk_orders[key]
+            pages = max(1, -(-len(orders) // PAGE_SIZE))
+            page = int(params.get("page", 1))
+            return orders[(page - 1) * PAGE_SIZE : page * PAGE_SIZE], pages
+        return self.type_orders(region_id, int(params["type_id"]), order_type), 1
+
+    def type_orders(self, region_id: int, type_id: int, order_type: str) -> list[dict]:
+        first_order_id = FIRST_ORDER_ID + ORDERS_PER_KEY * (
+            (region_id - FIRST_REGION_ID) * (FIRST_TYPE_ID + len(self.type_ids))
+            + type_id
+        )
+        orders = [
+            order
+            for order in self.universe.orders(
+                self.config.orders_per_type, type_id, region_id, first_order_id
+            )
+            if order_type == "all" or order["is_buy_order"] == (order_type == "buy")
+        ]
+        return orders
+
+    def build_contracts(self) -> dict[int, list[list[dict]]]:
+        """region_id -> pages of contracts, built once as clients page through them"""
+        regions: dict[int, list[dict]] = {r: [] for r in self.region_ids}
+        for i, contract in enumerate(self.universe.contracts(self.config.contracts)):
+            regions[self.region_ids[i % self.config.regions]].append(contract)
+        return {
+            region_id: [
+                contracts[i : i + PAGE_SIZE]
+                for i in range(0, max(1, len(contracts)), PAGE_SIZE)
+            ]
+            for region_id, contracts in regions.items()
+        }
+
+    def public_contracts(self, region_id: int, params: dict):
+        if region_id not in self.contract_pages:
+            return None, None
+        pages = self.contract_pages[region_id]
+        page = int(params.get("page", 1))
+        return pages[page - 1] if page <= len(pages) else [], len(pages)
+
+    def contract_items(self, contract_id: int, params: dict):
+        return self.universe.contract_items(contract_id), None
+
+    def character(self, character_id: int, params: dict):
+        return {"name": f"Character {character_id}"}, None
+
+    def regions(self, params: dict):
+        return self.region_ids, None
+
+    def region(self, region_id: int, params: dict):
+        return {
+            "region_id": region_id,
+            "name": f"Region {region_id}",
+            "description": "known space",
+        }, None
+
+    def appraisal(self, items: str) -> dict:
+        """values lines of type names from the fake static data at their base price"""
+        total = 0.0
+        for line in items.splitlines():
+            name, _, quantity = line.rpartition("\t")
+            match = APPRAISAL_NAME.match(name)
+            if match:
+                total += self.universe.base_price(int(match[1])) * int(quantity or 1)
+        return {
+            "effectivePrices": {
+                "totalBuyPrice": round(total * 0.9, 2),
+                "totalSellPrice": round(total, 2),
+            }
+        }
@@ -0,0 +1,240 @@
+"""
+end to end cycles of the features against a local fake ESI, run from the repo root with
+    python -m benchmarks.run --scenario market --targets 100 --regions 70
+    python -m benchmarks.run --scenario contracts --contracts 20000 --save baseline.json
+    python -m benchmarks.run --baseline baseline.json
+"""
+
+import argparse
+import dataclasses
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import requests
+
+from eve_monitor import http_pool
+from eve_monitor.arbitrage import ARBITRAGE, Arbitrage
+from eve_monitor.config import APP, REGIONS, TARGETS, settings
+from eve_monitor.contract_sniper import CONTRACT_SNIPER, ContractSniper
+from eve_monitor.core import Core
+from eve_monitor.market_monitor import MARKET_MONITOR, MarketMonitor
+
+from .fake_esi import FakeEsi, FakeEsiConfig
+from .sde import build_sde
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+MARKET = "market"
+CONTRACTS = "contracts"
+SCENARIOS = {MARKET: MarketMonitor, CONTRACTS: ContractSniper, ARBITRAGE: Arbitrage}
+DEFAULT_TOLERANCE = 0.2
+THRESHOLD_RATIO = 0.75
+
+
+@dataclasses.dataclass
+class Result:
+    scenario: str
+    cycles: list[float]  # seconds each
+    requests: int
+    not_modified: int
+    errors: int
+    failed_cycles: int
+    peak_rss_mib: float
+    connections: int = 0  # opened by the shared pool
+
+    @property
+    def rps(self) -> float:
+        return self.requests / sum(self.cycles) if self.cycles else 0.0
+
+    @property
+    def mean_cycle(self) -> float:
+        return statistics.mean(self.cycles) if self.cycles else 0.0
+
+    def report(self) -> str:
+        return (
+            f"{self.scenario:10} cycles {len(self.cycles)} ({self.failed_cycles} failed)"
+            + f", mean {self.mean_cycle:.2f}s, max {max(self.cycles, default=0):.2f}s"
+            + f", {self.requests} requests at {self.rps:,.0f} rps"
+            + f", {self.not_modified} not modified, {self.errors} 5xx"
+            + f", {self.connections} connections"
+            + f", peak rss {self.peak_rss_mib:,.1f} MiB"
+        )
+
+
+def peak_rss_mib() -> float:
+    """peak resident set size of this process, the fake server included"""
+    if resource is None:
+        return float("nan")
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return rss / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+def configure(workdir: str, esi: FakeEsi):
+    """point settings at generated files, every region and type served by esi is watched"""
+    paths = {
+        APP: os.path.join(workdir, "appsettings.json"),
+        TARGETS: os.path.join(workdir, "targets.json"),
+        REGIONS: os.path.join(workdir, "regions.json"),
+    }
+    db_path = os.path.join(workdir, "sde.sqlite")
+    build_sde(db_path, esi.config)
+    app = {
+        "ESI_URL": esi.esi_url,
+        "APPRAISAL_URL": esi.appraisal_url,
+        "DB_PATH": db_path,
+        "DESKTOP_NOTIFICATION": False,
+        "PUSHOVER_NOTIFICATION": False,
+    }
+    targets = {
+        MARKET_MONITOR: [
+            # a few percent of sell orders are listed this far below the typical price
+            {
+                "type_id": type_id,
+                "name": f"Type {type_id}",
+                "threshold": esi.universe.base_price(type_id) * THRESHOLD_RATIO,
+            }
+            for type_id in esi.type_ids
+        ],
+        CONTRACT_SNIPER: esi.type_ids[:5],
+    }
+    regions = [
+        {"name": f"Region {region_id}", "region_id": region_id, "known_space": True}
+        for region_id in esi.region_ids
+    ]
+    for section, content in ((APP, app), (TARGETS, targets), (REGIONS, regions)):
+        json.dump(content, open(paths[section], "w", encoding="utf-8"))
+    settings.paths.update(paths)
+    settings.reload()
+    return
+
+
+def run_scenario(scenario: str, esi: FakeEsi, cycles: int) -> Result:
+    """
+    run main of a fresh feature cycles times, failed cycles are those aborted by 5xx,
+    requests go through the app's shared pool and retry policy, fresh for each scenario
+    """
+    http_pool.close()
+    feature: Core = SCENARIOS[scenario]({}, http_pool.session())
+    start_requests, start_not_modified, start_errors = (
+        esi.requests,
+        esi.not_modified,
+        esi.errors,
+    )
+    durations, failed = [], 0
+    for _ in range(cycles):
+        start = time.perf_counter()
+        try:
+            feature.main()
+        except requests.exceptions.ConnectionError:
+            failed += 1
+        durations.append(time.perf_counter() - start)
+    return Result(
+        scenario,
+        durations,
+        esi.requests - start_requests,
+        esi.not_modified - start_not_modified,
+        esi.errors - start_errors,
+        failed,
+        peak_rss_mib(),
+        sum(opened for _, opened in http_pool.get_adapter().stats().values()),
+    )
+
+
+def compare(results: list[Result], baseline: dict, tolerance: float) -> list[str]:
+    """regressions of mean cycle time beyond tolerance against a saved run"""
+    regressions = []
+    for result in results:
+        if result.scenario not in baseline:
+            continue
+        before = baseline[result.scenario]["mean_cycle"]
+        if before and result.mean_cycle > before * (1 + tolerance):
+            regressions.append(
+                f"{result.scenario} mean cycle {result.mean_cycle:.2f}s, baseline {before:.2f}s"
+            )
+    return regressions
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    defaults = FakeEsiConfig()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--scenario", choices=[*SCENARIOS, "all"], default="all", help="feature to run"
+    )
+    parser.add_argument("--cycles", type=int, default=2, help="cycles per scenario")
+    parser.add_argument("--targets", type=int, default=defaults.types)
+    parser.add_argument("--regions", type=int, default=defaults.regions)
+    parser.add_argument("--orders", type=int, default=defaults.orders_per_type)
+    parser.add_argument("--contracts", type=int, default=defaults.contracts)
+    parser.add_argument(
+        "--latency", type=float, default=defaults.latency, help="seconds per response"
+    )
+    parser.add_argument(
+        "--error-every", type=int, default=0, help="503 burst every n requests"
+    )
+    parser.add_argument("--error-burst", type=int, default=defaults.error_burst)
+    parser.add_argument("--save", help="write results to this json file")
+    parser.add_argument("--baseline", help="fail on regression against this json file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--verbose", action="store_true", help="show feature logs")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR)
+    config = FakeEsiConfig(
+        regions=args.regions,
+        types=args.targets,
+        orders_per_type=args.orders,
+        contracts=args.contracts,
+        latency=args.latency,
+        error_every=args.error_every,
+        error_burst=args.error_burst,
+    )
+    esi = FakeEsi(config)
+    esi.start()
+    scenarios = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            configure(workdir, esi)
+            for scenario in scenarios:
+                results.append(run_scenario(scenario, esi, args.cycles))
+                print(results[-1].report())
+    finally:
+        esi.stop()
+
+    if args.save:
+        json.dump(
+            {
+                r.scenario: {
+                    **dataclasses.asdict(r),
+                    "rps": r.rps,
+                    "mean_cycle": r.mean_cycle,
+                }
+                for r in results
+            },
+            open(args.save, "w", encoding="utf-8"),
+            indent=4,
+        )
+    if args.baseline:
+        regressions = compare(
+            results, json.load(open(args.baseline, encoding="utf-8")), args.tolerance
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import sqlite3
+
+from .fake_esi import FakeEsiConfig
+from .synthetic import (
+    CATEGORIES,
+    FIRST_REGION_ID,
+    FIRST_STATION_ID,
+    FIRST_SYSTEM_ID,
+    fake_types,
+)
+
+
+def build_sde(path: str, config: FakeEsiConfig):
+    """write the static data tables the features query, matching the ids served by FakeEsi"""
+    conn = sqlite3.connect(path)
+    cur = conn.cursor()
+    cur.executescript(
+        """
+        drop table if exists invCategories;
+        drop table if exists invGroups;
+        drop table if exists invTypes;
+        drop table if exists mapSolarSystems;
+        drop table if exists mapSolarSystemJumps;
+        drop table if exists staStations;
+        create table invCategories (categoryID integer primary key, categoryName text);
+        create table invGroups (groupID integer primary key, groupName text, categoryID integer);
+        create table invTypes (typeID integer primary key, typeName text, groupID integer);
+        create table mapSolarSystems (
+            solarSystemID integer primary key, solarSystemName text, regionID integer, security real
+        );
+        create table mapSolarSystemJumps (fromSolarSystemID integer, toSolarSystemID integer);
+        create table staStations (
+            stationID integer primary key, stationName text, solarSystemID integer, security real
+        );
+        """
+    )
+    cur.executemany("insert into invCategories values (?, ?)", CATEGORIES.items())
+    # one group per category
+    cur.executemany(
+        "insert into invGroups values (?, ?, ?)",
+        [
+            (category_id * 100, f"{name} group", category_id)
+            for category_id, name in CATEGORIES.items()
+        ],
+    )
+    cur.executemany(
+        "insert into invTypes values (?, ?, ?)",
+        [
+            (type_id, f"Type {type_id}", category_id * 100)
+            for type_id, category_id in fake_types(config.types)
+        ],
+    )
+    cur.executemany(
+        "insert into mapSolarSystems values (?, ?, ?, ?)",
+        [
+            (
+                FIRST_SYSTEM_ID + i,
+                f"System {i}",
+                FIRST_REGION_ID + i % config.regions,
+                round(i / config.systems, 2),
+            )
+            for i in range(config.systems)
+        ],
+    )
+    # a ring of gates, both directions like the sde
+    cur.executemany(
+        "insert into mapSolarSystemJumps values (?, ?)",
+        [
+            (FIRST_SYSTEM_ID + i, FIRST_SYSTEM_ID + (i + d) % config.systems)
+            for i in range(config.systems)
+            for d in (1, -1)
+        ],
+    )
+    cur.executemany(
+        "insert into staStations values (?, ?, ?, ?)",
+        [
+            (
+                FIRST_STATION_ID + i,
+                f"Station {i}",
+                FIRST_SYSTEM_ID + i % config.systems,
+                round((i % config.systems) / config.systems, 2),
+            )
+            for i in range(config.stations)
+        ],
+    )
+    conn.commit()
+    conn.close()
+    return
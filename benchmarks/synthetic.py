@@ -0,0 +1,306 @@
+"""
+seeded generator of ESI shaped market orders and public contracts, run from the repo root with
+    python -m benchmarks.synthetic orders 1000000 orders.jsonl.gz
+    python -m benchmarks.synthetic contracts 100000 contracts.jsonl.gz --sde sqlite-latest.sqlite
+"""
+
+import argparse
+import gzip
+import itertools
+import json
+import math
+import random
+import sqlite3
+import sys
+import time
+from typing import Iterable, Iterator
+
+FIRST_REGION_ID = 10000001
+FIRST_TYPE_ID = 1000
+FIRST_SYSTEM_ID = 30000001
+FIRST_STATION_ID = 60000001
+FIRST_ORDER_ID = 6_000_000_000
+FIRST_CONTRACT_ID = 200_000_000
+FIRST_CHARACTER_ID = 90_000_000
+ESI_TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+BATCH = 10_000  # records drawn per batch of weighted type choices
+
+MATERIAL, SHIP, MODULE, CHARGE, BLUEPRINT, DRONE = 4, 6, 7, 8, 9, 18
+CATEGORIES = {
+    MATERIAL: "Material",
+    SHIP: "Ship",
+    MODULE: "Module",
+    CHARGE: "Charge",
+    BLUEPRINT: "Blueprint",
+    DRONE: "Drone",
+}
+# category -> share of listings, median price, log spread of prices between types, typical quantity
+CATEGORY_PROFILES = {
+    MATERIAL: (15, 10, 1.5, 10_000),
+    SHIP: (10, 30_000_000, 1.5, 1),
+    MODULE: (35, 2_000_000, 1.5, 2),
+    CHARGE: (20, 500, 1.0, 1_000),
+    BLUEPRINT: (10, 20_000_000, 1.5, 1),
+    DRONE: (10, 1_000_000, 1.0, 5),
+}
+OTHER_PROFILE = (5, 1_000_000, 1.5, 1)
+# categories of the fake static data, in the order types are assigned to them
+FAKE_CATEGORIES = (SHIP, MODULE, MATERIAL)
+
+BUY_SHARE = 0.45
+ORDER_PRICE_SPREAD = 0.15  # log spread of an order's price around the type's price
+BUY_DISCOUNT = 0.85
+ORDER_DURATIONS = (90, 90, 90, 30, 14, 7, 3, 1)
+BUY_RANGES = ("station", "solarsystem", "1", "5", "10", "region")
+MAX_ORDER_AGE = 90 * 24 * 60 * 60
+
+CONTRACT_TYPES = ("item_exchange", "auction", "courier")
+CONTRACT_TYPE_WEIGHTS = (70, 10, 20)
+CONTRACT_PRICE_SPREAD = 0.3
+BARGAIN_SHARE = 0.02  # item exchanges listed far below value
+BARGAIN_DISCOUNT = 0.3
+MEAN_EXTRA_ITEMS = 2.0  # items per contract are 1 plus exponentially distributed
+MAX_ITEMS = 200
+INCLUDED_SHARE = 0.9
+MAX_CONTRACT_AGE = 30 * 24 * 60 * 60
+
+
+def fake_types(count: int) -> list[tuple[int, int]]:
+    """(type_id, category_id) of the types in the fake static data"""
+    return [
+        (FIRST_TYPE_ID + i, FAKE_CATEGORIES[i % len(FAKE_CATEGORIES)])
+        for i in range(count)
+    ]
+
+
+def esi_time(t: float) -> str:
+    return time.strftime(ESI_TIME_FORMAT, time.gmtime(t))
+
+
+class SyntheticUniverse:
+    """
+    types with a price each and the weights they are listed with, drawn from the sde category mix,
+    every generator is seeded from the universe seed and its arguments, so output is the same on every run
+    """
+
+    def __init__(
+        self,
+        types: list[tuple[int, int]] | None = None,
+        seed: int = 0,
+        regions: int = 70,
+        systems: int = 50,
+        stations: int = 50,
+        now: float | None = None,
+    ):
+        self.types = types if types else fake_types(100)
+        self.seed = seed
+        self.region_ids = list(range(FIRST_REGION_ID, FIRST_REGION_ID + regions))
+        self.systems = systems
+        self.stations = stations
+        self.now = int(time.time() if now is None else now)
+        self.type_ids = [type_id for type_id, _ in self.types]
+        self.categories = dict(self.types)
+
+        # categories keep their share however many types they have
+        per_category: dict[int, int] = {}
+        for _, category_id in self.types:
+            per_category[category_id] = per_category.get(category_id, 0) + 1
+        self.cum_weights = list(
+            itertools.accumulate(
+                self.profile(type_id)[0] / per_category[self.categories[type_id]]
+                for type_id in self.type_ids
+            )
+        )
+        self.base_prices: dict[int, float] = {}
+        return
+
+    @classmethod
+    def from_sde(cls, path: str, seed: int = 0, **kwargs) -> "SyntheticUniverse":
+        """types from a static data export, only those in categories listed on the market"""
+        cur = sqlite3.connect(path).cursor()
+        cur.execute(
+            f"""
+            select it.typeID, ig.categoryID
+            from invTypes it
+                inner join invGroups ig on it.groupID = ig.groupID
+            where ig.categoryID in ({','.join('?' * len(CATEGORY_PROFILES))})
+            order by it.typeID
+            """,
+            tuple(CATEGORY_PROFILES),
+        )
+        return cls(cur.fetchall(), seed, **kwargs)
+
+    def rng(self, *key) -> random.Random:
+        # str seeds are hashed with sha512, unlike hash() they are the same in every process
+        return random.Random(":".join(map(str, (self.seed, *key))))
+
+    def profile(self, type_id: int) -> tuple:
+        return CATEGORY_PROFILES.get(self.categories.get(type_id, 0), OTHER_PROFILE)
+
+    def base_price(self, type_id: int) -> float:
+        """typical sell price of a type"""
+        if type_id not in self.base_prices:
+            _, median, spread, _ = self.profile(type_id)
+            price = median * self.rng("price", type_id).lognormvariate(0, spread)
+            self.base_prices[type_id] = round(max(0.01, price), 2)
+        return self.base_prices[type_id]
+
+    def station(self, rng: random.Random) -> tuple[int, int]:
+        """(station_id, system_id), stations are spread evenly over systems"""
+        i = rng.randrange(self.stations)
+        return FIRST_STATION_ID + i, FIRST_SYSTEM_ID + i % self.systems
+
+    def sample_types(self, rng: random.Random, k: int) -> list[int]:
+        return rng.choices(self.type_ids, cum_weights=self.cum_weights, k=k)
+
+    def orders(
+        self,
+        n: int,
+        type_id: int | None = None,
+        region_id: int | None = None,
+        first_order_id: int = FIRST_ORDER_ID,
+    ) -> Iterator[dict]:
+        """n orders of type_id or of weighted random types, buy and sell mixed"""
+        rng = self.rng("orders", type_id, region_id, first_order_id)
+        lognorm, rand, randint = rng.lognormvariate, rng.random, rng.randint
+        for start in range(0, n, BATCH):
+            k = min(BATCH, n - start)
+            type_ids = [type_id] * k if type_id else self.sample_types(rng, k)
+            for i, tid in enumerate(type_ids):
+                _, _, _, quantity = self.profile(tid)
+                is_buy = rand() < BUY_SHARE
+                price = self.base_price(tid) * lognorm(0, ORDER_PRICE_SPREAD)
+                volume_total = max(1, int(quantity * lognorm(0, 1)))
+                location_id, system_id = self.station(rng)
+                yield {
+                    "order_id": first_order_id + start + i,
+                    "type_id": tid,
+                    "is_buy_order": is_buy,
+                    "price": round(price * BUY_DISCOUNT if is_buy else price, 2),
+                    "volume_total": volume_total,
+                    "volume_remain": randint(1, volume_total),
+                    "min_volume": 1,
+                    "issued": esi_time(self.now - rand() * MAX_ORDER_AGE),
+                    "duration": rng.choice(ORDER_DURATIONS),
+                    "range": rng.choice(BUY_RANGES) if is_buy else "region",
+                    "location_id": location_id,
+                    "system_id": system_id,
+                }
+        return
+
+    def contract_items(self, contract_id: int) -> list[dict]:
+        """items of a contract, a few for most, hundreds for some"""
+        rng = self.rng("items", contract_id)
+        size = min(MAX_ITEMS, 1 + int(rng.expovariate(1 / MEAN_EXTRA_ITEMS)))
+        items = []
+        for i, type_id in enumerate(self.sample_types(rng, size)):
+            _, _, _, quantity = self.profile(type_id)
+            item = {
+                "record_id": contract_id * 1000 + i,
+                "type_id": type_id,
+                "quantity": max(1, int(quantity * rng.lognormvariate(0, 1))),
+                "is_included": rng.random() < INCLUDED_SHARE,
+                "is_singleton": False,
+            }
+            if self.categories.get(type_id) == BLUEPRINT and rng.random() < 0.5:
+                item["is_blueprint_copy"] = True
+                item["runs"] = rng.randint(1, 10)
+            items.append(item)
+        return items
+
+    def contract_value(self, contract_id: int) -> float:
+        """value of what a contract sells minus what it asks for"""
+        return sum(
+            self.base_price(item["type_id"])
+            * item["quantity"]
+            * (1 if item["is_included"] else -1)
+            for item in self.contract_items(contract_id)
+            if not item.get("is_blueprint_copy")
+        )
+
+    def contracts(
+        self, n: int, first_contract_id: int = FIRST_CONTRACT_ID
+    ) -> Iterator[dict]:
+        """n public contracts of mixed types, item exchanges priced around the value of their items"""
+        rng = self.rng("contracts", first_contract_id)
+        lognorm, rand = rng.lognormvariate, rng.random
+        for i in range(n):
+            contract_id = first_contract_id + i
+            (contract_type,) = rng.choices(
+                CONTRACT_TYPES, weights=CONTRACT_TYPE_WEIGHTS
+            )
+            issued = self.now - rand() * MAX_CONTRACT_AGE
+            start_id, _ = self.station(rng)
+            contract = {
+                "contract_id": contract_id,
+                "issuer_id": FIRST_CHARACTER_ID + rng.randrange(100_000),
+                "issuer_corporation_id": 98_000_000 + rng.randrange(10_000),
+                "type": contract_type,
+                "date_issued": esi_time(issued),
+                "date_expired": esi_time(
+                    issued + rng.choice((1, 3, 7, 14, 30)) * 86400
+                ),
+                "start_location_id": start_id,
+                "end_location_id": start_id,
+                "for_corporation": False,
+                "title": "" if rand() < 0.7 else f"WTS {contract_id}",
+                "volume": round(lognorm(math.log(100), 2), 2),
+            }
+            value = max(0.0, self.contract_value(contract_id))
+            price = value * lognorm(0, CONTRACT_PRICE_SPREAD)
+            if contract_type == "item_exchange":
+                if rand() < BARGAIN_SHARE:
+                    price *= BARGAIN_DISCOUNT
+                contract["price"] = round(price, -4)
+            elif contract_type == "auction":
+                contract["price"] = round(price * 0.5, -4)
+                contract["buyout"] = round(price * 1.2, -4)
+            else:
+                contract["end_location_id"], _ = self.station(rng)
+                contract["price"] = 0.0
+                contract["reward"] = round(lognorm(math.log(10_000_000), 1), -4)
+                contract["collateral"] = round(price, -4)
+                contract["days_to_complete"] = rng.choice((1, 3, 7, 14))
+            yield contract
+        return
+
+
+def write_jsonl(records: Iterable[dict], path: str) -> int:
+    """stream records to a json lines file, gzip compressed if path ends with .gz"""
+    opener = gzip.open if path.endswith(".gz") else open
+    count = 0
+    with opener(path, "wt", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+            count += 1
+    return count
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("kind", choices=["orders", "contracts"])
+    parser.add_argument("count", type=int)
+    parser.add_argument("path", help="output json lines, .gz to compress")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sde", help="static data export to draw types from")
+    args = parser.parse_args(argv)
+
+    universe = (
+        SyntheticUniverse.from_sde(args.sde, args.seed)
+        if args.sde
+        else SyntheticUniverse(seed=args.seed)
+    )
+    records = (
+        universe.orders(args.count)
+        if args.kind == "orders"
+        else universe.contracts(args.count)
+    )
+    start = time.perf_counter()
+    count = write_jsonl(records, args.path)
+    elapsed = time.perf_counter() - start
+    print(f"{count} {args.kind} in {elapsed:.1f}s, {count / elapsed:,.0f} per second")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+import dataclasses
+import time
+from operator import itemgetter
+
+from .config import settings
+from .core import (
+    BaseHistory,
+    Core,
+    drop_evicted,
+    entries_to_evict,
+    get_module_name,
+    without,
+)
+from .order_book import OrderBook, Opportunity
+from .state import state
+
+ARBITRAGE = get_module_name(__name__)
+LAST_SPREADS_TO_CACHE = 1000
+
+
+def spread_key(opportunity: Opportunity) -> str:
+    """a spread is notified again once it moves to other regions or other best prices"""
+    return (
+        f"{opportunity.type_id}:{opportunity.buy_region_id}:{opportunity.sell_region_id}"
+        + f":{opportunity.buy_price}:{opportunity.sell_price}"
+    )
+
+
+class ArbitrageHistory(BaseHistory):
+    def __init__(self, history: dict | None = None):
+        """
+        optionally takes a dict loaded from history file, loaded the ARBITRAGE part if available
+        modify input history to point to initialized object if given
+        """
+        super().__init__()
+        self.spreads: dict[str, int] = {}
+        if history != None and ARBITRAGE in history:
+            self.spreads = dict(history[ARBITRAGE])
+        if history != None:
+            history[ARBITRAGE] = self
+        return
+
+    def __len__(self) -> int:
+        return len(self.spreads)
+
+    def snapshot(self) -> dict[str, int]:
+        with self.lock:
+            self.share()
+            return self.spreads
+
+    def trim(self):
+        # build the trimmed map from a snapshot, then only hold the lock to swap it in
+        seen = self.snapshot()
+        evicted = entries_to_evict(seen, LAST_SPREADS_TO_CACHE)
+        if not evicted:
+            return
+        kept = without(seen, evicted)
+        with self.lock:
+            if self.spreads is seen:
+                self.spreads = kept
+                self.owned = set()
+            else:
+                # written since the snapshot, skip entries seen again
+                self.spreads = self.own(self.spreads)
+                drop_evicted(self.spreads, evicted)
+        return
+
+    def to_json_serializable(self) -> dict[str, int]:
+        return self.snapshot()
+
+    def add_spread_seen(self, key: str):
+        with self.lock:
+            self.spreads = self.own(self.spreads)
+            self.spreads[key] = int(time.time())
+        return
+
+    def is_spread_seen(self, key: str) -> bool:
+        return key in self.spreads
+
+
+class Arbitrage(Core):
+    """
+    keeps every order of every known space region in an order book, refreshed from bulk region snapshots,
+    and notifies on the most profitable spreads between regions
+    """
+
+    def __init__(self, history: dict | None = None, *args, **kwargs):
+        self.history = ArbitrageHistory(history)
+        self.book = OrderBook()
+        self.type_names: dict[int, str] = {}
+        return super().__init__(ARBITRAGE, *args, **kwargs)
+
+    def get_type_name(self, type_id: int) -> str:
+        if type_id not in self.type_names:
+            res = self.query(
+                "type_name",
+                "select typeName from invTypes where typeID = ?",
+                (type_id,),
+            )
+            self.type_names[type_id] = res[0] if res else f"Type {type_id}"
+        return self.type_names[type_id]
+
+    def refresh_region(self, region_id: int) -> int:
+        """apply the region's orders to the book page by page as they arrive, returns how many orders changed"""
+        pages = self.page_aware_stream(
+            settings.esi_url + f"/markets/{region_id}/orders/",
+            update_next_poll=True,
+            params={"order_type": "all"},
+        )
+        # a region is never empty, no orders means the request failed or was not modified,
+        # then the book keeps the region as it is
+        return self.book.apply_pages(region_id, (page for page in pages if page))
+
+    def watch_spreads(self):
+        """notify on cross region spreads above ARBITRAGE_MARGIN making at least ARBITRAGE_MIN_PROFIT"""
+        start = time.perf_counter()
+        region_names = {}
+        changed = 0
+        for region in settings.regions:
+            region_name, region_id, known_space = itemgetter(
+                "name", "region_id", "known_space"
+            )(region)
+            if not known_space:
+                continue
+            region_names[region_id] = region_name
+            changed += self.refresh_region(region_id)
+
+        opportunities = self.book.opportunities(
+            settings.arbitrage_margin,
+            settings.arbitrage_min_profit,
+            settings.arbitrage_top,
+        )
+        items = [
+            {
+                **dataclasses.asdict(o),
+                "name": self.get_type_name(o.type_id),
+                "buy_region_name": region_names.get(o.buy_region_id, ""),
+                "sell_region_name": region_names.get(o.sell_region_id, ""),
+                "margin": o.margin,
+            }
+            for o in opportunities
+        ]
+        state.set_opportunities(items)
+
+        for opportunity, item in zip(opportunities, items):
+            key = spread_key(opportunity)
+            if self.history.is_spread_seen(key):
+                continue
+            msg = (
+                f"{item['name']} buy {item['volume']:,} in {item['buy_region_name']} from {item['buy_price']:,.0f} isk"
+                + f", sell in {item['sell_region_name']} from {item['sell_price']:,.0f} isk"
+                + f", {item['profit']:,.0f} isk profit at {item['margin']:.0%}"
+            )
+            self.log.info(msg)
+            self.send_notification(msg)
+            self.history.add_spread_seen(key)
+        self.log.info(
+            f"Book of {len(self.book):,} orders, {changed:,} changed, {len(opportunities)} spreads"
+            + f" in {time.perf_counter() - start:.1f}s"
+        )
+        return
+
+    main = watch_spreads
@@ -0,0 +1,251 @@
+import os
+import sqlite3
+import threading
+import time
+
+from .latency import parse_esi_time
+
+# rows written in one transaction, fewer when flushed at the end of a region
+BATCH_SIZE = 500
+TRIM_INTERVAL = 60 * 60
+DAY = 24 * 60 * 60
+
+SCHEMA = """
+create table if not exists contracts (
+    contract_id integer primary key,
+    region_id integer not null,
+    station_id integer not null,
+    issuer_id integer not null,
+    title text not null,
+    price real not null,
+    volume real not null,
+    date_issued integer not null
+);
+create index if not exists contracts_issued on contracts (date_issued);
+create index if not exists contracts_region_issued on contracts (region_id, date_issued);
+create index if not exists contracts_price on contracts (price);
+
+create table if not exists contract_items (
+    contract_id integer not null,
+    type_id integer not null,
+    quantity integer not null,
+    is_included integer not null,
+    primary key (contract_id, type_id, is_included)
+) without rowid;
+create index if not exists contract_items_type on contract_items (type_id, contract_id);
+
+create table if not exists valuations (
+    contract_id integer primary key,
+    sold real not null,
+    requested real not null,
+    value real not null,
+    notified integer not null
+);
+
+create table if not exists types (
+    type_id integer primary key,
+    name text not null
+);
+create index if not exists types_name on types (name collate nocase);
+"""
+
+
+class ContractArchive:
+    """
+    contracts valued by the sniper with their items, written in batches to a sqlite database in WAL mode
+    so the ui reads it from its own connections while the sniper writes
+    """
+
+    def __init__(self, path: str, retention_days: float):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.retention = retention_days * DAY
+        # opened by the main thread, written by the sniper's
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("pragma journal_mode = wal")
+        self.conn.execute("pragma synchronous = normal")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self.contracts: list[tuple] = []
+        self.items: list[tuple] = []
+        self.valuations: list[tuple] = []
+        self.types: dict[int, str] = {}
+        self.last_trim = 0.0
+        return
+
+    def add(
+        self,
+        region_id: int,
+        contract: dict,
+        items: list[tuple[int, str, int, bool]],
+        sold: float,
+        requested: float,
+        notified: bool,
+    ):
+        """queue a valued contract with its (type_id, type_name, quantity, is_included) items"""
+        contract_id = contract["contract_id"]
+        with self.lock:
+            self.contracts.append(
+                (
+                    contract_id,
+                    region_id,
+                    contract["start_location_id"],
+                    contract["issuer_id"],
+                    contract["title"],
+                    contract["price"],
+                    contract["volume"],
+                    int(parse_esi_time(contract["date_issued"])),
+                )
+            )
+            for type_id, type_name, quantity, is_included in items:
+                self.items.append((contract_id, type_id, quantity, is_included))
+                self.types[type_id] = type_name
+            self.valuations.append(
+                (contract_id, sold, requested, sold - requested, notified)
+            )
+            full = len(self.contracts) >= BATCH_SIZE
+        if full:
+            self.flush()
+        return
+
+    def flush(self) -> int:
+        """write queued contracts in one transaction, then drop those past retention once in a while"""
+        with self.lock:
+            contracts, self.contracts = self.contracts, []
+            items, self.items = self.items, []
+            valuations, self.valuations = self.valuations, []
+            types, self.types = self.types, {}
+            if contracts:
+                self.write(contracts, items, valuations, types)
+        if time.time() - self.last_trim >= TRIM_INTERVAL:
+            self.trim()
+        return len(contracts)
+
+    def write(
+        self,
+        contracts: list[tuple],
+        items: list[tuple],
+        valuations: list[tuple],
+        types: dict[int, str],
+    ):
+        with self.conn:
+            self.conn.executemany(
+                "insert or replace into contracts values (?, ?, ?, ?, ?, ?, ?, ?)",
+                contracts,
+            )
+            self.conn.executemany(
+                "insert or replace into contract_items values (?, ?, ?, ?)", items
+            )
+            self.conn.executemany(
+                "insert or replace into valuations values (?, ?, ?, ?, ?)",
+                valuations,
+            )
+            self.conn.executemany(
+                "insert or ignore into types values (?, ?)", types.items()
+            )
+        return
+
+    def trim(self, now: float | None = None) -> int:
+        """delete contracts issued before the retention period, returns how many"""
+        cutoff = (time.time() if now is None else now) - self.retention
+        with self.lock, self.conn:
+            expired = "select contract_id from contracts where date_issued < ?"
+            self.conn.execute(
+                f"delete from contract_items where contract_id in ({expired})",
+                (cutoff,),
+            )
+            self.conn.execute(
+                f"delete from valuations where contract_id in ({expired})", (cutoff,)
+            )
+            deleted = self.conn.execute(
+                "delete from contracts where date_issued < ?", (cutoff,)
+            ).rowcount
+        self.last_trim = time.time()
+        return deleted
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+        return
+
+
+def search(
+    path: str,
+    type_id: int | None = None,
+    type_name: str | None = None,
+    region_id: int | None = None,
+    min_price: float | None = None,
+    max_price: float | None = None,
+    since: float | None = None,
+    offset: int = 0,
+    limit: int = 100,
+) -> dict:
+    """
+    archived contracts matching every given filter, newest first, with their items and valuation,
+    type_name matches whole names regardless of case, since is epoch seconds of the oldest date issued,
+    returns {"items": [contract], "more": whether there are further pages}
+    """
+    if not os.path.exists(path):
+        return {"items": [], "more": False}
+    conditions, params = [], []
+    if type_name and type_id is None:
+        conditions.append(
+            "c.contract_id in (select contract_id from contract_items where type_id in"
+            + " (select type_id from types where name = ? collate nocase))"
+        )
+        params.append(type_name)
+    if type_id is not None:
+        conditions.append(
+            "c.contract_id in (select contract_id from contract_items where type_id = ?)"
+        )
+        params.append(type_id)
+    for condition, value in (
+        ("c.region_id = ?", region_id),
+        ("c.price >= ?", min_price),
+        ("c.price <= ?", max_price),
+        ("c.date_issued >= ?", since),
+    ):
+        if value is not None:
+            conditions.append(condition)
+            params.append(value)
+
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(
+            """
+            select c.*, v.sold, v.requested, v.value, v.notified
+            from contracts c left join valuations v on v.contract_id = c.contract_id
+            """
+            + (f"where {' and '.join(conditions)} " if conditions else "")
+            + "order by c.date_issued desc, c.contract_id desc limit ? offset ?",
+            (*params, limit + 1, offset),
+        ).fetchall()
+        contracts = [dict(row) for row in rows[:limit]]
+        by_id = {c["contract_id"]: c for c in contracts}
+        for c in contracts:
+            # as listed by ESI, like contracts of the state
+            c["date_issued"] = time.strftime(
+                "%Y-%m-%dT%H:%M:%SZ", time.gmtime(c["date_issued"])
+            )
+            c["items"] = []
+        if by_id:
+            for contract_id, type_id, name, quantity, is_included in conn.execute(
+                f"""
+                select i.contract_id, i.type_id, t.name, i.quantity, i.is_included
+                from contract_items i left join types t on t.type_id = i.type_id
+                where i.contract_id in ({','.join('?' * len(by_id))})
+                """,
+                tuple(by_id),
+            ):
+                by_id[contract_id]["items"].append(
+                    {
+                        "type_id": type_id,
+                        "name": name,
+                        "quantity": quantity,
+                        "is_included": bool(is_included),
+                    }
+                )
+    finally:
+        conn.close()
+    return {"items": contracts, "more": len(rows) > limit}
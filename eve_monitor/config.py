@@ -0,0 +1,311 @@
+import copy
+import json
+import logging
+import os
+import threading
+
+from .constants import (
+    APP_SETTINGS_JSON,
+    ARCHIVE_DB,
+    CAPTURE_FILE,
+    ESI_URL,
+    REGIONS_JSON,
+    SNAPSHOT_FILE,
+    TARGETS_JSON,
+)
+
+APP = "app"
+TARGETS = "targets"
+REGIONS = "regions"
+
+# used for any key missing from appsettings.json, or the whole file when not strict
+DEFAULT_APP_SETTINGS = {
+    "APP_TOKEN": "",
+    "USER_KEY": "",
+    "DB_PATH": ":memory:",
+    "DEBUG": False,
+    "ESI_URL": ESI_URL,
+    "APPRAISAL_URL": "https://janice.e-351.com/api/rest/v2/appraisal",
+    "APPRAISAL_API_KEY": "",
+    "DESKTOP_NOTIFICATION": False,
+    "PUSHOVER_NOTIFICATION": False,
+    "NOTIFICATION_COALESCE_WINDOW": 10,
+    "CRITICAL_PRIORITY": 0,
+    "DETECTION_SLO": 1800,
+    "USER_AGENT": "EVE_Monitor/0.2",
+    "HTTP_POOL_SIZE": 10,
+    "HTTP_RETRIES": 2,
+    "poll_rate_in_min": 5,
+    "features_enabled": {},
+    "SALVAGE_REGION": 10000002,
+    "REPROCESSING_EFFICIENCY": 0.5,
+    "ARBITRAGE_MARGIN": 0.1,
+    "ARBITRAGE_MIN_PROFIT": 10_000_000,
+    "ARBITRAGE_TOP": 20,
+    "HOME_SYSTEMS": [],
+    "MAX_JUMPS": None,
+    "SAFE_ROUTING": False,
+    "PROFILES": [],
+    "REGION_REFRESH_INTERVAL": 24 * 60 * 60,
+    "LOG_TO_FILE": False,
+    "DECOUPLED_UI": False,
+    "TRANSPORT": "live",
+    "CAPTURE_FILE": CAPTURE_FILE,
+    "REPLAY_SPEED": "fast",
+    "RECORD_SNAPSHOTS": False,
+    "SNAPSHOT_FILE": SNAPSHOT_FILE,
+    "ARCHIVE_CONTRACTS": False,
+    "ARCHIVE_DB": ARCHIVE_DB,
+    "ARCHIVE_RETENTION_DAYS": 90,
+}
+DEFAULTS = {APP: DEFAULT_APP_SETTINGS, TARGETS: {}, REGIONS: []}
+
+log = logging.getLogger(__name__)
+
+
+class Settings:
+    """
+    lazily loaded view over the json files in SETTINGS_DIR, nothing is read until first accessed
+    call load to read eagerly (strict fails on missing files), reload to pick up edits made at run time
+    """
+
+    def __init__(
+        self,
+        app_json: str = APP_SETTINGS_JSON,
+        targets_json: str = TARGETS_JSON,
+        regions_json: str = REGIONS_JSON,
+    ):
+        self.paths = {APP: app_json, TARGETS: targets_json, REGIONS: regions_json}
+        self._sections: dict[str, dict | list] = {}
+        self._lock = threading.Lock()
+        return
+
+    def load(self, *sections: str, strict: bool = False):
+        """load given sections, or all of them, skipping those already loaded"""
+        for section in sections or self.paths:
+            if section not in self._sections:
+                self.reload(section, strict=strict)
+        return
+
+    def reload(self, *sections: str, strict: bool = False):
+        """re-read given sections, or all of them, from the file system"""
+        for section in sections or self.paths:
+            content = self._read(section, strict)
+            with self._lock:
+                self._sections[section] = content
+        return
+
+    def save(self, section: str, content: dict | list):
+        """atomically replace the file of a section, then what is read from memory"""
+        path = self.paths[section]
+        temp = path + ".tmp"
+        with open(temp, "w+", encoding="utf-8", newline="\n") as f:
+            json.dump(content, f, indent=4)
+        os.replace(temp, path)
+        with self._lock:
+            self._sections[section] = content
+        return
+
+    def _read(self, section: str, strict: bool) -> dict | list:
+        path = self.paths[section]
+        if not os.path.exists(path):
+            if strict:
+                raise FileNotFoundError(f"Settings file {path} not found")
+            log.warning(f"Settings file {path} not found, using defaults")
+            return copy.deepcopy(DEFAULTS[section])
+        content = json.load(open(path, "r", encoding="utf-8"))
+        if section == APP:
+            content = {**DEFAULT_APP_SETTINGS, **content}
+        return content
+
+    def _get(self, section: str) -> dict | list:
+        if section not in self._sections:
+            self.load(section)
+        return self._sections[section]
+
+    @property
+    def app(self) -> dict:
+        return self._get(APP)  # type: ignore
+
+    @property
+    def targets(self) -> dict:
+        return self._get(TARGETS)  # type: ignore
+
+    @property
+    def regions(self) -> list[dict]:
+        return self._get(REGIONS)  # type: ignore
+
+    @property
+    def app_token(self) -> str:
+        return self.app["APP_TOKEN"]
+
+    @property
+    def user_key(self) -> str:
+        return self.app["USER_KEY"]
+
+    @property
+    def db_path(self) -> str:
+        return self.app["DB_PATH"]
+
+    @property
+    def debug(self) -> bool:
+        return self.app["DEBUG"]
+
+    @property
+    def desktop_notification(self) -> bool:
+        return self.app["DESKTOP_NOTIFICATION"]
+
+    @property
+    def pushover_notification(self) -> bool:
+        return self.app["PUSHOVER_NOTIFICATION"]
+
+    @property
+    def notification_coalesce_window(self) -> float:
+        """seconds to collect a burst of notifications into one digest"""
+        return self.app["NOTIFICATION_COALESCE_WINDOW"]
+
+    @property
+    def critical_priority(self) -> int:
+        """pushover priority of critical notifications, 1 bypasses the user's quiet hours"""
+        return self.app["CRITICAL_PRIORITY"]
+
+    @property
+    def detection_slo(self) -> float:
+        """seconds from issue to notification the p95 detection latency should stay under"""
+        return self.app["DETECTION_SLO"]
+
+    @property
+    def user_agent(self) -> str:
+        return self.app["USER_AGENT"]
+
+    @property
+    def http_pool_size(self) -> int:
+        """connections kept alive per host, shared by every feature and notifier"""
+        return self.app["HTTP_POOL_SIZE"]
+
+    @property
+    def http_retries(self) -> int:
+        """retries of failed connections, and of GETs answered 502, 503 or 504"""
+        return self.app["HTTP_RETRIES"]
+
+    @property
+    def log_to_file(self) -> bool:
+        return self.app["LOG_TO_FILE"]
+
+    @property
+    def esi_url(self) -> str:
+        """base url of ESI, only changed to point at a local stand in"""
+        return self.app["ESI_URL"]
+
+    @property
+    def appraisal_url(self) -> str:
+        return self.app["APPRAISAL_URL"]
+
+    @property
+    def appraisal_api_key(self) -> str:
+        return self.app["APPRAISAL_API_KEY"]
+
+    @property
+    def poll_rate(self) -> int:
+        return self.app["poll_rate_in_min"]
+
+    @property
+    def features_enabled(self) -> dict[str, bool]:
+        return self.app["features_enabled"]
+
+    @property
+    def salvage_region(self) -> int:
+        """region the market salvager buys from, the forge by default"""
+        return self.app["SALVAGE_REGION"]
+
+    @property
+    def reprocessing_efficiency(self) -> float:
+        """share of materials kept when reprocessing, 0.5 untrained"""
+        return self.app["REPROCESSING_EFFICIENCY"]
+
+    @property
+    def arbitrage_margin(self) -> float:
+        """how much above the ask a bid in another region must be, 0.1 for 10%"""
+        return self.app["ARBITRAGE_MARGIN"]
+
+    @property
+    def arbitrage_min_profit(self) -> float:
+        return self.app["ARBITRAGE_MIN_PROFIT"]
+
+    @property
+    def arbitrage_top(self) -> int:
+        """number of most profitable spreads kept and notified"""
+        return self.app["ARBITRAGE_TOP"]
+
+    @property
+    def home_systems(self) -> list[int]:
+        """solar system ids jumps are counted from"""
+        return self.app["HOME_SYSTEMS"]
+
+    @property
+    def max_jumps(self) -> int | None:
+        """ignore deals further than this from every home system, None to not filter"""
+        return self.app["MAX_JUMPS"]
+
+    @property
+    def safe_routing(self) -> bool:
+        """only count routes through high sec"""
+        return self.app["SAFE_ROUTING"]
+
+    @property
+    def profiles(self) -> list[dict]:
+        """
+        extra watchlists served by the same process, each with a name, TARGETS_JSON,
+        and optionally APP_TOKEN, USER_KEY, PUSHOVER_NOTIFICATION, DESKTOP_NOTIFICATION and CRITICAL_PRIORITY
+        """
+        return self.app["PROFILES"]
+
+    @property
+    def region_refresh_interval(self) -> int:
+        """seconds between refreshes of regions.json, 0 to never refresh"""
+        return self.app["REGION_REFRESH_INTERVAL"]
+
+    @property
+    def decoupled_ui(self) -> bool:
+        """experimental, set to true to run ui separately then main functions"""
+        return self.app["DECOUPLED_UI"]
+
+    @property
+    def transport(self) -> str:
+        """live, record to capture_file, or replay from it"""
+        return self.app["TRANSPORT"]
+
+    @property
+    def capture_file(self) -> str:
+        return self.app["CAPTURE_FILE"]
+
+    @property
+    def replay_speed(self) -> str:
+        """original to wait as long as recorded responses took, fast to not wait"""
+        return self.app["REPLAY_SPEED"]
+
+    @property
+    def record_snapshots(self) -> bool:
+        """append orders and contract valuations seen by features to snapshot_file, for backtest.py"""
+        return self.app["RECORD_SNAPSHOTS"]
+
+    @property
+    def snapshot_file(self) -> str:
+        """name each run's recording is derived from, see snapshots.run_file"""
+        return self.app["SNAPSHOT_FILE"]
+
+    @property
+    def archive_contracts(self) -> bool:
+        """keep every contract valued by the sniper with its items in archive_db, searchable from the web ui"""
+        return self.app["ARCHIVE_CONTRACTS"]
+
+    @property
+    def archive_db(self) -> str:
+        return self.app["ARCHIVE_DB"]
+
+    @property
+    def archive_retention_days(self) -> float:
+        return self.app["ARCHIVE_RETENTION_DAYS"]
+
+
+settings = Settings()
@@ -1,34 +1,18 @@
-import json
-
-
 TITLE = "EVE Market Monitor"
 ESI_URL = "https://esi.evetech.net/latest"
 PUSHOVER_URL = "https://api.pushover.net/1/messages.json"
 
+# file backed settings are loaded lazily, see config.settings
 SETTINGS_DIR = "./settings/"
 TARGETS_JSON = SETTINGS_DIR + "targets.json"
-TARGETS = json.load(open(TARGETS_JSON, "r", encoding="utf-8"))
 REGIONS_JSON = SETTINGS_DIR + "regions.json"
-REGIONS = json.load(open(REGIONS_JSON, "r", encoding="utf-8"))
-SETTINGS = json.load(open(SETTINGS_DIR + "appsettings.json", "r", encoding="utf-8"))
-APP_TOKEN = SETTINGS["APP_TOKEN"]
-USER_KEY = SETTINGS["USER_KEY"]
-DB_PATH = SETTINGS["DB_PATH"]
-DEBUG = SETTINGS["DEBUG"]
-DESKTOP_NOTIFICATION = SETTINGS.get("DESKTOP_NOTIFICATION")
-PUSHOVER_NOTIFICATION = SETTINGS.get("PUSHOVER_NOTIFICATION")
-USER_AGENT = SETTINGS["USER_AGENT"]
-LOG_TO_FILE = SETTINGS["LOG_TO_FILE"]
-
-APPRAISAL_URL = SETTINGS["APPRAISAL_URL"]
-APPRAISAL_API_KEY = SETTINGS["APPRAISAL_API_KEY"]
+APP_SETTINGS_JSON = SETTINGS_DIR + "appsettings.json"
 
 LOGS_DIR = "./logs/"
 MAIN_LOG_FILE = LOGS_DIR + "main.log"
 ERROR_LOG_FILE = LOGS_DIR + "error.log"
 NOTIFICATION_LOG_FILE = LOGS_DIR + "notification.log"
+CAPTURE_FILE = LOGS_DIR + "capture.jsonl.gz"
+SNAPSHOT_FILE = LOGS_DIR + "snapshots.jsonl.gz"
+ARCHIVE_DB = LOGS_DIR + "contracts.db"
 NOTIFICATION_LOG = "notification"
-
-## experimental features
-# set to true to run ui separately then main functions
-DECOUPLED_UI = SETTINGS.get("DECOUPLED_UI", False)
@@ -1,10 +1,23 @@
 import dataclasses
-import json
 import time
 from operator import itemgetter
-
-from .constants import APPRAISAL_URL, APPRAISAL_API_KEY, ESI_URL, REGIONS, TARGETS_JSON
-from .core import BaseHistory, Core, get_module_name
+from typing import Iterator
+
+from . import metrics, snapshots
+from .archive import ContractArchive
+from .config import TARGETS, settings
+from .core import (
+    BaseHistory,
+    Core,
+    drop_evicted,
+    entries_to_evict,
+    get_module_name,
+    without,
+)
+from .latency import Detection, parse_esi_time
+from .log_queue import LazyMessage
+from .profiles import Profile
+from .state import state
 
 CONTRACT_SNIPER = get_module_name(__name__)
 ARBITRAGE_THRESHOLD = 0.5
@@ -13,8 +26,24 @@ MIN_VALUE_THRESHOLD = 100_000_000
 LAST_CONTRACTS_TO_CACHE = 2000  # 1000 per page, last 2 pages
 
 
-def load_targets() -> list[int]:
-    return json.load(open(TARGETS_JSON))[CONTRACT_SNIPER]
+# target key -> query of the type ids it covers
+TARGET_QUERIES = {
+    "type_id": "select typeID from invTypes where typeID = ?",
+    "group_id": "select typeID from invTypes where groupID = ?",
+    "category_id": """
+        select it.typeID
+        from invTypes it
+            inner join invGroups ig on it.groupID = ig.groupID
+        where ig.categoryID = ?
+        """,
+    "meta_group_id": "select typeID from invMetaTypes where metaGroupID = ?",
+}
+
+
+def load_targets() -> list[int | dict]:
+    """type ids, or one of {"type_id"}, {"group_id"}, {"category_id"} or {"meta_group_id"}"""
+    settings.reload(TARGETS)
+    return settings.targets.get(CONTRACT_SNIPER, [])
 
 
 @dataclasses.dataclass
@@ -30,39 +59,63 @@ class InventoryType:
         return self.type_id
 
 
+def copy_contracts(contracts: dict[int, int] | None) -> dict[int, int]:
+    return contracts.copy() if contracts else {}
+
+
 class ContractHistory(BaseHistory):
-    def __init__(self, history: dict | None = None):
+    def __init__(self, history: dict | None = None, profile: Profile | None = None):
         """
-        optionally takes a dict loaded from history file, loaded the CONTRACT_SNIPER part if available
+        optionally takes a dict loaded from history file, loaded the CONTRACT_SNIPER part of profile if available
         modify input history to point to initialized object if given
         """
+        super().__init__()
+        self.key = profile.history_key(CONTRACT_SNIPER) if profile else CONTRACT_SNIPER
         self.contracts: dict[int, dict[int, int]] = {}
-        if history != None and CONTRACT_SNIPER in history:
-            region_contracts = history[CONTRACT_SNIPER]
+        if history != None and self.key in history:
+            region_contracts = history[self.key]
             for k, v in region_contracts.items():
                 self.contracts[int(k)] = {int(cid): t for cid, t in v.items()}
         if history != None:
-            history[CONTRACT_SNIPER] = self
+            history[self.key] = self
         return
 
+    def __len__(self) -> int:
+        return sum(len(contracts) for contracts in list(self.contracts.values()))
+
+    def snapshot(self) -> dict[int, dict[int, int]]:
+        with self.lock:
+            self.share()
+            return self.contracts
+
     def trim(self):
-        for region_id in self.contracts:
-            if len(self.contracts[region_id]) <= LAST_CONTRACTS_TO_CACHE:
-                continue
-            contracts = [(cid, t) for cid, t in self.contracts[region_id].items()]
-            contracts.sort(key=lambda c: c[1], reverse=True)
-            self.contracts[region_id] = {
-                cid: t for cid, t in contracts[:LAST_CONTRACTS_TO_CACHE]
-            }
+        # pick evictions and build the trimmed maps from a snapshot, then only hold the lock to swap them in
+        trimmed = {}
+        for region_id, contracts in self.snapshot().items():
+            evicted = entries_to_evict(contracts, LAST_CONTRACTS_TO_CACHE)
+            if evicted:
+                trimmed[region_id] = (contracts, evicted, without(contracts, evicted))
+        with self.lock:
+            self.contracts = self.own(self.contracts)
+            for region_id, (seen, evicted, kept) in trimmed.items():
+                if self.contracts.get(region_id) is seen:
+                    self.contracts[region_id] = kept
+                    self.owned.add(region_id)  # type: ignore
+                    continue
+                # written since the snapshot, skip contracts seen again
+                self.contracts = self.own_entry(
+                    self.contracts, region_id, copy_contracts
+                )
+                drop_evicted(self.contracts[region_id], evicted)
         return
 
     def to_json_serializable(self) -> dict[int, dict[int, int]]:
-        return self.contracts
+        return self.snapshot()
 
     def add_contract_seen(self, region_id: int, contract_id: int):
-        if region_id not in self.contracts:
-            self.contracts[region_id] = {}
-        self.contracts[region_id][contract_id] = int(time.time())
+        with self.lock:
+            self.contracts = self.own_entry(self.contracts, region_id, copy_contracts)
+            self.contracts[region_id][contract_id] = int(time.time())
         return
 
     def is_contract_seen(self, region_id: int, contract_id: int) -> bool:
@@ -72,28 +125,102 @@ class ContractHistory(BaseHistory):
 
 
 class ContractSniper(Core):
-    targets: list[int] = []
+    # every type id covered by the targets of any profile, expanded once per change of targets
+    targets: set[int] = set()
 
     def __init__(self, history: dict | None = None, *args, **kwargs):
-        self.history = ContractHistory(history)
-        return super().__init__(CONTRACT_SNIPER, *args, **kwargs)
-
-    def search_contract_in_region(self, region_id: int) -> list[dict]:
-        """returns all unseen item exchange contracts in a region"""
-        content = self.page_aware_get(
-            ESI_URL + f"/contracts/public/{region_id}", 2, True
+        super().__init__(CONTRACT_SNIPER, *args, **kwargs)
+        # contracts are fetched and valued once for every profile, one history per profile
+        self.histories = {
+            profile.name: ContractHistory(history, profile) for profile in self.profiles
+        }
+        self.history = self.histories[self.profiles[0].name]
+        # profile name -> targets and the type ids they cover
+        self.targets_of: dict[str, list[int | dict]] = {}
+        self.profile_targets: dict[str, set[int]] = {}
+        self.archive = (
+            ContractArchive(settings.archive_db, settings.archive_retention_days)
+            if settings.archive_contracts
+            else None
         )
-        contracts = []
-        for contract in content:
-            contract_id = contract["contract_id"]
-            if contract["type"] != "item_exchange":
-                self.log.debug(f"Ignoring non item exchange contract {contract_id}")
+        return
+
+    def unseen_by(self, region_id: int, contract_id: int) -> list[Profile]:
+        """profiles that have not seen a contract yet"""
+        return [
+            profile
+            for profile in self.profiles
+            if not self.histories[profile.name].is_contract_seen(region_id, contract_id)
+        ]
+
+    def add_contract_seen(self, region_id: int, contract_id: int):
+        """a fetched contract is seen by every profile, whether notified or not"""
+        for history in self.histories.values():
+            history.add_contract_seen(region_id, contract_id)
+        return
+
+    def expand_targets(self, targets: list[int | dict]) -> set[int]:
+        """type ids of targets, groups, categories and meta groups are looked up in the local database"""
+        type_ids = set()
+        for target in targets:
+            if isinstance(target, int):
+                type_ids.add(target)
                 continue
-            if self.history.is_contract_seen(region_id, contract_id):
-                self.log.debug(f"Ignoring previously seen contract {contract_id}")
+            keys = TARGET_QUERIES.keys() & target.keys()
+            if len(keys) != 1:
+                self.log.warning(
+                    f"Ignoring target {target}, expected one of {', '.join(TARGET_QUERIES)}"
+                )
                 continue
-            contracts.append(contract)
-        return contracts
+            (key,) = keys
+            start = time.perf_counter()
+            self.cur.execute(TARGET_QUERIES[key], (target[key],))
+            found = {type_id for type_id, in self.cur.fetchall()}
+            metrics.query_duration.observe(
+                self.name, "target_types", value=time.perf_counter() - start
+            )
+            if not found:
+                self.log.warning(f"Target {target} matches no type")
+            type_ids |= found
+        return type_ids
+
+    def update_targets(self):
+        changed = False
+        for profile in self.profiles:
+            targets = (
+                load_targets()
+                if profile.is_default
+                else profile.targets(CONTRACT_SNIPER)
+            )
+            if targets != self.targets_of.get(profile.name):
+                self.profile_targets[profile.name] = self.expand_targets(targets)
+                self.targets_of[profile.name] = targets
+                changed = True
+                self.log.info(
+                    f"Watching {len(self.profile_targets[profile.name])} types from {len(targets)} targets"
+                    + ("" if profile.is_default else f" for {profile.name}")
+                )
+        if changed:
+            self.targets = set().union(*self.profile_targets.values())
+        return
+
+    def search_contract_in_region(self, region_id: int) -> Iterator[dict]:
+        """yields item exchange contracts in a region unseen by any profile, page by page as they are fetched"""
+        for page in self.page_aware_stream(
+            settings.esi_url + f"/contracts/public/{region_id}", 2, True
+        ):
+            for contract in page:
+                contract_id = contract["contract_id"]
+                if contract["type"] != "item_exchange":
+                    self.log.debug(
+                        "Ignoring non item exchange contract %s", contract_id
+                    )
+                    continue
+                if not self.unseen_by(region_id, contract_id):
+                    self.log.debug("Ignoring previously seen contract %s", contract_id)
+                    continue
+                yield contract
+        return
 
     def sort_item_dict(
         self, items: dict[InventoryType, int]
@@ -103,33 +230,39 @@ class ContractSniper(Core):
             sorted(items.items(), key=lambda item: item[0].category_name != "Ship")
         )
 
-    def get_contract_items(self, contract_id: int) -> tuple[str, str, bool]:
-        """returns a tuple of (items sold, items requested), ignoring blue print copy"""
+    def get_contract_items(
+        self, contract_id: int
+    ) -> tuple[str, str, set[int], list[tuple[int, str, int, bool]]]:
+        """
+        returns a tuple of (items sold, items requested, type ids of interest, items), ignoring blue print copy,
+        items are (type_id, type_name, quantity, is_included) as archived
+        """
         items = self.page_aware_get(
-            ESI_URL + f"/contracts/public/items/{contract_id}",
+            settings.esi_url + f"/contracts/public/items/{contract_id}",
             # since contracts routes are cached for longer, sometimes we are querying already completed contracts
             # ESI either returns 204, or 200 with empty content
             expected_status_codes={200, 204},
         )
         if items == []:
-            return ("", "", False)
+            return ("", "", set(), [])
 
         sold, requested = {}, {}
-        has_item_of_interest = False
+        of_interest = set()
         for item in items:
             is_included, quantity, type_id = itemgetter(
                 "is_included", "quantity", "type_id"
             )(item)
 
             if type_id in self.targets:
-                has_item_of_interest = True
+                of_interest.add(type_id)
                 self.log.info(
                     f"Found item of interest {type_id} in contract {contract_id}"
                 )
             if item.get("is_blueprint_copy", False):
                 continue
 
-            self.cur.execute(
+            res = self.query(
+                "inventory_type",
                 """
                 select it.typeID, it.typeName, ig.groupID, ig.groupName, ic.categoryID, ic.categoryName
                 from invTypes it 
@@ -139,7 +272,6 @@ class ContractSniper(Core):
                 """,
                 (type_id,),
             )
-            res = self.cur.fetchone()
             if not res:
                 self.log.warning(
                     f"typeID {type_id} not found, please update local database"
@@ -152,6 +284,11 @@ class ContractSniper(Core):
                 requested[inv_type] = requested.get(inv_type, 0) + quantity
 
         sold = self.sort_item_dict(sold)
+        rows = [
+            (inv_type.type_id, inv_type.type_name, quantity, is_included)
+            for is_included, types in ((True, sold), (False, requested))
+            for inv_type, quantity in types.items()
+        ]
         return (
             "\n".join(
                 f"{inv_type.type_name}\t{quantity}"
@@ -161,7 +298,8 @@ class ContractSniper(Core):
                 f"{inv_type.type_name}\t{quantity}"
                 for inv_type, quantity in requested.items()
             ),
-            has_item_of_interest,
+            of_interest,
+            rows,
         )
 
     def get_appraisal_value(self, items: str, buy: bool = False) -> float:
@@ -170,10 +308,10 @@ class ContractSniper(Core):
             return 0
 
         res = self.post(
-            APPRAISAL_URL,
+            settings.appraisal_url,
             200,
             headers={
-                "X-ApiKey": APPRAISAL_API_KEY,
+                "X-ApiKey": settings.appraisal_api_key,
                 "Accept": "application/json",
                 "Content-Type": "text/plain",
             },
@@ -196,7 +334,7 @@ class ContractSniper(Core):
         """Returns the character name of given character id, "" otherwise"""
         if character_id in self.character_name_cache:
             return self.character_name_cache[character_id]
-        res = self.get(ESI_URL + f"/characters/{character_id}/", 200)
+        res = self.get(settings.esi_url + f"/characters/{character_id}/", 200)
         if res.status_code != 200:
             return ""
         name = res.json()["name"]
@@ -209,20 +347,48 @@ class ContractSniper(Core):
             sold[: sold.find("\t")] == "PLEX" and sold[sold.find("\n") :] == "\n"
         )
 
+    def describe_contract(
+        self,
+        contract: dict,
+        value: float,
+        location: tuple[str, str, float, str, str],
+        sold: str,
+        sold_price: float,
+        requested: str,
+        requested_price: float,
+    ) -> str:
+        """multi line description of a contract, takes no database lookups so it can be built lazily"""
+        station_name, system_name, security, jumps, region_name = location
+        title, contract_id, price, volume, date_issued = itemgetter(
+            "title", "contract_id", "price", "volume", "date_issued"
+        )(contract)
+        return (
+            (f'Contract "{title}"' if title else "Item exchange contract")
+            + f" ({contract_id}) priced at {price:,.0f} isk, valued at {value:,.0f} isk, with {volume:,.0f} m3 volume"
+            + f"\n\tlisted at {date_issued}"
+            + f"\n\tlocated in {station_name}, {system_name} (sec {security:.2}){jumps}, {region_name}"
+            + f"\n\tselling {sold_price:,.0f} isk\n{sold}"
+            + (
+                f"\n\trequesting {requested_price:,.0f} isk\n{requested}"
+                if requested
+                else ""
+            )
+        )
+
     def watch_contract(self):
         """watch for low priced low volume contract"""
-        self.targets = load_targets()
-        for region in REGIONS:
+        self.update_targets()
+        for region in settings.regions:
             region_name, region_id, known_space = itemgetter(
                 "name", "region_id", "known_space"
             )(region)
-            if not known_space:
+            if not known_space or self.region_too_far(region_id):
                 continue
-            contracts = self.search_contract_in_region(region_id)
-            msg = f"Found {len(contracts)} new contracts in {region_name} ({region_id})"
-            self.log.debug(msg) if len(contracts) == 0 else self.log.info(msg)
-
-            for contract in contracts:
+            # the search is lazy, contracts of a page are valued while the next one is fetched
+            polled = time.time()
+            found = 0
+            for contract in self.search_contract_in_region(region_id):
+                found += 1
                 (
                     contract_id,
                     issuer_id,
@@ -242,50 +408,111 @@ class ContractSniper(Core):
                 )(
                     contract
                 )
-                self.log.debug(f"Processing contract {contract_id} {title}")
+                self.log.debug("Processing contract %s %s", contract_id, title)
+                station_name, system_id, *_ = self.get_station_info(station_id)
+                # before fetching items and appraising them
+                if self.too_far(system_id):
+                    self.log.debug("Ignoring contract %s too far away", contract_id)
+                    self.add_contract_seen(region_id, contract_id)
+                    continue
 
-                sold, requested, has_item_of_interest = self.get_contract_items(
+                sold, requested, of_interest, items = self.get_contract_items(
                     contract_id
                 )
+                # contracts queued behind others in the same poll count towards fetch
+                detection = Detection(
+                    parse_esi_time(date_issued), polled, self.last_fetch[1]
+                )
                 if self.should_ignore_contract(sold):
-                    self.log.debug(f"Ignoring buy or BPC only contract {contract_id}")
-                    self.history.add_contract_seen(region_id, contract_id)
+                    self.log.debug("Ignoring buy or BPC only contract %s", contract_id)
+                    self.add_contract_seen(region_id, contract_id)
                     continue
 
                 sold_price = self.get_appraisal_value(sold)
                 requested_price = self.get_appraisal_value(requested, True)
                 value = sold_price - requested_price
-                station_name, system_id, *_ = self.get_station_info(station_id)
                 system_name, security = self.get_system_info(system_id)
-                msg = (
-                    (f'Contract "{title}"' if title else "Item exchange contract")
-                    + f" ({contract_id}) priced at {price:,.0f} isk, valued at {value:,.0f} isk, with {volume:,.0f} m3 volume"
-                    + f"\n\tlisted at {date_issued}"
-                    + f"\n\tlocated in {station_name}, {system_name} (sec {security:.2}), {region_name}"
-                    + f"\n\tselling {sold_price:,.0f} isk\n{sold}"
-                    + (
-                        f"\n\trequesting {requested_price:,.0f} isk\n{requested}"
-                        if requested
-                        else ""
-                    )
+                jumps = self.describe_jumps(system_id)
+                # only built when logged at debug or notified, formatting may run on the log thread
+                details = LazyMessage(
+                    self.describe_contract,
+                    contract,
+                    value,
+                    (station_name, system_name, security, jumps, region_name),
+                    sold,
+                    sold_price,
+                    requested,
+                    requested_price,
                 )
-                self.log.debug(msg)
+                self.log.debug(details)
 
-                if (
+                arbitrage = (
                     sold_price * ARBITRAGE_THRESHOLD >= (price + requested_price)
                     and value >= MIN_VALUE_THRESHOLD
-                ) or (
-                    has_item_of_interest
-                    and sold_price * SPECIAL_THRESHOLD >= (price + requested_price)
-                ):
+                )
+                special = sold_price * SPECIAL_THRESHOLD >= (price + requested_price)
+                # (profile, whether the contract has an item of its targets) to notify,
+                # profiles that saw the contract before are not notified again
+                notified = []
+                for profile in self.unseen_by(region_id, contract_id):
+                    has_item_of_interest = bool(
+                        of_interest & self.profile_targets.get(profile.name, set())
+                    )
+                    if arbitrage or (has_item_of_interest and special):
+                        notified.append((profile, has_item_of_interest))
+                snapshots.record(
+                    snapshots.CONTRACT,
+                    polled,
+                    contract_id=contract_id,
+                    price=price,
+                    sold=sold_price,
+                    requested=requested_price,
+                    of_interest=sorted(of_interest),
+                )
+                if self.archive:
+                    self.archive.add(
+                        region_id,
+                        contract,
+                        items,
+                        sold_price,
+                        requested_price,
+                        bool(notified),
+                    )
+                state.add_contract(
+                    {
+                        "contract_id": contract_id,
+                        "title": title,
+                        "price": price,
+                        "sold_value": sold_price,
+                        "requested_value": requested_price,
+                        "value": value,
+                        "volume": volume,
+                        "has_item_of_interest": bool(of_interest),
+                        "date_issued": date_issued,
+                        "station_name": station_name,
+                        "system_name": system_name,
+                        "jumps": self.get_jumps(system_id),
+                        "region_id": region_id,
+                        "region_name": region_name,
+                        "notified": bool(notified),
+                    }
+                )
+                if notified:
                     issuer = self.get_character_name(issuer_id)
-                    msg = f"{issuer}'s " + msg
+                for profile, has_item_of_interest in notified:
+                    msg = f"{issuer}'s {details}"
                     if has_item_of_interest:
                         msg = "The following contract has item(s) of interest\n\t" + msg
                     self.log.info(msg)
-                    self.send_notification(msg)
+                    self.send_notification(
+                        msg, has_item_of_interest, detection, profile=profile
+                    )
 
-                self.history.add_contract_seen(region_id, contract_id)
+                self.add_contract_seen(region_id, contract_id)
+            msg = f"Found {found} new contracts in {region_name} ({region_id})"
+            self.log.debug(msg) if found == 0 else self.log.info(msg)
+            if self.archive:
+                self.archive.flush()
         return
 
     main = watch_contract
@@ -1,27 +1,23 @@
 import abc
+import concurrent.futures
+import heapq
 import logging
 import requests
 import sqlite3
-import sys
 import threading
 import time
 import traceback
 from calendar import timegm
 from email.utils import parsedate
-from plyer import notification
-
-from .constants import (
-    DB_PATH,
-    TITLE,
-    PUSHOVER_URL,
-    APP_TOKEN,
-    USER_AGENT,
-    USER_KEY,
-    DESKTOP_NOTIFICATION,
-    PUSHOVER_NOTIFICATION,
-    DEBUG,
-    NOTIFICATION_LOG,
-)
+from typing import Callable, Iterator
+
+from . import http_pool, metrics, transport
+from .config import settings
+from .constants import NOTIFICATION_LOG
+from .latency import Detection, tracker
+from .notifier import Notifier
+from .profiles import DEFAULT_PROFILE, Profile
+from .universe import UNREACHABLE, jump_index
 
 
 INIT_BACKOFF = 60
@@ -37,7 +33,83 @@ def get_module_name(name: str) -> str:
     return name[name.rfind(".") + 1 :]
 
 
+def entries_to_evict(entries: dict[int, int], keep: int) -> list[tuple[int, int]]:
+    """returns the oldest (key, timestamp) pairs beyond the newest keep entries"""
+    if len(entries) <= keep:
+        return []
+    return heapq.nsmallest(len(entries) - keep, entries.items(), key=lambda e: e[1])
+
+
+def without(entries: dict, evicted: list[tuple]) -> dict:
+    """copy of entries without the evicted ones"""
+    keys = {key for key, _ in evicted}
+    return {key: t for key, t in entries.items() if key not in keys}
+
+
+def drop_evicted(entries: dict, evicted: list[tuple]):
+    """delete evicted entries in place, skipping those seen again since they were picked"""
+    for key, t in evicted:
+        if entries.get(key) == t:
+            del entries[key]
+    return
+
+
+def expiry_of(res: requests.Response) -> float:
+    """epoch of the Expires header, inf when missing or unparsable"""
+    if "Expires" not in res.headers:
+        return float("inf")
+    parsed_expiry = parsedate(res.headers["Expires"])
+    return timegm(parsed_expiry) if parsed_expiry else float("inf")
+
+
+def etag_key(url: str, params: dict | None = None) -> str:
+    """url with its query params in a stable order, each query and page has an ETag of its own"""
+    if not params:
+        return url
+    return requests.Request("GET", url, params=sorted(params.items())).prepare().url  # type: ignore
+
+
 class BaseHistory(abc.ABC):
+    """
+    histories are written by the feature threads while the main thread trims and dumps them,
+    their maps are copy on write: a snapshot hands out the live maps, a writer copies a map shared
+    with a snapshot before its first write to it, so snapshots stay unchanged without being copied
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # keys of the inner maps copied since the last snapshot, None while the outer map is shared
+        self.owned: set | None = set()
+        return
+
+    def share(self):
+        """mark every map as shared with a snapshot, call with self.lock held"""
+        self.owned = None
+        return
+
+    def own(self, maps: dict) -> dict:
+        """maps, copied if shared with a snapshot, call with self.lock held and keep the result"""
+        if self.owned is None:
+            maps = maps.copy()
+            self.owned = set()
+        return maps
+
+    def own_entry(self, maps: dict, key, copy: Callable) -> dict:
+        """
+        like own, maps[key] is also replaced by copy(maps.get(key)) on its first write since the last snapshot,
+        copies are one inner map once per snapshot, never the whole history
+        """
+        maps = self.own(maps)
+        if key not in self.owned:  # type: ignore
+            maps[key] = copy(maps.get(key))
+            self.owned.add(key)  # type: ignore
+        return maps
+
+    @abc.abstractmethod
+    def snapshot(self) -> object:
+        """return the history at this point in time, safe to iterate while writers continue, never copied"""
+        return object()
+
     @abc.abstractmethod
     def trim(self):
         """trim history to keep size manageable"""
@@ -55,17 +127,37 @@ class Core(abc.ABC):
         name: str,
         session: requests.Session | None = None,
         threaded: threading.Event | None = None,
+        notifier: Notifier | None = None,
+        profiles: list[Profile] | None = None,
     ):
         self.name = name
         self.log = logging.getLogger(name)
-        self.s = session if session else requests.Session()
-        self.s.headers.update({"User-Agent": USER_AGENT})
+        self.s = session if session else http_pool.session()
+        self.s.headers.update({"User-Agent": settings.user_agent})
+        transport.mount(
+            self.s,
+            [settings.esi_url, settings.appraisal_url],
+            settings.transport,
+            settings.capture_file,
+            settings.replay_speed,
+        )
+        # without a shared started notifier, notifications are delivered inline
+        self.notifier = notifier if notifier else Notifier(self.s)
+        # every profile is matched against the same fetched data
+        self.profiles = (
+            profiles if profiles else [Profile(DEFAULT_PROFILE, self.notifier)]
+        )
         self.threaded = threaded
         if not threaded:
-            self.cur = sqlite3.connect(DB_PATH).cursor()
+            self.cur = sqlite3.connect(settings.db_path).cursor()
 
+        # etag_key of a request -> ETag of its last response
         self.get_etags: dict[str, str] = {}
         self.next_poll: int | float = float("inf")
+        # whether the last page_aware_get was answered with 304 Not Modified
+        self.not_modified = False
+        # wall time the last page_aware_get was sent and finished, for detection latency
+        self.last_fetch: tuple[float, float] = (0.0, 0.0)
         return
 
     @abc.abstractmethod
@@ -78,7 +170,7 @@ class Core(abc.ABC):
             raise Exception("run can only be called in threaded mode")
 
         # creates the cursor as SQLite objects created in a thread can only be used in that same thread
-        self.cur = sqlite3.connect(DB_PATH).cursor()
+        self.cur = sqlite3.connect(settings.db_path).cursor()
 
         error_notifications = 0
         backoff = INIT_BACKOFF
@@ -86,7 +178,11 @@ class Core(abc.ABC):
             try:
                 if time.time() >= self.next_poll or self.next_poll == float("inf"):
                     self.next_poll = float("inf")
+                    start = time.perf_counter()
                     self.main()
+                    metrics.cycle_duration.observe(
+                        self.name, value=time.perf_counter() - start
+                    )
                     if self.next_poll == float("inf"):
                         self.log.warning(
                             "No next poll time fetched, defaulting to fixed interval polling"
@@ -106,7 +202,7 @@ class Core(abc.ABC):
                     break
                 backoff = min(backoff * 2, MAX_BACKOFF)
             except:
-                if not DEBUG and error_notifications < MAX_ERROR_NOTIFICATIONS:
+                if not settings.debug and error_notifications < MAX_ERROR_NOTIFICATIONS:
                     error_trace = traceback.format_exc()
                     self.send_notification(
                         f"Unexpected error occurred in {self.name}\n{error_trace}"
@@ -119,41 +215,67 @@ class Core(abc.ABC):
                 backoff = min(backoff * 2, MAX_BACKOFF)
         return
 
-    def send_notification(self, msg: str):
-        """send desktop and pushover notification"""
-        notification_log.info(msg + "\n\n")
-        if DESKTOP_NOTIFICATION:
-            try:
-                if sys.platform.startswith("win"):
-                    notification.notify(
-                        title=TITLE,
-                        message=msg[:256],
-                        app_name=TITLE,
-                    )  # type: ignore
-                else:  # TODO add mac support
-                    self.log.warning(
-                        "No supported desktop notification implementation found"
-                    )
-            except:
-                self.log.exception("Unable to send desktop notification")
+    def send_notification(
+        self,
+        msg: str,
+        critical: bool = False,
+        detection: Detection | None = None,
+        profile: Profile | None = None,
+    ):
+        """
+        log then hand notification over to the notifier of profile, or the default one, critical ones skip the queue
+        detection, of what is notified about, is recorded once delivered
+        """
+        notifier = profile.notifier if profile else self.notifier
+        prefix = f"[{profile.name}] " if profile and not profile.is_default else ""
+        notification_log.info(prefix + msg + "\n\n")
+        metrics.notifications.inc(self.name, critical)
+        delivered = None
+        if detection:
+            detection.submitted = time.time()
+            delivered = lambda: self.record_detection(detection)
+        notifier.submit(msg, critical, delivered)
+        return
 
-        if PUSHOVER_NOTIFICATION:
-            try:
-                data = {
-                    "token": APP_TOKEN,
-                    "user": USER_KEY,
-                    "title": TITLE,
-                    "message": msg,
-                    "priority": 0,
-                    "sound": "eve_chime",
-                }
-                r = self.s.post(PUSHOVER_URL, data=data)
-                if r.status_code != 200:
-                    raise Exception(f"Status code {r.status_code}, {r.content}")
-            except:
-                self.log.exception("Unable to send pushover notification")
+    def record_detection(self, detection: Detection):
+        """track detection latency, alerting when it drifts over the objective"""
+        detection.delivered = time.time()
+        alert = tracker.record(self.name, detection)
+        if alert:
+            self.log.warning(alert)
+            self.send_notification(alert)
+        return
+
+    def record_response(
+        self,
+        method: str,
+        url: str,
+        res: requests.Response,
+        elapsed: float,
+        conditional: bool | None = None,
+    ):
+        """report a response to metrics, conditional is whether If-None-Match was sent for GETs"""
+        path = metrics.endpoint(url)
+        metrics.request_duration.observe(self.name, method, path, value=elapsed)
+        metrics.responses.inc(self.name, path, res.status_code)
+        metrics.response_bytes.inc(self.name, path, amount=len(res.content))
+        if conditional is not None:
+            result = "none"
+            if conditional:
+                result = "hit" if res.status_code == 304 else "miss"
+            metrics.etag_requests.inc(self.name, path, result)
         return
 
+    def query(self, name: str, sql: str, params: tuple) -> tuple | None:
+        """fetch one row from the local database, timed under name"""
+        start = time.perf_counter()
+        self.cur.execute(sql, params)
+        res = self.cur.fetchone()
+        metrics.query_duration.observe(
+            self.name, name, value=time.perf_counter() - start
+        )
+        return res
+
     def get(
         self,
         url: str,
@@ -164,11 +286,17 @@ class Core(abc.ABC):
         """logs a warning if unexpected status code is received, transparently handles ETag caching"""
         if isinstance(expected_status_codes, int):
             expected_status_codes = {expected_status_codes}
-        if url in self.get_etags:
-            if "headers" not in kwargs:
-                kwargs["headers"] = {}
-            kwargs["headers"]["If-None-Match"] = self.get_etags[url]
+        key = etag_key(url, kwargs.get("params"))
+        conditional = key in self.get_etags
+        if conditional:
+            # a copy, the caller's headers are reused for other queries and pages
+            kwargs["headers"] = {
+                **(kwargs.get("headers") or {}),
+                "If-None-Match": self.get_etags[key],
+            }
+        start = time.perf_counter()
         res = self.s.get(url, *args, **kwargs)
+        self.record_response("GET", url, res, time.perf_counter() - start, conditional)
         if res.status_code not in expected_status_codes:
             self.log.warning(
                 f"Request failed at {res.url}, status code {res.status_code}\n\t{res.content}"
@@ -177,7 +305,7 @@ class Core(abc.ABC):
             # handles eve cluster daily reset, returns 504 or 520 usually
             raise requests.exceptions.ConnectionError("Server return 5xx error")
         if "ETag" in res.headers:
-            self.get_etags[url] = res.headers["ETag"]
+            self.get_etags[key] = res.headers["ETag"]
         return res
 
     def page_aware_get(
@@ -189,40 +317,95 @@ class Core(abc.ABC):
         **kwargs,
     ) -> list:
         """return a list of objects over potentially many pages, only keeping last n pages"""
+        contents = []
+        for page in self.page_aware_stream(
+            url, last_n_page, update_next_poll, *args, **kwargs
+        ):
+            contents += page
+        return contents
+
+    def page_aware_stream(
+        self,
+        url: str,
+        last_n_page: int | float = float("inf"),
+        update_next_poll: bool = False,
+        *args,
+        **kwargs,
+    ) -> Iterator[list]:
+        """
+        yield the objects of each page as it arrives, only the last n pages,
+        the next page is requested while the caller processes the current one
+        """
         expected_status_codes = {200, 304}
         if "expected_status_codes" in kwargs:
             expected_status_codes = {
                 *expected_status_codes,
                 *kwargs.pop("expected_status_codes"),
             }
+        sent = time.time()
         res = self.get(url, expected_status_codes, *args, **kwargs)
+        self.not_modified = res.status_code == 304
+        self.last_fetch = (sent, time.time())
 
-        EXPIRES = "Expires"
-        if update_next_poll and EXPIRES in res.headers:
-            parsed_expiry = parsedate(res.headers[EXPIRES])
-            expiry = timegm(parsed_expiry) if parsed_expiry else float("inf")
+        if update_next_poll and "Expires" in res.headers:
+            expiry = expiry_of(res)
             next_poll = min(self.next_poll, expiry)
             self.log.debug(
-                f"resource expiry {expiry}, next poll {self.next_poll} -> {next_poll}"
+                "resource expiry %s, next poll %s -> %s",
+                expiry,
+                self.next_poll,
+                next_poll,
             )
             self.next_poll = next_poll
 
+        path = metrics.endpoint(url)
         if res.status_code != 200 or len(res.content) == 0:
-            return []
+            metrics.pages_per_call.observe(self.name, path, value=1)
+            return
         if ESI_PAGE_KEY not in res.headers:
-            return res.json()
+            metrics.pages_per_call.observe(self.name, path, value=1)
+            yield res.json()
+            return
 
         total_pages = int(res.headers.get(ESI_PAGE_KEY, 1))
         curr_page = max(1, total_pages - last_n_page)
-        contents = res.json() if curr_page == 1 else []
-        while curr_page < total_pages:
-            curr_page += 1
-            res = self.get(
-                url, expected_status_codes, params={"page": curr_page}, *args, **kwargs
+        metrics.pages_per_call.observe(
+            self.name, path, value=1 + total_pages - curr_page
+        )
+        params = kwargs.pop("params", None) or {}
+
+        def fetch(page: int) -> requests.Response:
+            return self.get(
+                url,
+                expected_status_codes,
+                *args,
+                params={**params, "page": page},
+                **kwargs,
             )
-            if res.status_code == 200 and len(res.content) > 0:
-                contents += res.json()
-        return contents
+
+        # at most one page in flight, started before the current one is handed over
+        with concurrent.futures.ThreadPoolExecutor(
+            1, thread_name_prefix=self.name
+        ) as executor:
+            pending = (
+                executor.submit(fetch, curr_page + 1)
+                if curr_page < total_pages
+                else None
+            )
+            if curr_page == 1:
+                yield res.json()
+            while pending:
+                res = pending.result()
+                curr_page += 1
+                pending = (
+                    executor.submit(fetch, curr_page + 1)
+                    if curr_page < total_pages
+                    else None
+                )
+                self.last_fetch = (sent, time.time())
+                if res.status_code == 200 and len(res.content) > 0:
+                    yield res.json()
+        return
 
     def post(
         self,
@@ -234,7 +417,9 @@ class Core(abc.ABC):
         """logs a warning if unexpected status code is received"""
         if isinstance(expected_status_codes, int):
             expected_status_codes = {expected_status_codes}
+        start = time.perf_counter()
         res = self.s.post(url, *args, **kwargs)
+        self.record_response("POST", url, res, time.perf_counter() - start)
         if res.status_code not in expected_status_codes:
             self.log.warning(
                 f"Request failed at {res.url}, status code {res.status_code}\n\t{res.content}"
@@ -243,22 +428,49 @@ class Core(abc.ABC):
 
     def get_station_info(self, station_id: int) -> tuple[str, int, float]:
         """returns a tuple of (station_name, system_id, security)"""
-        self.cur.execute(
+        res = self.query(
+            "station_info",
             """select stationName, solarSystemID, security from staStations where stationID = ?""",
             (station_id,),
         )
-        res = self.cur.fetchone()
         if res == None:
             return ("player citadel", 0, 0.0)
         return res
 
+    def get_jumps(self, system_id: int) -> int | None:
+        """jumps from the closest of HOME_SYSTEMS, None when unset or the system is unknown"""
+        if not jump_index.update(self.cur):
+            return None
+        return jump_index.jumps(system_id)
+
+    def too_far(self, system_id: int) -> bool:
+        """whether a system is more than MAX_JUMPS away, systems not in the local database never are"""
+        if settings.max_jumps is None:
+            return False
+        jumps = self.get_jumps(system_id)
+        return jumps is not None and jumps > settings.max_jumps
+
+    def region_too_far(self, region_id: int) -> bool:
+        """whether every system of a region is more than MAX_JUMPS away"""
+        if settings.max_jumps is None or not jump_index.update(self.cur):
+            return False
+        jumps = jump_index.region_jumps(region_id)
+        return jumps is not None and jumps > settings.max_jumps
+
+    def describe_jumps(self, system_id: int) -> str:
+        """distance to append to a location in messages, empty without HOME_SYSTEMS"""
+        jumps = self.get_jumps(system_id)
+        if jumps is None:
+            return ""
+        return " (unreachable)" if jumps == UNREACHABLE else f" ({jumps} jumps)"
+
     def get_system_info(self, system_id: int) -> tuple[str, float]:
         """returns a tuple of (system_name, security)"""
-        self.cur.execute(
+        res = self.query(
+            "system_info",
             """select solarSystemName, security from mapSolarSystems where solarSystemID = ?""",
             (system_id,),
         )
-        res = self.cur.fetchone()
         if res == None:
             return ("unknown system", 0.0)
         return res
@@ -0,0 +1,112 @@
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import metrics
+from .config import settings
+
+# esi, appraisal and pushover, with room to spare so pools and their counts are never evicted
+POOL_HOSTS = 8
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = (502, 503, 504)
+ACCEPT_ENCODING = "gzip, deflate"
+
+
+class PooledAdapter(HTTPAdapter):
+    """
+    keeps connections alive across every session it is mounted on,
+    counts compressed bytes read off the wire and how many requests reused a connection per host
+    """
+
+    def send(self, request: requests.PreparedRequest, stream: bool = False, **kwargs):
+        res = super().send(request, stream=stream, **kwargs)
+        if not stream:
+            # read now, the connection goes back to the pool and its wire bytes are known
+            res.content
+            host = urlsplit(request.url).hostname or ""
+            metrics.wire_bytes.inc(host, amount=res.raw.tell())
+        self.report()
+        return res
+
+    def stats(self) -> dict[str, tuple[int, int]]:
+        """host -> (requests sent, connections opened)"""
+        stats: dict[str, tuple[int, int]] = {}
+        pools = self.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            sent, opened = stats.get(pool.host, (0, 0))
+            stats[pool.host] = (sent + pool.num_requests, opened + pool.num_connections)
+        return stats
+
+    def report(self):
+        for host, (sent, opened) in self.stats().items():
+            metrics.pool_requests.set(host, value=sent)
+            metrics.pool_connections.set(host, value=opened)
+        return
+
+    def close(self):
+        """sessions closing must not drop connections other sessions use, see http_pool.close"""
+        return
+
+
+def retry_policy(retries: int) -> Retry:
+    """
+    retries connections that could not be made for any method, and GETs answered with a gateway error,
+    POSTs are never resent once sent, ESI error limits (420) and rate limits (429) are left to the callers
+    """
+    return Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        # the last response is returned, callers already handle 5xx
+        raise_on_status=False,
+        respect_retry_after_header=True,
+    )
+
+
+adapter: PooledAdapter | None = None
+pool_lock = threading.Lock()
+
+
+def get_adapter() -> PooledAdapter:
+    """the process wide adapter, created on first use with the current settings"""
+    global adapter
+    with pool_lock:
+        if adapter is None:
+            adapter = PooledAdapter(
+                pool_connections=POOL_HOSTS,
+                pool_maxsize=settings.http_pool_size,
+                max_retries=retry_policy(settings.http_retries),
+            )
+        return adapter
+
+
+def session() -> requests.Session:
+    """a session with its own headers and ETags, sending through the shared connection pool"""
+    s = requests.Session()
+    shared = get_adapter()
+    s.mount("https://", shared)
+    s.mount("http://", shared)
+    s.headers.update(
+        {"User-Agent": settings.user_agent, "Accept-Encoding": ACCEPT_ENCODING}
+    )
+    return s
+
+
+def close():
+    """close every pooled connection, the next session gets a fresh pool"""
+    global adapter
+    with pool_lock:
+        if adapter is not None:
+            HTTPAdapter.close(adapter)
+            adapter = None
+    return
@@ -0,0 +1,139 @@
+import collections
+import dataclasses
+import threading
+import time
+from calendar import timegm
+
+from . import metrics
+from .config import settings
+
+STAGES = ("cache", "fetch", "appraisal", "dispatch")
+TOTAL = "total"
+ROLLING_WINDOW = 500  # detections per feature kept for percentiles
+MIN_SAMPLES = 20  # before the slo is checked
+SLO_QUANTILE = 0.95
+ALERT_COOLDOWN = 60 * 60
+ESI_TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def parse_esi_time(value: str) -> float:
+    """epoch seconds of an ESI timestamp such as 2024-01-01T00:00:00Z"""
+    return timegm(time.strptime(value, ESI_TIME_FORMAT))
+
+
+def percentile(values: list[float], q: float) -> float:
+    """nearest rank percentile of unsorted values"""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(q * len(ordered) + 0.5) - 1))]
+
+
+@dataclasses.dataclass
+class Detection:
+    """
+    wall clock timestamps of one order or contract on its way to a notification
+    cache is issued until we requested it, so time spent waiting for ESI cache expiry and our poll,
+    fetch until everything about it was downloaded, appraisal until the notification was submitted
+    and dispatch until the notifier delivered it
+    """
+
+    issued: float
+    polled: float
+    fetched: float
+    submitted: float = 0.0
+    delivered: float = 0.0
+
+    def stages(self) -> dict[str, float]:
+        bounds = (
+            self.issued,
+            self.polled,
+            self.fetched,
+            self.submitted,
+            self.delivered,
+        )
+        durations = {
+            stage: max(0.0, end - start)
+            for stage, start, end in zip(STAGES, bounds, bounds[1:])
+        }
+        return {**durations, TOTAL: sum(durations.values())}
+
+
+class LatencyTracker:
+    """
+    rolling window of detection latency per feature and stage, each detection is also observed by metrics,
+    slo defaults to settings, record returns an alert message when the p95 total drifts over the slo, at most once per cooldown
+    """
+
+    def __init__(
+        self,
+        slo: float | None = None,
+        window: int = ROLLING_WINDOW,
+        cooldown: float = ALERT_COOLDOWN,
+    ):
+        self.slo = slo
+        self.window = window
+        self.cooldown = cooldown
+        # ignore what was issued before we started, the first poll would report the whole backlog
+        self.started = time.time()
+        self.samples: dict[tuple[str, str], collections.deque[float]] = {}
+        self.last_alert: dict[str, float] = {}
+        self.lock = threading.Lock()
+        return
+
+    def record(self, feature: str, detection: Detection) -> str | None:
+        if detection.issued < self.started:
+            return None
+        stages = detection.stages()
+        with self.lock:
+            for stage, seconds in stages.items():
+                key = (feature, stage)
+                if key not in self.samples:
+                    self.samples[key] = collections.deque(maxlen=self.window)
+                self.samples[key].append(seconds)
+        for stage, seconds in stages.items():
+            metrics.detection_latency.observe(feature, stage, value=seconds)
+        return self.check_slo(feature)
+
+    def percentile(self, feature: str, q: float, stage: str = TOTAL) -> float:
+        with self.lock:
+            values = list(self.samples.get((feature, stage), ()))
+        return percentile(values, q)
+
+    def count(self, feature: str) -> int:
+        return len(self.samples.get((feature, TOTAL), ()))
+
+    def check_slo(self, feature: str) -> str | None:
+        if self.count(feature) < MIN_SAMPLES:
+            return None
+        p95 = self.percentile(feature, SLO_QUANTILE)
+        now = time.time()
+        slo = settings.detection_slo if self.slo is None else self.slo
+        if p95 <= slo or now - self.last_alert.get(feature, 0) < self.cooldown:
+            return None
+        self.last_alert[feature] = now
+        return (
+            f"{feature} detection latency p95 {p95:,.0f}s over the {slo:,.0f}s objective"
+            + f"\n\t{self.breakdown(feature)}"
+        )
+
+    def breakdown(self, feature: str) -> str:
+        """p50/p95 of each stage, shows which one to speed up"""
+        return ", ".join(
+            f"{stage} p50 {self.percentile(feature, 0.5, stage):,.1f}s"
+            + f" p95 {self.percentile(feature, SLO_QUANTILE, stage):,.1f}s"
+            for stage in (*STAGES, TOTAL)
+        )
+
+    def summary(self) -> str:
+        with self.lock:
+            features = sorted({feature for feature, _ in self.samples})
+        lines = ["detection latency"]
+        for feature in features:
+            lines.append(
+                f"\t{feature} detections {self.count(feature)}, {self.breakdown(feature)}"
+            )
+        return "\n".join(lines)
+
+
+tracker = LatencyTracker()
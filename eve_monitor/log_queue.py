@@ -0,0 +1,58 @@
+import logging
+import logging.handlers
+import queue
+from typing import Callable
+
+
+class LazyMessage:
+    """log message built by calling fn(*args) only when a handler formats the record"""
+
+    __slots__ = ("fn", "args")
+
+    def __init__(self, fn: Callable[..., str], *args):
+        self.fn = fn
+        self.args = args
+        return
+
+    def __str__(self) -> str:
+        return self.fn(*self.args)
+
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """
+    hands records to a listener thread as they are, unlike QueueHandler which formats them first,
+    so formatting and file writes both happen off the logging thread, only for in process queues
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.enqueue(record)
+        except Exception:
+            self.handleError(record)
+        return
+
+
+# started by attach, stopped by stop
+listeners: list[logging.handlers.QueueListener] = []
+
+
+def attach(logger: logging.Logger, handlers: list[logging.Handler]):
+    """replace handlers of logger with a queue drained by a listener thread calling handlers"""
+    q: queue.SimpleQueue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(q, *handlers, respect_handler_level=True)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(LocalQueueHandler(q))
+    listener.start()
+    listeners.append(listener)
+    return
+
+
+def stop():
+    """flush queued records and stop listener threads"""
+    while listeners:
+        listeners.pop().stop()
+    return
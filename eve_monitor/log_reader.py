@@ -0,0 +1,89 @@
+import os
+import threading
+from array import array
+
+READ_BLOCK_SIZE = 1024 * 1024
+SCAN_LINES = 1000  # lines read per seek when filtering backwards
+
+
+class LogIndex:
+    """
+    line offset index over a log file, extended incrementally as the file grows and rebuilt when it's rotated
+    lines are numbered from 0, the oldest line in the file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # offsets[i] is where line i starts, the last entry is the end of the last complete line
+        self.offsets = array("q", [0])
+        self.inode: int | None = None
+        self.lock = threading.Lock()
+        return
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def refresh(self):
+        """index lines appended since last refresh"""
+        with self.lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                self.offsets, self.inode = array("q", [0]), None
+                return
+            if stat.st_ino != self.inode or stat.st_size < self.offsets[-1]:
+                self.offsets, self.inode = array("q", [0]), stat.st_ino
+            if stat.st_size == self.offsets[-1]:
+                return
+            with open(self.path, "rb") as f:
+                pos = f.seek(self.offsets[-1])
+                while block := f.read(READ_BLOCK_SIZE):
+                    i = block.find(b"\n")
+                    while i != -1:
+                        self.offsets.append(pos + i + 1)
+                        i = block.find(b"\n", i + 1)
+                    pos += len(block)
+        return
+
+    def read(self, start: int, stop: int) -> list[str]:
+        """returns lines [start, stop) with one seek"""
+        with self.lock:
+            start, stop = max(0, start), min(stop, len(self))
+            if start >= stop:
+                return []
+            begin, end = self.offsets[start], self.offsets[stop]
+        with open(self.path, "rb") as f:
+            f.seek(begin)
+            data = f.read(end - begin)
+        return str(data, "utf-8", "replace").split("\n")[: stop - start]
+
+    def page(
+        self, before: int | None = None, limit: int = 500, query: str = ""
+    ) -> tuple[list[tuple[int, str]], int | None]:
+        """
+        returns up to limit (line number, line) ending before line before, or the end of the file, oldest first,
+        only lines containing query if given, along with the cursor for the previous page or None if at the start
+        """
+        self.refresh()
+        end = len(self) if before is None else min(before, len(self))
+        if not query:
+            start = max(0, end - limit)
+            lines = list(enumerate(self.read(start, end), start))
+            return lines, start if start > 0 else None
+
+        chunks: list[list[tuple[int, str]]] = []
+        start, found = end, 0
+        while start > 0 and found < limit:
+            stop, start = start, max(0, start - SCAN_LINES)
+            chunk = [
+                (i, line)
+                for i, line in enumerate(self.read(start, stop), start)
+                if query in line
+            ]
+            chunks.append(chunk)
+            found += len(chunk)
+        matches = [match for chunk in reversed(chunks) for match in chunk]
+        if len(matches) >= limit:
+            matches = matches[-limit:]
+            start = matches[0][0]
+        return matches, start if start > 0 else None
@@ -0,0 +1,125 @@
+import collections
+import logging
+import os
+import threading
+
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class LogStream(logging.Handler):
+    """
+    keeps the most recent log lines in a ring buffer, and collects new lines until drained
+    so subscribers can publish them in batches instead of once per line
+    every line gets a sequence number, so subscribers can resume from the last one they saw
+    """
+
+    def __init__(self, capacity: int, level: int = logging.NOTSET):
+        super().__init__(level)
+        self.lines: collections.deque[tuple[int, str]] = collections.deque(
+            maxlen=capacity
+        )
+        self.pending: list[tuple[int, str]] = []
+        self.has_pending = threading.Event()
+        self.seq = 0  # of the last line appended
+        self.drained = 0  # of the last line drained
+        return
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+        return
+
+    def append(self, text: str):
+        """add a possibly multi line message"""
+        with self.lock:  # type: ignore
+            for line in text.split("\n"):
+                self.seq += 1
+                self.lines.append((self.seq, line))
+                self.pending.append((self.seq, line))
+        self.has_pending.set()
+        return
+
+    def backlog(self, n: int, upto: int | None = None) -> list[tuple[int, str]]:
+        """returns up to the last n (seq, line), only those up to seq upto when given"""
+        with self.lock:  # type: ignore
+            lines = list(self.lines)
+            if upto is not None:
+                lines = lines[: max(0, len(lines) - (self.seq - upto))]
+        return lines[-n:]
+
+    def since(self, seq: int, upto: int | None = None) -> list[tuple[int, str]] | None:
+        """
+        returns (seq, line) after seq, only those up to seq upto when given,
+        None if some of them are no longer buffered
+        """
+        with self.lock:  # type: ignore
+            first = self.lines[0][0] if self.lines else self.seq + 1
+            if seq > self.seq or seq < first - 1:
+                return None
+            lines = list(self.lines)[len(self.lines) - (self.seq - seq) :]
+            if upto is not None:
+                lines = lines[: max(0, upto - seq)]
+            return lines
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """block until new lines are pending, returns False on timeout"""
+        return self.has_pending.wait(timeout)
+
+    def drain(self) -> list[tuple[int, str]]:
+        """returns and clears (seq, line) added since last drained"""
+        with self.lock:  # type: ignore
+            pending, self.pending = self.pending, []
+            self.drained = self.seq
+            self.has_pending.clear()
+        return pending
+
+
+def read_last_lines(path: str, n: int) -> list[str]:
+    """returns last n lines of a file, reading backwards in blocks"""
+    if not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        data = b""
+        while end > 0 and data.count(b"\n") <= n:
+            start = max(0, end - READ_BLOCK_SIZE)
+            f.seek(start)
+            data = f.read(end - start) + data
+            end = start
+    return str(data, "utf-8", "replace").splitlines()[-n:]
+
+
+def follow(path: str, stream: LogStream, stop: threading.Event, interval: float):
+    """
+    feed lines appended to a log file written by another process into stream,
+    checks for new content every interval seconds and starts over when the file is rotated
+    """
+    f, inode, partial = None, None, b""
+    if os.path.exists(path):
+        f = open(path, "rb")
+        f.seek(0, os.SEEK_END)
+        inode = os.fstat(f.fileno()).st_ino
+        lines = read_last_lines(path, stream.lines.maxlen or 0)
+        if lines:
+            stream.append("\n".join(lines))
+    while not stop.wait(interval):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if f is None or stat.st_ino != inode or stat.st_size < f.tell():
+            if f is not None:
+                f.close()
+            f = open(path, "rb")
+            inode, partial = stat.st_ino, b""
+        data = partial + f.read()
+        if not data:
+            continue
+        complete, _, partial = data.rpartition(b"\n")
+        if complete:
+            stream.append(str(complete, "utf-8", "replace"))
+    if f is not None:
+        f.close()
+    return
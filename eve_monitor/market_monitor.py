@@ -1,17 +1,48 @@
 import dataclasses
-import json
 import time
 from operator import itemgetter
+from typing import Iterator
 
-from .constants import ESI_URL, TARGETS_JSON, REGIONS_JSON, REGIONS
-from .core import BaseHistory, Core, get_module_name
+from . import snapshots
+from .config import TARGETS, settings
+from .core import (
+    BaseHistory,
+    Core,
+    drop_evicted,
+    entries_to_evict,
+    get_module_name,
+    without,
+)
+from .latency import Detection, parse_esi_time
+from .order_book import OrderBook, PriceWindow
+from .profiles import Profile
+from .state import state
 
 MARKET_MONITOR = get_module_name(__name__)
 LAST_ORDER_TO_CACHE = 50
+# seconds a price drop is measured over, unless a target sets its own window
+DROP_WINDOW = 60 * 60
+# what the order book keeps of an order
+BOOK_FIELDS = (
+    "order_id",
+    "type_id",
+    "is_buy_order",
+    "price",
+    "volume_remain",
+    "min_volume",
+)
 
 
 def load_targets() -> list[dict]:
-    return json.load(open(TARGETS_JSON))[MARKET_MONITOR]
+    settings.reload(TARGETS)
+    return settings.targets.get(MARKET_MONITOR, [])
+
+
+def load_profile_targets(profile: Profile | None) -> list[dict]:
+    """targets of profile, the default profile reads the shared targets file"""
+    if profile == None or profile.is_default:
+        return load_targets()
+    return profile.targets(MARKET_MONITOR)
 
 
 @dataclasses.dataclass
@@ -21,23 +52,27 @@ class ItemRecord:
     orders_seen: dict[int, int] = dataclasses.field(default_factory=dict)
 
     def trim(self):
-        if len(self.orders_seen) <= LAST_ORDER_TO_CACHE:
-            return
-        orders = [(oid, t) for oid, t in self.orders_seen.items()]
-        orders.sort(key=lambda o: o[1], reverse=True)
-        self.orders_seen = {oid: t for oid, t in orders[:LAST_ORDER_TO_CACHE]}
+        for oid, _ in entries_to_evict(self.orders_seen, LAST_ORDER_TO_CACHE):
+            del self.orders_seen[oid]
         return
 
 
+def copy_record(item: ItemRecord) -> ItemRecord:
+    return dataclasses.replace(item, orders_seen=item.orders_seen.copy())
+
+
 class MarketHistory(BaseHistory):
-    def __init__(self, history: dict | None = None):
+    def __init__(self, history: dict | None = None, profile: Profile | None = None):
         """
-        optionally takes a dict loaded from history file, loaded the MARKET_MONITOR part if available
+        optionally takes a dict loaded from history file, loaded the MARKET_MONITOR part of profile if available
         modify input history to point to initialized object if given
         """
+        super().__init__()
+        self.profile = profile
+        self.key = profile.history_key(MARKET_MONITOR) if profile else MARKET_MONITOR
         self.items: dict[int, ItemRecord] = {}
-        if history != None and MARKET_MONITOR in history:
-            items = history[MARKET_MONITOR]
+        if history != None and self.key in history:
+            items = history[self.key]
             for item in items:
                 type_id, name, orders_seen = itemgetter(
                     "type_id", "name", "orders_seen"
@@ -46,13 +81,17 @@ class MarketHistory(BaseHistory):
                     type_id, name, {int(oid): t for oid, t in orders_seen.items()}
                 )
         if history != None:
-            history[MARKET_MONITOR] = self
+            history[self.key] = self
         return
 
     def add_order_seen(self, type_id: int, name: str, order_id: int):
-        if type_id not in self.items:
-            self.items[type_id] = ItemRecord(type_id=type_id, name=name)
-        self.items[type_id].orders_seen[order_id] = int(time.time())
+        with self.lock:
+            self.items = self.own_entry(
+                self.items,
+                type_id,
+                lambda item: copy_record(item) if item else ItemRecord(type_id, name),
+            )
+            self.items[type_id].orders_seen[order_id] = int(time.time())
         return
 
     def is_order_seen(self, type_id: int, order_id: int) -> bool:
@@ -60,117 +99,319 @@ class MarketHistory(BaseHistory):
             return False
         return order_id in self.items[type_id].orders_seen
 
+    def __len__(self) -> int:
+        return sum(len(item.orders_seen) for item in list(self.items.values()))
+
+    def snapshot(self) -> dict[int, ItemRecord]:
+        with self.lock:
+            self.share()
+            return self.items
+
     def trim(self):
-        targets = {t["type_id"] for t in load_targets()}
-        items = {}
-        for item in self.items.values():
-            if item.type_id not in targets:
+        targets = {t["type_id"] for t in load_profile_targets(self.profile)}
+        # pick evictions and build the trimmed records from a snapshot, then only hold the lock to swap them in
+        trimmed = {}
+        for type_id, item in self.snapshot().items():
+            if type_id not in targets:
                 continue
-            item.trim()
-            items[item.type_id] = item
-        self.items = items
+            evicted = entries_to_evict(item.orders_seen, LAST_ORDER_TO_CACHE)
+            if evicted:
+                kept = dataclasses.replace(
+                    item, orders_seen=without(item.orders_seen, evicted)
+                )
+                trimmed[type_id] = (item, evicted, kept)
+        with self.lock:
+            self.items = {
+                type_id: item
+                for type_id, item in self.own(self.items).items()
+                if type_id in targets
+            }
+            for type_id, (seen, evicted, kept) in trimmed.items():
+                if self.items.get(type_id) is seen:
+                    self.items[type_id] = kept
+                    self.owned.add(type_id)  # type: ignore
+                    continue
+                # written since the snapshot, skip orders seen again
+                self.items = self.own_entry(self.items, type_id, copy_record)
+                drop_evicted(self.items[type_id].orders_seen, evicted)
         return
 
     def to_json_serializable(self) -> list:
-        return [dataclasses.asdict(item) for item in self.items.values()]
+        return [dataclasses.asdict(item) for item in self.snapshot().values()]
 
 
 class MarketMonitor(Core):
     def __init__(self, history: dict | None = None, *args, **kwargs):
-        # only stores order_ids that has been sent to client
-        self.history = MarketHistory(history)
-        return super().__init__(MARKET_MONITOR, *args, **kwargs)
-
-    def get_region_info(self):
-        """
-        Get the region info, save to regions.json
-        Returns True when successfully made all requests
-        """
-        res = self.get(ESI_URL + "/universe/regions/", 200)
-        if res.status_code != 200:
-            return False
-
-        regions = []
-        for region_id in res.json():
-            res = self.get(ESI_URL + f"/universe/regions/{region_id}/", 200)
-            if res.status_code != 200:
-                continue
-            res = res.json()
-            regions.append(
-                {
-                    "name": res["name"],
-                    "region_id": res["region_id"],
-                    "known_space": True if res.get("description") else False,
-                }
-            )
-
-        json.dump(
-            regions, open(REGIONS_JSON, "w+", encoding="utf-8", newline="\n"), indent=4
-        )
-        return True
+        super().__init__(MARKET_MONITOR, *args, **kwargs)
+        # only stores order_ids that has been sent to client, one history per profile
+        self.histories = {
+            profile.name: MarketHistory(history, profile) for profile in self.profiles
+        }
+        self.history = self.histories[self.profiles[0].name]
+        # best bid and ask of every watched type and region, updated with each fetch
+        self.book = OrderBook()
+        # (type_id, region_id, window) -> highest best ask within window seconds
+        self.windows: dict[tuple[int, int, float], PriceWindow] = {}
+        # (profile name, type_id, region_id, window) -> (order_id, price) last notified as a drop,
+        # orders keep their id when repriced so the price is part of what was notified
+        self.drops: dict[tuple[str, int, int, float], tuple[int, float]] = {}
+        return
 
     def get_item_orders_in_region(
         self, type_id: int, region_id: int, order_type: str = "sell"
-    ):
+    ) -> Iterator[list[dict]]:
         """
         Get the given item orders in given region
         Args:
             order_type (str): one of "buy", "sell", "all"; default to sell
-        Returns a list of order found, [] otherwise
+        Yields the orders of each page as it is fetched, nothing when not modified
         """
-        return self.page_aware_get(
-            ESI_URL + f"/markets/{region_id}/orders/",
+        return self.page_aware_stream(
+            settings.esi_url + f"/markets/{region_id}/orders/",
             update_next_poll=True,
             params={"type_id": type_id, "order_type": order_type},
         )
 
-    def watch_market(self):
-        """watch market orders for items in TARGETS.market_monitor"""
-        # load each time to enable hot reload
-        targets = load_targets()
-        for target in targets:
-            if target.get("ignored", False):
+    def alert(
+        self,
+        profile: Profile,
+        type_id: int,
+        name: str,
+        order: dict,
+        what: str,
+        region_name: str,
+        polled: float,
+        fetched: float,
+        once: bool = True,
+    ):
+        """
+        notify profile of an order, what is followed by where the order is,
+        once per order through the profile's history unless once is False
+        """
+        history = self.histories[profile.name]
+        order_id, system_id, volume_remain, volume_total = itemgetter(
+            "order_id", "system_id", "volume_remain", "volume_total"
+        )(order)
+        if once and history.is_order_seen(type_id, order_id):
+            return
+        system = self.get_system_info(system_id)[0]
+        msg = f"{what} in {system}{self.describe_jumps(system_id)}, {region_name}, {volume_remain}/{volume_total}"
+        self.log.info(msg)
+        self.send_notification(
+            msg,
+            detection=Detection(parse_esi_time(order["issued"]), polled, fetched),
+            profile=profile,
+        )
+        if once:
+            history.add_order_seen(type_id, name, order_id)
+        return
+
+    def watch_bids(
+        self,
+        type_id: int,
+        name: str,
+        region: dict,
+        interested: list[tuple[Profile, dict]],
+        orders: dict[int, dict],
+        polled: float,
+        fetched: float,
+    ):
+        """notify bids at or above sell_to, walking the book down from the best bid"""
+        region_name, region_id = itemgetter("name", "region_id")(region)
+        levels = self.book.levels.get(type_id, {}).get(region_id)
+        if not levels:
+            return
+        for profile, target in interested:
+            sell_to = target.get("sell_to")
+            if sell_to is None:
                 continue
+            for neg_price, order_id in levels.bids:
+                if -neg_price < sell_to:
+                    break
+                # unchanged orders are not fetched again, they were already notified
+                order = orders.get(order_id)
+                if order is None or self.too_far(order["system_id"]):
+                    continue
+                self.alert(
+                    profile,
+                    type_id,
+                    name,
+                    order,
+                    f"{name} buy order at {-neg_price:,.0f} isk",
+                    region_name,
+                    polled,
+                    fetched,
+                )
+        return
 
-            orders_seen = 0
-            tar_region_id = target.get("region", None)
-            type_id, name, threshold = itemgetter("type_id", "name", "threshold")(
-                target
+    def watch_drops(
+        self,
+        type_id: int,
+        name: str,
+        region: dict,
+        interested: list[tuple[Profile, dict]],
+        orders: dict[int, dict],
+        polled: float,
+        fetched: float,
+    ):
+        """notify when the best ask fell by drop or more from the highest best ask within window seconds"""
+        region_name, region_id = itemgetter("name", "region_id")(region)
+        best_ask = self.book.best_ask(type_id, region_id)
+        if best_ask is None:
+            return
+        now = time.time()
+        # each window records the best ask once per snapshot, however many targets share it
+        highs: dict[float, float] = {}
+        for _, target in interested:
+            window = target.get("window", DROP_WINDOW)
+            if target.get("drop") is None or window in highs:
+                continue
+            key = (type_id, region_id, window)
+            if key not in self.windows:
+                self.windows[key] = PriceWindow(window)
+            highs[window] = self.windows[key].add(now, best_ask)
+        for profile, target in interested:
+            drop = target.get("drop")
+            if drop is None:
+                continue
+            window = target.get("window", DROP_WINDOW)
+            high = highs[window]
+            if best_ask > high * (1 - drop):
+                continue
+            order = orders.get(self.book.levels[type_id][region_id].asks[0][1])
+            if order is None or self.too_far(order["system_id"]):
+                continue
+            # drops are told apart from sell alerts of the same order, and from earlier prices of it
+            notified = (order["order_id"], order["price"])
+            drop_key = (profile.name, type_id, region_id, window)
+            if self.drops.get(drop_key) == notified:
+                continue
+            self.drops[drop_key] = notified
+            self.alert(
+                profile,
+                type_id,
+                name,
+                order,
+                f"{name} dropped {1 - best_ask / high:.0%} to {best_ask:,.0f} isk within {window / 60:.0f} minutes",
+                region_name,
+                polled,
+                fetched,
+                once=False,
             )
-            self.log.info(f"Looking for {name} below {threshold:,} isk")
-
-            for region in REGIONS:
-                region_name, region_id, known_space = itemgetter(
-                    "name", "region_id", "known_space"
-                )(region)
-                if (tar_region_id != None and tar_region_id != region_id) or (
-                    tar_region_id == None and not known_space
-                ):
+        return
+
+    def wants_region(self, target: dict, region: dict) -> bool:
+        """a target's own region, or every known space region within reach"""
+        tar_region_id = target.get("region", None)
+        if tar_region_id != None:
+            return tar_region_id == region["region_id"]
+        return region["known_space"] and not self.region_too_far(region["region_id"])
+
+    def watch_market(self):
+        """watch market orders for items in TARGETS.market_monitor of every profile"""
+        # load each time to enable hot reload, type_id -> (profile, target) watching it
+        watchers: dict[int, list[tuple[Profile, dict]]] = {}
+        for profile in self.profiles:
+            for target in load_profile_targets(profile):
+                if not target.get("ignored", False):
+                    watchers.setdefault(target["type_id"], []).append((profile, target))
+        state.retain_targets(set(watchers))
+
+        for type_id, watching in watchers.items():
+            orders_seen = 0
+            name = watching[0][1]["name"]
+            for profile, target in watching:
+                self.log.info(
+                    f"Looking for {name} below {target['threshold']:,} isk"
+                    + ("" if profile.is_default else f" for {profile.name}")
+                )
+
+            for region in settings.regions:
+                region_name, region_id = itemgetter("name", "region_id")(region)
+                # fetched once for every profile watching the item there
+                interested = [
+                    (profile, target)
+                    for profile, target in watching
+                    if self.wants_region(target, region)
+                ]
+                if not interested:
                     continue
 
-                orders = self.get_item_orders_in_region(type_id, region_id)
-                orders_seen += len(orders)
+                # bids are only fetched for targets with a sell_to price
+                buying = any("sell_to" in target for _, target in interested)
+                sell_to = min(
+                    (t["sell_to"] for _, t in interested if "sell_to" in t),
+                    default=None,
+                )
+                threshold = max(target["threshold"] for _, target in interested)
+                # pages are dropped once processed, only what the book, snapshot and state need is kept,
+                # with orders that may be notified once the book is updated, bids over sell_to and the lowest asks
+                book_orders, recorded, below = [], [], []
+                by_id, lowest, low = {}, {}, float("inf")
+                for page in self.get_item_orders_in_region(
+                    type_id, region_id, "all" if buying else "sell"
+                ):
+                    polled, fetched = self.last_fetch
+                    orders_seen += len(page)
+                    for order in page:
+                        book_orders.append(
+                            {k: order[k] for k in BOOK_FIELDS if k in order}
+                        )
+                        price, system_id = itemgetter("price", "system_id")(order)
+                        if order["is_buy_order"]:
+                            if sell_to is not None and price >= sell_to:
+                                by_id[order["order_id"]] = order
+                            continue
+                        # (order_id, price, volume_remain) of sell orders
+                        recorded.append(
+                            (order["order_id"], price, order["volume_remain"])
+                        )
+                        if price < low:
+                            lowest, low = {}, price
+                        if price == low:
+                            lowest[order["order_id"]] = order
+                        if price > threshold:
+                            continue
+                        below.append({"region_name": region_name, **order})
+                        if self.too_far(system_id):
+                            continue
+                        for profile, target in interested:
+                            if price > target["threshold"]:
+                                continue
+                            self.alert(
+                                profile,
+                                type_id,
+                                name,
+                                order,
+                                f"{name} selling for {price:,.0f} isk",
+                                region_name,
+                                polled,
+                                fetched,
+                            )
+                polled, fetched = self.last_fetch
                 self.log.debug(
-                    f"Found {len(orders)} orders for {name} in {region_name}"
+                    "Found %d orders for %s in %s", len(book_orders), name, region_name
                 )
-                for order in orders:
-                    order_id, price, system_id, volume_remain, volume_total = (
-                        itemgetter(
-                            "order_id",
-                            "price",
-                            "system_id",
-                            "volume_remain",
-                            "volume_total",
-                        )(order)
+                if not self.not_modified:
+                    self.book.apply_snapshot(
+                        region_id, book_orders, type_id, None if buying else False
                     )
-                    if price <= threshold and not self.history.is_order_seen(
-                        type_id, order_id
-                    ):
-                        system = self.get_system_info(system_id)[0]
-                        msg = f"{name} selling for {price:,.0f} isk in {system}, {region_name}, {volume_remain}/{volume_total}"
-                        self.log.info(msg)
-                        self.send_notification(msg)
-                        self.history.add_order_seen(type_id, name, order_id)
+                    snapshots.record(
+                        snapshots.ORDERS,
+                        polled,
+                        type_id=type_id,
+                        region_id=region_id,
+                        orders=recorded,
+                    )
+                    state.set_orders(type_id, name, threshold, region_id, below)
+                by_id.update(lowest)
+                if buying:
+                    self.watch_bids(
+                        type_id, name, region, interested, by_id, polled, fetched
+                    )
+                self.watch_drops(
+                    type_id, name, region, interested, by_id, polled, fetched
+                )
 
             if orders_seen == 0:
                 self.log.info(f"Done looking for {name}, no order found")
@@ -1,14 +1,22 @@
-import requests
-import json
-import sqlite3
-import logging
-import os
+import time
+from array import array
+from operator import itemgetter
 
-from constants import DB_PATH
+from . import metrics
+from .config import TARGETS, settings
+from .core import (
+    BaseHistory,
+    Core,
+    drop_evicted,
+    entries_to_evict,
+    get_module_name,
+    without,
+)
+from .latency import Detection, parse_esi_time
 
-logging.basicConfig(format="%(asctime)s %(levelname)s\t%(message)s", level=logging.INFO)
-
-URL = "https://evepraisal.com/appraisal/structured.json"
+MARKET_SALVAGER = get_module_name(__name__)
+TECH_I_META_GROUP = 1
+LAST_ORDERS_TO_CACHE = 1000
 MINERALS = {
     34: "Tritanium",
     35: "Pyerite",
@@ -19,75 +27,260 @@ MINERALS = {
     40: "Megacyte",
     11399: "Morphite",
 }
-MARKET = "jita"
-# MARKET = 'amarr'
-MIN_PAYLOAD = {
-    "market_name": MARKET,
-    "items": [{"type_id": k, "name": v} for k, v in MINERALS.items()],
-}
-REP_EFF = 0.5
-TARGETS_LST = "targets.json"
-# should be base tech I item that can be produced by BPOs
-TARGETS = json.load(open(TARGETS_LST))[os.path.basename(__file__).replace(".py", "")]
-
-res = requests.post(URL, data=json.dumps(MIN_PAYLOAD))
-items = res.json()["appraisal"]["items"]
-min_prices = {
-    i["typeID"]: min(i["prices"]["buy"]["max"], i["prices"]["sell"]["min"])
-    for i in items
-}
-min_prices
 
-conn = sqlite3.connect(DB_PATH)
-cur = conn.cursor()
 
-items = []
-for tar in TARGETS:
-    # get tech I all variants
-    cur.execute(
+def load_targets() -> list[dict]:
+    settings.reload(TARGETS)
+    return settings.targets.get(MARKET_SALVAGER, [])
+
+
+class MaterialMatrix:
+    """
+    reprocessing output of every type as a compressed sparse row matrix, rows are types and columns materials,
+    row i holds its materials in indices[indptr[i]:indptr[i + 1]] and their quantities in data at the same positions
+    """
+
+    def __init__(self, rows: list[tuple[int, int, int]]):
+        """rows of (type_id, material_type_id, quantity) sorted by type_id"""
+        self.type_ids: list[int] = []
+        self.material_ids: list[int] = []
+        self.rows: dict[int, int] = {}
+        self.columns: dict[int, int] = {}
+        self.indptr = array("l", [0])
+        self.indices = array("l")
+        self.data = array("d")
+        for type_id, material_id, quantity in rows:
+            if type_id not in self.rows:
+                self.rows[type_id] = len(self.type_ids)
+                self.type_ids.append(type_id)
+                self.indptr.append(self.indptr[-1])
+            if material_id not in self.columns:
+                self.columns[material_id] = len(self.material_ids)
+                self.material_ids.append(material_id)
+            self.indices.append(self.columns[material_id])
+            self.data.append(quantity)
+            self.indptr[-1] += 1
+        return
+
+    def __len__(self) -> int:
+        return len(self.type_ids)
+
+    def materials_of(self, type_ids) -> set[int]:
+        """material type ids any of type_ids reprocesses into"""
+        materials = set()
+        for type_id in type_ids:
+            i = self.rows.get(type_id)
+            if i is not None:
+                for j in self.indices[self.indptr[i] : self.indptr[i + 1]]:
+                    materials.add(self.material_ids[j])
+        return materials
+
+    def matvec(self, prices: array) -> array:
+        """value of every row given prices in column order"""
+        indptr, indices, data = self.indptr, self.indices, self.data
+        out = array("d", bytes(8 * len(self.type_ids)))
+        for i in range(len(self.type_ids)):
+            total = 0.0
+            for k in range(indptr[i], indptr[i + 1]):
+                total += data[k] * prices[indices[k]]
+            out[i] = total
+        return out
+
+    def values(self, prices: dict[int, float]) -> dict[int, float]:
+        """reprocessing value by type id, materials without a price count as worthless"""
+        vector = array("d", (prices.get(m, 0.0) for m in self.material_ids))
+        return dict(zip(self.type_ids, self.matvec(vector)))
+
+
+class SalvageHistory(BaseHistory):
+    def __init__(self, history: dict | None = None):
+        """
+        optionally takes a dict loaded from history file, loaded the MARKET_SALVAGER part if available
+        modify input history to point to initialized object if given
+        """
+        super().__init__()
+        self.orders: dict[int, int] = {}
+        if history != None and MARKET_SALVAGER in history:
+            self.orders = {int(oid): t for oid, t in history[MARKET_SALVAGER].items()}
+        if history != None:
+            history[MARKET_SALVAGER] = self
+        return
+
+    def __len__(self) -> int:
+        return len(self.orders)
+
+    def snapshot(self) -> dict[int, int]:
+        with self.lock:
+            self.share()
+            return self.orders
+
+    def trim(self):
+        # build the trimmed map from a snapshot, then only hold the lock to swap it in
+        seen = self.snapshot()
+        evicted = entries_to_evict(seen, LAST_ORDERS_TO_CACHE)
+        if not evicted:
+            return
+        kept = without(seen, evicted)
+        with self.lock:
+            if self.orders is seen:
+                self.orders = kept
+                self.owned = set()
+            else:
+                # written since the snapshot, skip entries seen again
+                self.orders = self.own(self.orders)
+                drop_evicted(self.orders, evicted)
+        return
+
+    def to_json_serializable(self) -> dict[int, int]:
+        return self.snapshot()
+
+    def add_order_seen(self, order_id: int):
+        with self.lock:
+            self.orders = self.own(self.orders)
+            self.orders[order_id] = int(time.time())
+        return
+
+    def is_order_seen(self, order_id: int) -> bool:
+        return order_id in self.orders
+
+
+class MarketSalvager(Core):
+    """
+    watches a market hub for tech I items selling below what their reprocessed materials are worth,
+    targets are base items, their tech I variants are watched too
+    """
+
+    def __init__(self, history: dict | None = None, *args, **kwargs):
+        self.history = SalvageHistory(history)
+        self.matrix: MaterialMatrix | None = None
+        self.candidates: dict[int, str] = {}
+        # targets the candidates were looked up for, to redo it when they change
+        self.candidates_of: list[dict] | None = None
+        return super().__init__(MARKET_SALVAGER, *args, **kwargs)
+
+    def load_matrix(self) -> MaterialMatrix:
+        """read invTypeMaterials once, it only changes with the static data"""
+        start = time.perf_counter()
+        self.cur.execute(
+            """
+            select typeID, materialTypeID, quantity
+            from invTypeMaterials
+            order by typeID
+            """
+        )
+        matrix = MaterialMatrix(self.cur.fetchall())
+        elapsed = time.perf_counter() - start
+        metrics.query_duration.observe(self.name, "type_materials", value=elapsed)
+        self.log.info(
+            f"Loaded reprocessing materials of {len(matrix)} types in {elapsed:.2f}s"
+        )
+        return matrix
+
+    def get_candidates(self, targets: list[dict]) -> dict[int, str]:
+        """targets and their tech I variants, by type id"""
+        type_ids = [t["type_id"] for t in targets]
+        candidates = {t["type_id"]: t["name"] for t in targets}
+        if not type_ids:
+            return candidates
+        placeholders = ",".join("?" * len(type_ids))
+        self.cur.execute(
+            f"""
+            select mt.typeID, t.typeName
+            from invMetaTypes mt
+                inner join invTypes t on mt.typeID = t.typeID
+            where
+                mt.metaGroupID = ?
+                and (mt.typeID in ({placeholders}) or mt.parentTypeID in ({placeholders}))
+            """,
+            (TECH_I_META_GROUP, *type_ids, *type_ids),
+        )
+        candidates.update(self.cur.fetchall())
+        return candidates
+
+    def get_market_snapshot(
+        self, region_id: int, type_ids: set[int]
+    ) -> tuple[dict[int, float], dict[int, float], list[dict]]:
         """
-        select mt.typeID, t.typeName
-        from invMetaTypes mt 
-            inner join invTypes t on mt.typeID = t.typeID 
-        where
-            mt.metaGroupID = 1
-            and (mt.typeID = ? or mt.parentTypeID = ?)
-        ;
-        """,
-        (
-            tar,
-            tar,
-        ),
-    )
-    items += [{"type_id": tup[0], "name": tup[1]} for tup in cur.fetchall()]
-
-logging.info(f"Requested for {len(items)} items at {MARKET}")
-payload = {"market_name": MARKET, "items": items}
-res = requests.post(URL, data=json.dumps(payload))
-items = res.json()["appraisal"]["items"]
-logging.info(f"Receive {len(items)} items in respond")
-for item in items:
-    type_id = item["typeID"]
-    name = item["typeName"]
-    sell_price = item["prices"]["sell"]["min"]
-    cur.execute(
+        best buy and sell price of type_ids from every order in the region,
+        along with the sell orders themselves, pages are dropped once scanned
         """
-        select materialTypeID, quantity
-        from invTypeMaterials
-        where 
-            typeID = ?
-        ;
-        """,
-        (type_id,),
-    )
-    base_value = sum(
-        [
-            min_prices[tup[0]] * tup[1] if tup[0] in min_prices else 0
-            for tup in cur.fetchall()
-        ]
-    )
-    value = base_value * REP_EFF
-    if sell_price < value:
-        logging.info(
-            f"{name} selling at {sell_price:,.0f} isk, has salvage value of {value:,.0f} isk is profitable!"
+        best_buy: dict[int, float] = {}
+        best_sell: dict[int, float] = {}
+        sells = []
+        for page in self.page_aware_stream(
+            settings.esi_url + f"/markets/{region_id}/orders/",
+            update_next_poll=True,
+            params={"order_type": "all"},
+        ):
+            for order in page:
+                type_id = order["type_id"]
+                if type_id not in type_ids:
+                    continue
+                price = order["price"]
+                if order["is_buy_order"]:
+                    best_buy[type_id] = max(best_buy.get(type_id, 0.0), price)
+                else:
+                    best_sell[type_id] = min(best_sell.get(type_id, price), price)
+                    sells.append(order)
+        return best_buy, best_sell, sells
+
+    def watch_salvage(self):
+        """notify on sell orders of candidates priced below their reprocessing value"""
+        if self.matrix is None:
+            self.matrix = self.load_matrix()
+        targets = load_targets()
+        if targets != self.candidates_of:
+            self.candidates = self.get_candidates(targets)
+            self.candidates_of = targets
+        if not self.candidates:
+            self.log.info("No salvage targets")
+            return
+
+        region_id = settings.salvage_region
+        materials = self.matrix.materials_of(self.candidates)
+        best_buy, best_sell, sells = self.get_market_snapshot(
+            region_id, materials | self.candidates.keys()
+        )
+        polled, fetched = self.last_fetch
+        # the cheaper of instant buy and instant sell, as the original script did
+        prices = {
+            m: min(p for p in (best_buy.get(m), best_sell.get(m)) if p is not None)
+            for m in materials
+            if m in best_buy or m in best_sell
+        }
+        missing = [MINERALS.get(m, m) for m in materials if m not in prices]
+        if missing:
+            self.log.warning(f"No market price for {missing}, valued at 0")
+        values = self.matrix.values(prices)
+        efficiency = settings.reprocessing_efficiency
+
+        profitable = 0
+        for order in sells:
+            type_id, order_id, price, system_id, volume_remain = itemgetter(
+                "type_id", "order_id", "price", "system_id", "volume_remain"
+            )(order)
+            # sell orders of materials were only fetched for their price
+            if type_id not in self.candidates:
+                continue
+            value = values.get(type_id, 0.0) * efficiency
+            if price >= value or self.history.is_order_seen(order_id):
+                continue
+            profitable += 1
+            name = self.candidates[type_id]
+            system = self.get_system_info(system_id)[0]
+            msg = (
+                f"{name} selling for {price:,.0f} isk in {system}, reprocesses into {value:,.0f} isk"
+                + f", {(value - price) * volume_remain:,.0f} isk profit for {volume_remain} units"
+            )
+            self.log.info(msg)
+            self.send_notification(
+                msg,
+                detection=Detection(parse_esi_time(order["issued"]), polled, fetched),
+            )
+            self.history.add_order_seen(order_id)
+        self.log.info(
+            f"Checked {len(sells)} sell orders of {len(self.candidates)} salvage candidates, {profitable} new profitable"
         )
+        return
+
+    main = watch_salvage
@@ -0,0 +1,260 @@
+import bisect
+import re
+import threading
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PAGE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+CYCLE_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1200, 3600)
+DETECTION_BUCKETS = (1, 10, 30, 60, 120, 300, 600, 900, 1200, 1800, 3600, 7200)
+
+ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+URL_PREFIX = re.compile(r"^\w+://[^/]+(/latest)?")
+
+
+def endpoint(url: str) -> str:
+    """url path with ids replaced, keeps the label set bounded"""
+    return ID_SEGMENT.sub("/{id}", URL_PREFIX.sub("", url.split("?", 1)[0]))
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labelnames: tuple[str, ...], values: tuple) -> str:
+    if not labelnames:
+        return ""
+    pairs = ",".join(f'{k}="{escape(v)}"' for k, v in zip(labelnames, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.values: dict[tuple, float] = {}
+        self.lock = threading.Lock()
+        return
+
+    def inc(self, *labels, amount: float = 1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+        return
+
+    def get(self, *labels) -> float:
+        return self.values.get(labels, 0)
+
+    def render(self) -> list[str]:
+        with self.lock:
+            values = list(self.values.items())
+        return [
+            f"{self.name}{format_labels(self.labelnames, labels)} {value}"
+            for labels, value in values
+        ]
+
+
+class Gauge(Counter):
+    def set(self, *labels, value: float):
+        with self.lock:
+            self.values[labels] = value
+        return
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.buckets = buckets
+        # labels -> [count per bucket, with +Inf last], sum
+        self.values: dict[tuple, tuple[list[int], list[float]]] = {}
+        self.lock = threading.Lock()
+        return
+
+    def observe(self, *labels, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            if labels not in self.values:
+                self.values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            counts, total = self.values[labels]
+            counts[i] += 1
+            total[0] += value
+        return
+
+    def count(self, *labels) -> int:
+        counts, _ = self.values.get(labels, ([], []))
+        return sum(counts)
+
+    def total(self, *labels) -> float:
+        _, total = self.values.get(labels, ([], [0.0]))
+        return total[0]
+
+    def quantile(self, q: float, *labels) -> float:
+        """estimate by linear interpolation within the bucket, like histogram_quantile"""
+        with self.lock:
+            counts = list(self.values.get(labels, ([], []))[0])
+        n = sum(counts)
+        if n == 0:
+            return float("nan")
+        rank, seen = q * n, 0
+        for i, c in enumerate(counts):
+            if seen + c >= rank and c > 0:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else 0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / c
+            seen += c
+        return self.buckets[-1]
+
+    def render(self) -> list[str]:
+        with self.lock:
+            values = [(k, list(c), t[0]) for k, (c, t) in self.values.items()]
+        lines = []
+        names = (*self.labelnames, "le")
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, c in zip((*self.buckets, "+Inf"), counts):
+                cumulative += c
+                le = format_labels(names, (*labels, bound))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            label_str = format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {total}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """process wide metrics, rendered in prometheus text format"""
+
+    def __init__(self):
+        self.metrics: dict[str, Counter | Histogram] = {}
+        self.lock = threading.Lock()
+        return
+
+    def _register(self, cls, name: str, *args, **kwargs):
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = cls(name, *args, **kwargs)
+            return self.metrics[name]
+
+    def counter(self, name: str, help: str, labelnames=()) -> Counter:
+        return self._register(Counter, name, help, tuple(labelnames))
+
+    def gauge(self, name: str, help: str, labelnames=()) -> Gauge:
+        return self._register(Gauge, name, help, tuple(labelnames))
+
+    def histogram(
+        self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram, name, help, tuple(labelnames), buckets)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self.metrics.values()):
+            kind = {Histogram: "histogram", Gauge: "gauge", Counter: "counter"}[
+                type(metric)
+            ]
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {kind}")
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+request_duration = registry.histogram(
+    "http_request_duration_seconds",
+    "latency of outgoing requests",
+    ("feature", "method", "endpoint"),
+)
+responses = registry.counter(
+    "http_responses_total",
+    "responses received by status code",
+    ("feature", "endpoint", "status"),
+)
+response_bytes = registry.counter(
+    "http_response_bytes_total",
+    "response body bytes received",
+    ("feature", "endpoint"),
+)
+wire_bytes = registry.counter(
+    "http_wire_bytes_total",
+    "response body bytes read off the wire before decompression",
+    ("host",),
+)
+pool_requests = registry.gauge(
+    "http_pool_requests",
+    "requests sent through the shared connection pool",
+    ("host",),
+)
+pool_connections = registry.gauge(
+    "http_pool_connections",
+    "connections opened by the shared connection pool, the rest of the requests reused one",
+    ("host",),
+)
+etag_requests = registry.counter(
+    "http_etag_requests_total",
+    "requests by ETag outcome, hit is a 304 to a conditional request",
+    ("feature", "endpoint", "result"),
+)
+pages_per_call = registry.histogram(
+    "esi_pages_per_call",
+    "pages requested per page aware get",
+    ("feature", "endpoint"),
+    PAGE_BUCKETS,
+)
+query_duration = registry.histogram(
+    "sqlite_query_duration_seconds",
+    "latency of local database lookups",
+    ("feature", "query"),
+)
+notifications = registry.counter(
+    "notifications_total",
+    "notifications sent by features",
+    ("feature", "critical"),
+)
+cycle_duration = registry.histogram(
+    "feature_cycle_duration_seconds",
+    "wall time of a feature's main cycle",
+    ("feature",),
+    CYCLE_BUCKETS,
+)
+detection_latency = registry.histogram(
+    "detection_latency_seconds",
+    "time from an order or contract being issued to its notification, by stage",
+    ("feature", "stage"),
+    DETECTION_BUCKETS,
+)
+
+
+def summary() -> str:
+    """human readable digest of the hot path metrics, for periodic logging"""
+    lines = ["metrics summary"]
+    for (feature,), _ in list(cycle_duration.values.items()):
+        n = cycle_duration.count(feature)
+        lines.append(
+            f"\t{feature} cycles {n}, avg {cycle_duration.total(feature) / n:.1f}s"
+            + f", p95 {cycle_duration.quantile(0.95, feature):.1f}s"
+        )
+    for labels in sorted(list(request_duration.values)):
+        feature, method, path = labels
+        n = request_duration.count(*labels)
+        hits = etag_requests.get(feature, path, "hit")
+        conditional = hits + etag_requests.get(feature, path, "miss")
+        lines.append(
+            f"\t{feature} {method} {path} requests {n}"
+            + f", p50 {request_duration.quantile(0.5, *labels) * 1000:.0f}ms"
+            + f", p95 {request_duration.quantile(0.95, *labels) * 1000:.0f}ms"
+            + f", {response_bytes.get(feature, path) / 1024:,.0f} KiB"
+            + (f", etag hit {hits / conditional:.0%}" if conditional else "")
+        )
+    for (host,), sent in sorted(list(pool_requests.values.items())):
+        opened = pool_connections.get(host)
+        lines.append(
+            f"\t{host} requests {sent:.0f}, connections {opened:.0f}"
+            + (f", reused {1 - opened / sent:.0%}" if sent else "")
+            + f", {wire_bytes.get(host) / 1024:,.0f} KiB on the wire"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,299 @@
+import dataclasses
+import logging
+import queue
+import requests
+import sys
+import threading
+import time
+from typing import Callable
+from plyer import notification
+
+from . import http_pool, metrics
+from .config import settings
+from .constants import TITLE, PUSHOVER_URL
+
+PUSHOVER_MAX_MESSAGE = 1024
+PUSHOVER_LIMIT_REMAINING = "X-Limit-App-Remaining"
+PUSHOVER_LIMIT_RESET = "X-Limit-App-Reset"
+MIN_SEND_INTERVAL = 1  # seconds between pushover requests
+MAX_RETRIES = 5
+INIT_RETRY_BACKOFF = 5
+NORMAL, HIGH = 0, 1  # pushover priorities, high bypasses quiet hours
+
+
+@dataclasses.dataclass(order=True)
+class Notification:
+    # critical sorts first in the queue, then oldest first
+    rank: int
+    created: float
+    msg: str = dataclasses.field(compare=False)
+    # called once the notification was handed to every channel
+    delivered: Callable[[], None] | None = dataclasses.field(
+        default=None, compare=False
+    )
+    title: str = dataclasses.field(default=TITLE, compare=False)
+    # pushover attempts so far, a failed one is queued again to be sent no sooner than not_before
+    attempt: int = dataclasses.field(default=0, compare=False)
+    not_before: float = dataclasses.field(default=0, compare=False)
+
+    @property
+    def critical(self) -> bool:
+        return self.rank == 0
+
+
+# rank after every notification, so delivery drains the queue before stopping
+STOP = Notification(2, 0, "")
+
+
+class Notifier:
+    """
+    delivers notifications on its own thread so features never wait on pushover,
+    bursts within the coalesce window are deduplicated and sent as one digest, critical ones are sent first and alone
+    failed pushover requests are queued again after a backoff, so other notifications go out meanwhile
+    without a running thread, submit delivers and retries on the caller's thread
+    """
+
+    def __init__(
+        self,
+        session: requests.Session | None = None,
+        coalesce_window: float | None = None,
+        app_token: str | None = None,
+        user_key: str | None = None,
+        pushover: bool | None = None,
+        desktop: bool | None = None,
+        critical_priority: int | None = None,
+        name: str = "notifier",
+    ):
+        self.log = logging.getLogger(name)
+        self.s = session if session else http_pool.session()
+        self.coalesce_window = (
+            settings.notification_coalesce_window
+            if coalesce_window is None
+            else coalesce_window
+        )
+        self.app_token = settings.app_token if app_token is None else app_token
+        self.user_key = settings.user_key if user_key is None else user_key
+        self.pushover = settings.pushover_notification if pushover is None else pushover
+        self.desktop = settings.desktop_notification if desktop is None else desktop
+        self.critical_priority = (
+            settings.critical_priority
+            if critical_priority is None
+            else critical_priority
+        )
+
+        self.queue: queue.PriorityQueue[Notification] = queue.PriorityQueue()
+        self.thread: threading.Thread | None = None
+        self.last_sent = 0.0
+        self.limited_until = 0.0
+        return
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name=self.log.name, daemon=True)
+        self.thread.start()
+        return
+
+    def stop(self, timeout: float | None = None):
+        """deliver everything already submitted, then stop the thread"""
+        if self.thread is None:
+            return
+        self.queue.put(STOP)
+        self.thread.join(timeout)
+        self.thread = None
+        return
+
+    def submit(
+        self,
+        msg: str,
+        critical: bool = False,
+        delivered: Callable[[], None] | None = None,
+    ):
+        """queue a notification, never blocks on delivery when started"""
+        n = Notification(0 if critical else 1, time.time(), msg, delivered)
+        if self.thread is None:
+            self.deliver([n])
+            self.retry([])
+        else:
+            self.queue.put(n)
+        return
+
+    def run(self):
+        pending: list[Notification] = []
+        deadline = float("inf")
+        # failed pushover requests until their backoff is over
+        waiting: list[Notification] = []
+        while True:
+            now = time.time()
+            for n in [n for n in waiting if n.not_before <= now]:
+                waiting.remove(n)
+                self.queue.put(n)
+            wake = [n.not_before for n in waiting] + ([deadline] if pending else [])
+            timeout = max(0, min(wake) - now) if wake else None
+            try:
+                n = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                n = None
+
+            if n is STOP:
+                break
+            if n is not None and n.not_before > time.time():
+                waiting.append(n)
+            elif n is not None and n.attempt:
+                self.push(n)
+            elif n is not None and n.critical:
+                self.deliver([n])
+            elif n is not None:
+                if not pending:
+                    deadline = n.created + self.coalesce_window
+                pending.append(n)
+            if pending and time.time() >= deadline:
+                self.deliver(pending)
+                pending = []
+
+        # flush what is left over on stop
+        while not self.queue.empty():
+            n = self.queue.get()
+            if n is STOP:
+                continue
+            if n.attempt:
+                waiting.append(n)
+            else:
+                pending.append(n)
+        if pending:
+            self.deliver(sorted(pending))
+        self.retry(waiting)
+        return
+
+    def retry(self, waiting: list[Notification]):
+        """send failed pushover requests on the calling thread, waiting out their backoff, until sent or given up"""
+        while True:
+            while not self.queue.empty():
+                n = self.queue.get()
+                if n is not STOP:
+                    waiting.append(n)
+            if not waiting:
+                return
+            n = min(waiting, key=lambda n: (n.not_before, n))
+            waiting.remove(n)
+            time.sleep(max(0, n.not_before - time.time()))
+            if n.attempt:
+                self.push(n)
+            else:
+                self.deliver([n])
+
+    def deliver(self, notifications: list[Notification]):
+        """send notifications as they are if only one, as digests otherwise"""
+        critical = [n for n in notifications if n.critical]
+        normal = [n for n in notifications if not n.critical]
+        for n in critical:
+            self.send(n)
+
+        msgs = list(dict.fromkeys(n.msg for n in normal))
+        if len(msgs) < len(normal):
+            self.log.debug(f"Dropped {len(normal) - len(msgs)} duplicate notifications")
+        if len(msgs) == 1:
+            self.send(normal[0])
+        elif len(msgs) > 1:
+            title = f"{TITLE} ({len(msgs)} notifications)"
+            for digest in self.build_digests(msgs):
+                self.send(Notification(1, normal[0].created, digest, title=title))
+
+        for n in notifications:
+            if n.delivered:
+                try:
+                    n.delivered()
+                except:
+                    self.log.exception("Notification delivered callback failed")
+        return
+
+    def build_digests(self, msgs: list[str]) -> list[str]:
+        """join messages into as few digests within pushover message limit as possible"""
+        digests, current = [], ""
+        for msg in msgs:
+            msg = msg[:PUSHOVER_MAX_MESSAGE]
+            if current and len(current) + 2 + len(msg) > PUSHOVER_MAX_MESSAGE:
+                digests.append(current)
+                current = ""
+            current = current + "\n\n" + msg if current else msg
+        if current:
+            digests.append(current)
+        return digests
+
+    def send(self, n: Notification):
+        """send desktop and pushover notification"""
+        if self.desktop:
+            try:
+                if sys.platform.startswith("win"):
+                    notification.notify(
+                        title=n.title,
+                        message=n.msg[:256],
+                        app_name=TITLE,
+                    )  # type: ignore
+                else:  # TODO add mac support
+                    self.log.warning(
+                        "No supported desktop notification implementation found"
+                    )
+            except:
+                self.log.exception("Unable to send desktop notification")
+
+        if self.pushover:
+            self.push(n)
+        return
+
+    def push(self, n: Notification):
+        """send to pushover once, on rate limit or server errors queue it again to retry after a backoff"""
+        priority = self.critical_priority if n.critical else NORMAL
+        attempt = n.attempt + 1
+        if not self.send_pushover(n.msg, priority, n.title, attempt):
+            return
+        if attempt == MAX_RETRIES:
+            self.log.error("Unable to send pushover notification, giving up")
+            return
+        backoff = INIT_RETRY_BACKOFF * 2 ** (attempt - 1)
+        self.queue.put(
+            dataclasses.replace(
+                n, delivered=None, attempt=attempt, not_before=time.time() + backoff
+            )
+        )
+        return
+
+    def send_pushover(self, msg: str, priority: int, title: str, attempt: int) -> bool:
+        """post to pushover, spacing requests out, returns whether it failed and is worth retrying"""
+        if time.time() < self.limited_until:
+            self.log.error("Pushover message limit reached, dropping notification")
+            return False
+        data = {
+            "token": self.app_token,
+            "user": self.user_key,
+            "title": title,
+            "message": msg,
+            "priority": priority,
+            "sound": "eve_chime",
+        }
+        time.sleep(max(0, self.last_sent + MIN_SEND_INTERVAL - time.time()))
+        self.last_sent = time.time()
+        try:
+            start = time.perf_counter()
+            r = self.s.post(PUSHOVER_URL, data=data)
+            path = metrics.endpoint(PUSHOVER_URL)
+            metrics.request_duration.observe(
+                self.log.name, "POST", path, value=time.perf_counter() - start
+            )
+            metrics.responses.inc(self.log.name, path, r.status_code)
+            if r.headers.get(PUSHOVER_LIMIT_REMAINING) == "0":
+                self.limited_until = float(r.headers.get(PUSHOVER_LIMIT_RESET, 0))
+            if r.status_code == 200:
+                return False
+            if r.status_code != 429 and r.status_code < 500:
+                self.log.error(
+                    f"Unable to send pushover notification, status code {r.status_code}, {r.content}"
+                )
+                return False
+            self.log.warning(
+                f"Pushover returned {r.status_code}, attempt {attempt}/{MAX_RETRIES}"
+            )
+        except requests.exceptions.RequestException:
+            self.log.warning(
+                f"Unable to reach pushover, attempt {attempt}/{MAX_RETRIES}",
+                exc_info=True,
+            )
+        return True
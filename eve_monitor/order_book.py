@@ -0,0 +1,307 @@
+import bisect
+import collections
+import dataclasses
+import heapq
+import threading
+from typing import Iterable
+
+# order_id -> (type_id, region_id, is_buy_order, price, volume_remain, min_volume)
+TYPE, REGION, IS_BUY, PRICE, VOLUME, MIN_VOLUME = range(6)
+
+
+@dataclasses.dataclass
+class Opportunity:
+    """buy volume from the asks of one region and sell it to the bids of another"""
+
+    type_id: int
+    buy_region_id: int
+    sell_region_id: int
+    buy_price: float  # best ask in buy region
+    sell_price: float  # best bid in sell region
+    volume: int
+    cost: float
+    profit: float
+
+    @property
+    def margin(self) -> float:
+        return self.profit / self.cost if self.cost else 0.0
+
+
+class Levels:
+    """orders of a type in a region, asks cheapest first and bids dearest first, kept sorted as orders change"""
+
+    __slots__ = ("asks", "bids")
+
+    def __init__(self):
+        self.asks: list[tuple[float, int]] = []  # (price, order_id)
+        self.bids: list[tuple[float, int]] = []  # (-price, order_id)
+        return
+
+    def side(self, is_buy: bool) -> list[tuple[float, int]]:
+        return self.bids if is_buy else self.asks
+
+    def insert(self, is_buy: bool, price: float, order_id: int):
+        bisect.insort(self.side(is_buy), (-price if is_buy else price, order_id))
+        return
+
+    def remove(self, is_buy: bool, price: float, order_id: int):
+        side = self.side(is_buy)
+        key = (-price if is_buy else price, order_id)
+        i = bisect.bisect_left(side, key)
+        if i < len(side) and side[i] == key:
+            del side[i]
+        return
+
+    def __bool__(self) -> bool:
+        return bool(self.asks or self.bids)
+
+
+class PriceWindow:
+    """
+    highest price recorded within the last window seconds,
+    kept as a deque of decreasing prices so each price is added and dropped once
+    """
+
+    __slots__ = ("window", "prices")
+
+    def __init__(self, window: float):
+        self.window = window
+        self.prices: collections.deque[tuple[float, float]] = collections.deque()
+        return
+
+    def add(self, at: float, price: float) -> float:
+        """record price at time at, returns the highest price within the window"""
+        while self.prices and self.prices[-1][1] <= price:
+            self.prices.pop()
+        self.prices.append((at, price))
+        while self.prices[0][0] < at - self.window:
+            self.prices.popleft()
+        return self.prices[0][1]
+
+
+class OrderBook:
+    """
+    every order of every region, applied as bulk snapshots of a region,
+    only types with orders changed since the last call to opportunities have their spreads recomputed
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.orders: dict[int, tuple] = {}
+        self.region_orders: dict[int, set[int]] = {}
+        self.levels: dict[int, dict[int, Levels]] = {}
+        self.dirty: set[int] = set()
+        # type_id -> best opportunity as of the last time it was dirty
+        self.spreads: dict[int, Opportunity | None] = {}
+        self.margin: float | None = None
+        return
+
+    def __len__(self) -> int:
+        return len(self.orders)
+
+    def _insert(self, order_id: int, record: tuple):
+        type_id, region_id = record[TYPE], record[REGION]
+        levels = self.levels.setdefault(type_id, {})
+        if region_id not in levels:
+            levels[region_id] = Levels()
+        levels[region_id].insert(record[IS_BUY], record[PRICE], order_id)
+        self.orders[order_id] = record
+        self.dirty.add(type_id)
+        return
+
+    def _remove(self, order_id: int):
+        record = self.orders.pop(order_id)
+        type_id, region_id = record[TYPE], record[REGION]
+        levels = self.levels[type_id]
+        levels[region_id].remove(record[IS_BUY], record[PRICE], order_id)
+        if not levels[region_id]:
+            del levels[region_id]
+            if not levels:
+                del self.levels[type_id]
+        self.dirty.add(type_id)
+        return
+
+    def apply_snapshot(
+        self,
+        region_id: int,
+        orders: Iterable[dict],
+        type_id: int | None = None,
+        is_buy: bool | None = None,
+    ) -> int:
+        """
+        replace the orders of a region, or only those of type_id when orders were fetched for one type,
+        and of one side when is_buy is given, returns how many orders were added, changed or removed
+        """
+        return self.apply_pages(region_id, [orders], type_id, is_buy)
+
+    def apply_pages(
+        self,
+        region_id: int,
+        pages: Iterable[Iterable[dict]],
+        type_id: int | None = None,
+        is_buy: bool | None = None,
+    ) -> int:
+        """
+        apply_snapshot of orders arriving page by page, each page is applied as it arrives and the lock is held
+        for one page at a time, orders missing from every page are removed after the last one, none without pages
+        """
+        changed = 0
+        seen: set[int] = set()
+        applied = False
+        for page in pages:
+            applied = True
+            with self.lock:
+                changed += self._apply_page(region_id, page, seen)
+        if not applied:
+            return changed
+        with self.lock:
+            if type_id is None:
+                replaced = self.region_orders.get(region_id, set())
+            else:
+                replaced = set()
+                levels = self.levels.get(type_id, {}).get(region_id)
+                for buy in (False, True) if is_buy is None else (is_buy,):
+                    if levels:
+                        replaced.update(oid for _, oid in levels.side(buy))
+            removed = replaced - seen
+            for order_id in removed:
+                self._remove(order_id)
+            changed += len(removed)
+            region_orders = self.region_orders.setdefault(region_id, set())
+            region_orders -= removed
+            region_orders |= seen
+        return changed
+
+    def _apply_page(
+        self, region_id: int, orders: Iterable[dict], seen: set[int]
+    ) -> int:
+        """add or update orders, adding their ids to seen, returns how many changed"""
+        changed = 0
+        for order in orders:
+            order_id = order["order_id"]
+            record = (
+                order["type_id"],
+                region_id,
+                order["is_buy_order"],
+                order["price"],
+                order["volume_remain"],
+                order.get("min_volume", 1),
+            )
+            seen.add(order_id)
+            previous = self.orders.get(order_id)
+            if previous == record:
+                continue
+            changed += 1
+            if previous is None:
+                self._insert(order_id, record)
+            elif previous[PRICE] != record[PRICE]:
+                self._remove(order_id)
+                self._insert(order_id, record)
+            else:
+                # same place in the levels, only volume changed
+                self.orders[order_id] = record
+                self.dirty.add(record[TYPE])
+        return changed
+
+    def best_ask(self, type_id: int, region_id: int) -> float | None:
+        levels = self.levels.get(type_id, {}).get(region_id)
+        return levels.asks[0][0] if levels and levels.asks else None
+
+    def best_bid(self, type_id: int, region_id: int) -> float | None:
+        levels = self.levels.get(type_id, {}).get(region_id)
+        return -levels.bids[0][0] if levels and levels.bids else None
+
+    def match(
+        self, type_id: int, buy_region_id: int, sell_region_id: int, margin: float
+    ) -> Opportunity | None:
+        """
+        walk the asks of buy region up against the bids of sell region while the bid beats the ask by margin,
+        volume is limited by what both sides have left, bids asking for more than the asks hold are skipped
+        """
+        asks = self.levels[type_id][buy_region_id].asks
+        bids = self.levels[type_id][sell_region_id].bids
+        if not asks or not bids:
+            return None
+        available = sum(self.orders[oid][VOLUME] for _, oid in asks)
+        volume, cost, revenue = 0, 0.0, 0.0
+        i, ask_left = 0, self.orders[asks[0][1]][VOLUME]
+        for neg_bid, bid_id in bids:
+            bid_price = -neg_bid
+            if bid_price < asks[i][0] * (1 + margin):
+                break
+            bid = self.orders[bid_id]
+            if bid[MIN_VOLUME] > available - volume:
+                continue
+            bid_left = bid[VOLUME]
+            while bid_left and bid_price >= asks[i][0] * (1 + margin):
+                quantity = min(bid_left, ask_left)
+                volume += quantity
+                cost += quantity * asks[i][0]
+                revenue += quantity * bid_price
+                bid_left -= quantity
+                ask_left -= quantity
+                if not ask_left:
+                    i += 1
+                    if i == len(asks):
+                        break
+                    ask_left = self.orders[asks[i][1]][VOLUME]
+            if i == len(asks):
+                break
+        if not volume:
+            return None
+        return Opportunity(
+            type_id,
+            buy_region_id,
+            sell_region_id,
+            asks[0][0],
+            -bids[0][0],
+            volume,
+            cost,
+            revenue - cost,
+        )
+
+    def best_spread(self, type_id: int, margin: float) -> Opportunity | None:
+        """
+        most profitable pair of regions for a type, pairing the cheapest ask with the dearest bid of another region
+        and the dearest bid with the cheapest ask of another region
+        """
+        # two best of each side, as the best ask and bid may be in the same region
+        asks = heapq.nsmallest(
+            2,
+            ((lv.asks[0][0], r) for r, lv in self.levels[type_id].items() if lv.asks),
+        )
+        bids = heapq.nsmallest(
+            2,
+            ((lv.bids[0][0], r) for r, lv in self.levels[type_id].items() if lv.bids),
+        )
+        pairs = set()
+        for _, buy_region_id in asks[:1]:
+            pairs.update((buy_region_id, r) for _, r in bids if r != buy_region_id)
+        for _, sell_region_id in bids[:1]:
+            pairs.update((r, sell_region_id) for _, r in asks if r != sell_region_id)
+        best = None
+        for buy_region_id, sell_region_id in pairs:
+            opportunity = self.match(type_id, buy_region_id, sell_region_id, margin)
+            if opportunity and (best is None or opportunity.profit > best.profit):
+                best = opportunity
+        return best
+
+    def opportunities(
+        self, margin: float, min_profit: float = 0.0, top: int | None = None
+    ) -> list[Opportunity]:
+        """best cross region spread of every type above margin and min_profit, most profitable first"""
+        with self.lock:
+            if margin != self.margin:
+                self.margin = margin
+                self.dirty.update(self.levels)
+                self.spreads.clear()
+            for type_id in self.dirty:
+                if type_id in self.levels:
+                    self.spreads[type_id] = self.best_spread(type_id, margin)
+                else:
+                    self.spreads.pop(type_id, None)
+            self.dirty.clear()
+            found = [o for o in self.spreads.values() if o and o.profit >= min_profit]
+        if top is None:
+            return sorted(found, key=lambda o: o.profit, reverse=True)
+        return heapq.nlargest(top, found, key=lambda o: o.profit)
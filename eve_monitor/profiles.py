@@ -0,0 +1,60 @@
+import dataclasses
+
+from .config import TARGETS, Settings, settings
+from .notifier import Notifier
+
+DEFAULT_PROFILE = "default"
+
+
+@dataclasses.dataclass
+class Profile:
+    """
+    a watchlist with its own targets file, notification channels and history,
+    features fetch once for every profile and match each profile's targets against what was fetched
+    """
+
+    name: str
+    notifier: Notifier
+    # None reads targets.json of the shared settings
+    targets_json: str | None = None
+
+    def __post_init__(self):
+        self.settings = (
+            Settings(targets_json=self.targets_json) if self.targets_json else settings
+        )
+        return
+
+    @property
+    def is_default(self) -> bool:
+        return self.name == DEFAULT_PROFILE
+
+    def targets(self, feature: str) -> list:
+        """targets of a feature, read each time to enable hot reload"""
+        self.settings.reload(TARGETS)
+        return self.settings.targets.get(feature, [])
+
+    def history_key(self, feature: str) -> str:
+        """key of a feature's history in the history file, the default profile keeps the plain feature name"""
+        return feature if self.is_default else f"{feature}@{self.name}"
+
+
+def load_profiles(notifier: Notifier) -> list[Profile]:
+    """
+    the default profile using notifier, then one per entry of PROFILES,
+    their notifiers fall back to the shared notification settings and are started
+    """
+    profiles = [Profile(DEFAULT_PROFILE, notifier)]
+    for entry in settings.profiles:
+        if entry["name"] == DEFAULT_PROFILE:
+            raise ValueError(f"Profile name {DEFAULT_PROFILE} is reserved")
+        profile_notifier = Notifier(
+            app_token=entry.get("APP_TOKEN"),
+            user_key=entry.get("USER_KEY"),
+            pushover=entry.get("PUSHOVER_NOTIFICATION"),
+            desktop=entry.get("DESKTOP_NOTIFICATION"),
+            critical_priority=entry.get("CRITICAL_PRIORITY"),
+            name=f"notifier.{entry['name']}",
+        )
+        profile_notifier.start()
+        profiles.append(Profile(entry["name"], profile_notifier, entry["TARGETS_JSON"]))
+    return profiles
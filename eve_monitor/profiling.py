@@ -0,0 +1,206 @@
+import collections
+import logging
+import marshal
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Callable
+
+CPU = "cpu"
+MEMORY = "memory"
+DEFAULT_DURATION = 30
+SAMPLE_INTERVAL = 0.005
+TOP_N = 50
+TRACEBACK_FRAMES = 25
+# result format -> file extension
+EXTENSIONS = {"collapsed": ".collapsed", "pstats": ".pstats", "top": ".txt"}
+
+# (filename, line number, function name), the key pstats uses for functions
+Frame = tuple[str, int, str]
+Stack = tuple[Frame, ...]
+
+log = logging.getLogger(__name__)
+
+
+def sample_stacks(
+    seconds: float,
+    interval: float = SAMPLE_INTERVAL,
+    thread_names: set[str] | None = None,
+) -> collections.Counter[Stack]:
+    """sample the stacks, outermost frame first, of the given threads or all other threads"""
+    stacks: collections.Counter[Stack] = collections.Counter()
+    me = threading.get_ident()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me or (
+                thread_names is not None and names.get(ident) not in thread_names
+            ):
+                continue
+            stack = []
+            f = frame
+            while f is not None:
+                code = f.f_code
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                f = f.f_back
+            stacks[tuple(reversed(stack))] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def to_collapsed(stacks: collections.Counter[Stack]) -> str:
+    """folded stacks, input for flamegraph.pl, speedscope or inferno"""
+    return "".join(
+        ";".join(f"{func} ({filename}:{line})" for filename, line, func in stack)
+        + f" {count}\n"
+        for stack, count in stacks.most_common()
+    )
+
+
+def to_pstats(stacks: collections.Counter[Stack], interval: float) -> bytes:
+    """marshalled stats loadable by pstats.Stats, times are estimated from sample counts"""
+    # func -> [primitive calls, calls, total time, cumulative time, callers]
+    stats: dict[Frame, list] = {}
+    for stack, count in stacks.items():
+        seconds = count * interval
+        seen = set()
+        for depth, func in enumerate(stack):
+            entry = stats.setdefault(func, [0, 0, 0.0, 0.0, {}])
+            if func not in seen:
+                # recursive frames only count once towards cumulative time
+                seen.add(func)
+                entry[0] += count
+                entry[1] += count
+                entry[3] += seconds
+            if depth > 0:
+                caller = entry[4].setdefault(stack[depth - 1], [0, 0, 0.0, 0.0])
+                caller[0] += count
+                caller[1] += count
+                caller[3] += seconds
+                if depth == len(stack) - 1:
+                    caller[2] += seconds
+        stats[stack[-1]][2] += seconds
+    return marshal.dumps(
+        {
+            func: (cc, nc, tt, ct, {c: tuple(v) for c, v in callers.items()})
+            for func, (cc, nc, tt, ct, callers) in stats.items()
+        }
+    )
+
+
+def top_functions(stacks: collections.Counter[Stack], n: int = TOP_N) -> str:
+    """functions with the most samples on top of the stack, and anywhere in it"""
+    total = sum(stacks.values()) or 1
+    own: collections.Counter[Frame] = collections.Counter()
+    cumulative: collections.Counter[Frame] = collections.Counter()
+    for stack, count in stacks.items():
+        own[stack[-1]] += count
+        for func in set(stack):
+            cumulative[func] += count
+    lines = [f"{total} samples", "   own%   cum%  function"]
+    for func, count in own.most_common(n):
+        filename, line, name = func
+        lines.append(
+            f"{count / total:7.1%} {cumulative[func] / total:6.1%}  {name} ({filename}:{line})"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def memory_diff(seconds: float, n: int = TOP_N) -> str:
+    """allocation growth by line over the given time, and the current top allocation sites"""
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(TRACEBACK_FRAMES)
+    try:
+        before = tracemalloc.take_snapshot()
+        time.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+    finally:
+        if started:
+            tracemalloc.stop()
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    before, after = before.filter_traces(filters), after.filter_traces(filters)
+    lines = [f"top {n} allocation growth over {seconds}s"]
+    lines += [str(stat) for stat in after.compare_to(before, "lineno")[:n]]
+    lines += ["", f"top {n} allocation sites"]
+    lines += [str(stat) for stat in after.statistics("lineno")[:n]]
+    return "\n".join(lines) + "\n"
+
+
+def save(kind: str, result: dict[str, str | bytes], directory: str) -> list[str]:
+    """write every format of a result to timestamped files in directory"""
+    prefix = os.path.join(directory, f"profile-{time.strftime('%Y%m%d-%H%M%S')}-{kind}")
+    paths = []
+    for fmt, data in result.items():
+        path = prefix + EXTENSIONS[fmt]
+        with open(path, "wb") as f:
+            f.write(data if isinstance(data, bytes) else data.encode("utf-8"))
+        paths.append(path)
+    return paths
+
+
+class Profiler:
+    """
+    runs cpu sampling or memory snapshot diffs in the background on demand, keeping the last result of each
+    the profiled threads keep running, only the sampling thread does extra work
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running: dict[str, threading.Thread] = {}
+        self.results: dict[str, dict[str, str | bytes]] = {}
+        return
+
+    def is_running(self, kind: str) -> bool:
+        thread = self.running.get(kind)
+        return thread is not None and thread.is_alive()
+
+    def start(
+        self,
+        kind: str,
+        seconds: float = DEFAULT_DURATION,
+        thread_names: set[str] | None = None,
+        callback: Callable[[str, dict[str, str | bytes]], None] | None = None,
+    ) -> bool:
+        """
+        start profiling for seconds, returns False if one of kind is already running
+        callback is called with kind and results when done
+        """
+        with self.lock:
+            if self.is_running(kind):
+                return False
+            thread = threading.Thread(
+                target=self.run,
+                args=(kind, seconds, thread_names, callback),
+                name=f"profiler-{kind}",
+                daemon=True,
+            )
+            self.running[kind] = thread
+            thread.start()
+        return True
+
+    def run(self, kind, seconds, thread_names, callback):
+        log.info(f"Starting {kind} profile for {seconds}s")
+        if kind == CPU:
+            stacks = sample_stacks(seconds, SAMPLE_INTERVAL, thread_names)
+            result: dict[str, str | bytes] = {
+                "collapsed": to_collapsed(stacks),
+                "pstats": to_pstats(stacks, SAMPLE_INTERVAL),
+                "top": top_functions(stacks),
+            }
+        else:
+            result = {"top": memory_diff(seconds)}
+        self.results[kind] = result
+        log.info(f"Finished {kind} profile")
+        if callback:
+            callback(kind, result)
+        return
+
+    def result(self, kind: str, fmt: str = "top") -> str | bytes | None:
+        return self.results.get(kind, {}).get(fmt)
+
+
+profiler = Profiler()
@@ -0,0 +1,77 @@
+import concurrent.futures
+import time
+
+from .config import REGIONS, settings
+from .core import Core, expiry_of, get_module_name
+
+REGION_REFRESHER = get_module_name(__name__)
+
+
+class RegionRefresher(Core):
+    """keeps regions.json in sync with ESI, unchanged regions cost a 304 or no request at all"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(REGION_REFRESHER, *args, **kwargs)
+        # url -> when its last response expires, not requested again before
+        self.expires: dict[str, float] = {}
+        # region ids last listed by ESI
+        self.region_ids: list[int] = []
+        return
+
+    def fetch(self, url: str) -> dict | list | None:
+        """content of url, None when not modified, not expired yet or failed"""
+        if time.time() < self.expires.get(url, 0):
+            return None
+        res = self.get(url, {200, 304})
+        # errors and responses without a valid Expires are requested again next refresh
+        expiry = expiry_of(res)
+        if res.status_code in {200, 304} and expiry != float("inf"):
+            self.expires[url] = expiry
+        else:
+            self.expires.pop(url, None)
+        if res.status_code != 200:
+            return None
+        return res.json()
+
+    def fetch_region(self, region_id: int, known: dict[int, dict]) -> dict | None:
+        """region entry of regions.json, the known one when unchanged"""
+        url = settings.esi_url + f"/universe/regions/{region_id}/"
+        res = self.fetch(url)
+        if res is None:
+            if region_id not in known:
+                # nothing to fall back on, fetched in full next time
+                self.get_etags.pop(url, None)
+                self.expires.pop(url, None)
+            return known.get(region_id)
+        return {
+            "name": res["name"],
+            "region_id": res["region_id"],
+            "known_space": True if res.get("description") else False,
+        }
+
+    def refresh_regions(self):
+        """fetch region details concurrently, regions.json is only rewritten when something changed"""
+        current = settings.regions
+        known = {region["region_id"]: region for region in current}
+        region_ids = self.fetch(settings.esi_url + "/universe/regions/")
+        if region_ids is None:
+            region_ids = self.region_ids or list(known)
+        self.region_ids = region_ids
+
+        with concurrent.futures.ThreadPoolExecutor(
+            settings.http_pool_size, thread_name_prefix=self.name
+        ) as executor:
+            fetched = list(
+                executor.map(lambda rid: self.fetch_region(rid, known), region_ids)
+            )
+        regions = [region for region in fetched if region is not None]
+
+        if regions and regions != current:
+            settings.save(REGIONS, regions)
+            self.log.info(f"Updated regions.json, {len(regions)} regions")
+        else:
+            self.log.debug("Regions unchanged")
+        self.next_poll = time.time() + settings.region_refresh_interval
+        return
+
+    main = refresh_regions
@@ -0,0 +1,65 @@
+import glob
+import os
+import threading
+import time
+from typing import Iterator
+
+from .config import settings
+from .transport import CaptureWriter, iter_capture
+
+ORDERS = "orders"
+CONTRACT = "contract"
+SUFFIX = ".jsonl.gz"
+
+# opened on first record, closed by close
+writer: CaptureWriter | None = None
+snapshot_lock = threading.Lock()
+
+
+def split(path: str) -> tuple[str, str]:
+    """path without and with its extension, snapshot files of each run are named between both"""
+    if path.endswith(SUFFIX):
+        return path[: -len(SUFFIX)], SUFFIX
+    return os.path.splitext(path)
+
+
+def run_file(path: str, started: float) -> str:
+    """file of the run started at started, a run never appends to the file of another"""
+    root, ext = split(path)
+    return f"{root}-{time.strftime('%Y%m%d-%H%M%S', time.localtime(started))}{ext}"
+
+
+def recordings(path: str) -> list[str]:
+    """files recorded under path, oldest first, path itself is read too when recorded before files were per run"""
+    root, ext = split(path)
+    files = sorted(glob.glob(glob.escape(root) + "-*" + ext))
+    return ([path] if os.path.isfile(path) else []) + files
+
+
+def record(kind: str, at: float, **fields):
+    """append what a feature saw at time at to the file of this run, when RECORD_SNAPSHOTS is enabled"""
+    global writer
+    if not settings.record_snapshots:
+        return
+    with snapshot_lock:
+        if writer is None:
+            writer = CaptureWriter(run_file(settings.snapshot_file, time.time()))
+        current = writer
+    current.write({"kind": kind, "at": round(at, 3), **fields})
+    return
+
+
+def read(path: str) -> Iterator[dict]:
+    """records of every run recorded under path, one at a time"""
+    for file in recordings(path):
+        yield from iter_capture(file)
+    return
+
+
+def close():
+    global writer
+    with snapshot_lock:
+        if writer is not None:
+            writer.close()
+            writer = None
+    return
@@ -0,0 +1,140 @@
+import collections
+import threading
+import time
+import uuid
+
+ORDERS = "orders"
+CONTRACTS = "contracts"
+ARBITRAGE = "arbitrage"
+RECENT_CONTRACTS = 1000
+
+
+class StateIndex:
+    """
+    in memory view of what the features currently know, updated incrementally by them and read by the ui api
+    each section has a version bumped on every change, which together with a per process token makes its ETag
+    """
+
+    def __init__(self, max_contracts: int = RECENT_CONTRACTS):
+        self.lock = threading.Lock()
+        self.token = uuid.uuid4().hex[:8]
+        self.versions: collections.Counter[str] = collections.Counter()
+        # type_id -> target info with orders below threshold by region_id -> order_id
+        self.targets: dict[int, dict] = {}
+        self.orders: dict[int, dict[int, dict[int, dict]]] = {}
+        self.contracts: collections.deque[dict] = collections.deque(
+            maxlen=max_contracts
+        )
+        self.opportunities: list[dict] = []
+        self.features: dict[str, object] = {}
+        return
+
+    def etag(self, section: str) -> str:
+        return f"{self.token}-{section}-{self.versions[section]}"
+
+    def register_feature(self, feature):
+        """feature is a Core, read for its next_poll and history on demand"""
+        self.features[feature.name] = feature
+        return
+
+    def set_orders(
+        self, type_id: int, name: str, threshold: float, region_id: int, orders: list
+    ):
+        """replace orders below threshold of a target in a region"""
+        by_id = {o["order_id"]: o for o in orders}
+        with self.lock:
+            target = {"type_id": type_id, "name": name, "threshold": threshold}
+            regions = self.orders.setdefault(type_id, {})
+            if (
+                self.targets.get(type_id) == target
+                and regions.get(region_id, {}) == by_id
+            ):
+                return
+            self.targets[type_id] = target
+            if by_id:
+                regions[region_id] = by_id
+            else:
+                regions.pop(region_id, None)
+            self.versions[ORDERS] += 1
+        return
+
+    def retain_targets(self, type_ids: set[int]):
+        """drop orders of items no longer watched"""
+        with self.lock:
+            removed = self.targets.keys() - type_ids
+            for type_id in removed:
+                del self.targets[type_id]
+                self.orders.pop(type_id, None)
+            if removed:
+                self.versions[ORDERS] += 1
+        return
+
+    def add_contract(self, contract: dict):
+        """record a contract valuation, keeping only the most recent ones"""
+        with self.lock:
+            self.contracts.append({**contract, "valued_at": int(time.time())})
+            self.versions[CONTRACTS] += 1
+        return
+
+    def set_opportunities(self, opportunities: list[dict]):
+        """replace the most profitable cross region spreads"""
+        with self.lock:
+            if self.opportunities == opportunities:
+                return
+            self.opportunities = opportunities
+            self.versions[ARBITRAGE] += 1
+        return
+
+    def get_orders(self, offset: int = 0, limit: int | None = None) -> dict:
+        """targets with their orders below threshold, cheapest first"""
+        with self.lock:
+            type_ids = sorted(self.targets)
+            page = type_ids[offset : None if limit is None else offset + limit]
+            items = [
+                {
+                    **self.targets[type_id],
+                    "orders": sorted(
+                        (
+                            {"region_id": region_id, **order}
+                            for region_id, orders in self.orders[type_id].items()
+                            for order in orders.values()
+                        ),
+                        key=lambda o: o["price"],
+                    ),
+                }
+                for type_id in page
+            ]
+        return {"total": len(type_ids), "items": items}
+
+    def get_contracts(self, offset: int = 0, limit: int | None = None) -> dict:
+        """recent contract valuations, newest first"""
+        with self.lock:
+            contracts = list(self.contracts)
+        contracts.reverse()
+        page = contracts[offset : None if limit is None else offset + limit]
+        return {"total": len(contracts), "items": page}
+
+    def get_opportunities(self, offset: int = 0, limit: int | None = None) -> dict:
+        """cross region spreads, most profitable first"""
+        with self.lock:
+            opportunities = self.opportunities
+        page = opportunities[offset : None if limit is None else offset + limit]
+        return {"total": len(opportunities), "items": page}
+
+    def get_features(self) -> dict:
+        """next poll of every feature, and history size of those keeping one"""
+        items = []
+        for name, feature in list(self.features.items()):
+            next_poll = getattr(feature, "next_poll", float("inf"))
+            history = getattr(feature, "history", None)
+            items.append(
+                {
+                    "name": name,
+                    "next_poll": None if next_poll == float("inf") else next_poll,
+                    "history_size": None if history is None else len(history),
+                }
+            )
+        return {"total": len(items), "items": items}
+
+
+state = StateIndex()
@@ -0,0 +1,321 @@
+import base64
+import collections
+import datetime
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from typing import BinaryIO, Iterator
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from . import http_pool
+
+LIVE = "live"
+RECORD = "record"
+REPLAY = "replay"
+ORIGINAL = "original"  # replay waits as long as the recorded response took
+FAST = "fast"
+REDACTED_HEADERS = {"authorization", "x-apikey", "cookie"}
+# seconds between flushes of a capture, each flush costs compression
+FLUSH_INTERVAL = 5
+GZIP_MAGIC = b"\x1f\x8b\x08"
+GZIP_WBITS = zlib.MAX_WBITS | 16
+READ_CHUNK = 64 * 1024
+
+log = logging.getLogger(__name__)
+
+
+class ReplayMissError(requests.exceptions.RequestException):
+    """no recorded response for a request"""
+
+
+def request_key(method: str, url: str, body: bytes | str | None) -> str:
+    """what identifies a request in a capture, headers such as If-None-Match are left out"""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    digest = hashlib.sha1(body).hexdigest() if body else ""
+    return f"{method} {url} {digest}"
+
+
+def encode_body(body: bytes | str | None) -> dict:
+    if body is None:
+        return {}
+    if isinstance(body, str):
+        return {"text": body}
+    try:
+        return {"text": body.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"base64": base64.b64encode(body).decode("ascii")}
+
+
+def decode_body(record: dict) -> bytes:
+    if "base64" in record:
+        return base64.b64decode(record["base64"])
+    return record.get("text", "").encode("utf-8")
+
+
+class CaptureWriter:
+    """appends one json line per exchange to a gzip file, shared by every recording session"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = gzip.open(path, "at", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.flushed = self.started
+        return
+
+    def write(self, record: dict):
+        line = json.dumps(record)
+        with self.lock:
+            self.file.write(line + "\n")
+            # a killed process leaves no gzip trailer, read_capture still reads up to the last flush
+            if time.time() - self.flushed >= FLUSH_INTERVAL:
+                self.file.flush()
+                self.flushed = time.time()
+        return
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+        return
+
+
+def readable_member(data: bytes) -> bool:
+    """whether data starts with a gzip member, as far as data goes"""
+    try:
+        zlib.decompressobj(GZIP_WBITS).decompress(data)
+    except zlib.error:
+        return False
+    return True
+
+
+def find_member(data: bytes) -> int:
+    """offset of the first gzip member in data, -1 if none"""
+    start = data.find(GZIP_MAGIC)
+    while start != -1 and not readable_member(data[start:]):
+        start = data.find(GZIP_MAGIC, start + 1)
+    return start
+
+
+def inflate(f: BinaryIO) -> Iterator[bytes | None]:
+    """
+    decompressed bytes of each gzip member of f followed by None,
+    a member left without its trailer by a killed writer ends where its data does, reading goes on from the next member
+    """
+    d = zlib.decompressobj(GZIP_WBITS)
+    # last bytes fed to d, the next member's header may start in them
+    tail = b""
+    data = f.read(READ_CHUNK)
+    while data:
+        saved = d.copy()
+        try:
+            out = d.decompress(data)
+        except zlib.error:
+            window = tail + data
+            start = find_member(window)
+            while start == -1:
+                more = f.read(READ_CHUNK)
+                if not more:
+                    break
+                window += more
+                data += more
+                start = find_member(window)
+            try:
+                # what the cut member holds up to the next one
+                yield saved.decompress(
+                    data if start == -1 else data[: max(0, start - len(tail))]
+                )
+            except zlib.error:
+                pass
+            yield None
+            log.warning(f"Capture {f.name} has a member cut short")
+            if start == -1:
+                return
+            d = zlib.decompressobj(GZIP_WBITS)
+            tail, data = b"", window[start:]
+            continue
+        yield out
+        if d.eof:
+            yield None
+            data = d.unused_data
+            d = zlib.decompressobj(GZIP_WBITS)
+            tail = b""
+            if data:
+                continue
+        else:
+            tail = data[-len(GZIP_MAGIC) :]
+        data = f.read(READ_CHUNK)
+    # the last member of a writer that was not closed
+    yield None
+    return
+
+
+def iter_capture(path: str) -> Iterator[dict]:
+    """records of a capture one at a time, the line a killed writer was cut in is skipped"""
+    with open(path, "rb") as f:
+        pending = b""
+        for chunk in inflate(f):
+            if chunk is None:
+                lines, pending = [pending], b""
+            else:
+                *lines, pending = (pending + chunk).split(b"\n")
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    log.warning(f"Skipping a record cut short in {path}")
+    return
+
+
+def read_capture(path: str) -> list[dict]:
+    return list(iter_capture(path))
+
+
+class RecordingAdapter(BaseAdapter):
+    """
+    sends requests through the shared connection pool and its retry policy as usual,
+    writing each request and the response it finally got to the capture
+    """
+
+    def __init__(self, writer: CaptureWriter, adapter: BaseAdapter | None = None):
+        super().__init__()
+        self.writer = writer
+        # the process wide pooled adapter when not given, looked up on each send as it is replaced once closed
+        self.adapter = adapter
+        return
+
+    def send(self, request: requests.PreparedRequest, *args, **kwargs):
+        adapter = self.adapter if self.adapter else http_pool.get_adapter()
+        at = time.time() - self.writer.started
+        start = time.perf_counter()
+        res = adapter.send(request, *args, **kwargs)
+        content = res.content
+        elapsed = time.perf_counter() - start
+        self.writer.write(
+            {
+                "key": request_key(
+                    request.method or "", request.url or "", request.body
+                ),
+                "at": round(at, 6),
+                "elapsed": round(elapsed, 6),
+                "request": {
+                    "method": request.method,
+                    "url": request.url,
+                    "headers": {
+                        k: "<redacted>" if k.lower() in REDACTED_HEADERS else v
+                        for k, v in request.headers.items()
+                    },
+                    **encode_body(request.body),
+                },
+                "response": {
+                    "status": res.status_code,
+                    "reason": res.reason,
+                    "headers": dict(res.headers),
+                    **encode_body(content),
+                },
+            }
+        )
+        return res
+
+    def close(self):
+        """the pool is shared with other sessions, see http_pool.close"""
+        return
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    answers requests from a capture without touching the network, repeated requests get the recorded responses in order,
+    the last one is served again once they run out, speed original waits as long as the recorded response took
+    """
+
+    def __init__(self, records: list[dict], speed: str = FAST):
+        super().__init__()
+        self.speed = speed
+        self.responses: dict[str, collections.deque[dict]] = collections.defaultdict(
+            collections.deque
+        )
+        for record in records:
+            self.responses[record["key"]].append(record)
+        self.lock = threading.Lock()
+        return
+
+    def next_record(self, key: str) -> dict:
+        with self.lock:
+            queue = self.responses.get(key)
+            if not queue:
+                raise ReplayMissError(f"No recorded response for {key}")
+            return queue.popleft() if len(queue) > 1 else queue[0]
+
+    def send(self, request: requests.PreparedRequest, *args, **kwargs):
+        record = self.next_record(
+            request_key(request.method or "", request.url or "", request.body)
+        )
+        if self.speed == ORIGINAL:
+            time.sleep(record["elapsed"])
+        recorded = record["response"]
+        res = requests.Response()
+        res.status_code = recorded["status"]
+        res.reason = recorded.get("reason", "")
+        res.headers = CaseInsensitiveDict(recorded["headers"])
+        # the recorded body is already decoded
+        res.headers.pop("Content-Encoding", None)
+        res._content = decode_body(recorded)
+        res.encoding = get_encoding_from_headers(res.headers)
+        res.url = request.url or ""
+        res.request = request
+        res.elapsed = datetime.timedelta(seconds=record["elapsed"])
+        return res
+
+    def close(self):
+        return
+
+
+# one per capture file, every feature records to and replays from the same one
+writers: dict[str, CaptureWriter] = {}
+replays: dict[str, ReplayAdapter] = {}
+transport_lock = threading.Lock()
+
+
+def mount(
+    session: requests.Session, prefixes: list[str], mode: str, path: str, speed: str
+):
+    """route requests to urls starting with prefixes through the recorder or replayer"""
+    if mode == LIVE:
+        return
+    with transport_lock:
+        if mode == RECORD:
+            if path not in writers:
+                writers[path] = CaptureWriter(path)
+                log.info(f"Recording requests to {path}")
+            adapter = RecordingAdapter(writers[path])
+        elif mode == REPLAY:
+            if path not in replays:
+                replays[path] = ReplayAdapter(read_capture(path), speed)
+                log.info(f"Replaying requests from {path} at {speed} speed")
+            adapter = replays[path]
+        else:
+            raise ValueError(f"Unknown transport mode {mode}")
+    for prefix in prefixes:
+        session.mount(prefix, adapter)
+    return
+
+
+def close():
+    """flush and close capture files"""
+    with transport_lock:
+        for writer in writers.values():
+            writer.close()
+        writers.clear()
+    return
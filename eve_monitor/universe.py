@@ -0,0 +1,138 @@
+import collections
+import logging
+import sqlite3
+import threading
+import time
+from array import array
+
+from .config import settings
+
+UNREACHABLE = 0xFFFF  # distance of systems not connected to any home system
+HIGH_SEC = 0.45  # rounds to 0.5, the lowest high sec status
+
+log = logging.getLogger(__name__)
+
+
+class JumpGraph:
+    """
+    stargate connections between solar systems in compressed sparse row form,
+    neighbours of the system at index i are indices[indptr[i]:indptr[i + 1]]
+    """
+
+    def __init__(
+        self, systems: list[tuple[int, int, float]], jumps: list[tuple[int, int]]
+    ):
+        """systems as (system_id, region_id, security), jumps as (from_system_id, to_system_id)"""
+        self.system_ids = array("l", (s[0] for s in systems))
+        self.region_ids = array("l", (s[1] for s in systems))
+        self.security = array("d", (s[2] for s in systems))
+        self.index = {system_id: i for i, system_id in enumerate(self.system_ids)}
+
+        # gates are listed once per direction in the sde, both are added in case an export is one sided
+        edges = set()
+        for a, b in jumps:
+            if a in self.index and b in self.index:
+                edges.add((self.index[a], self.index[b]))
+                edges.add((self.index[b], self.index[a]))
+        degree = [0] * (len(systems) + 1)
+        for a, _ in edges:
+            degree[a + 1] += 1
+        self.indptr = array("l", degree)
+        for i in range(1, len(self.indptr)):
+            self.indptr[i] += self.indptr[i - 1]
+        self.indices = array("l", [0]) * len(edges)
+        fill = array("l", self.indptr[:-1])
+        for a, b in sorted(edges):
+            self.indices[fill[a]] = b
+            fill[a] += 1
+        return
+
+    @classmethod
+    def from_db(cls, cur: sqlite3.Cursor) -> "JumpGraph":
+        cur.execute(
+            "select solarSystemID, regionID, security from mapSolarSystems order by solarSystemID"
+        )
+        systems = cur.fetchall()
+        cur.execute(
+            "select fromSolarSystemID, toSolarSystemID from mapSolarSystemJumps"
+        )
+        return cls(systems, cur.fetchall())
+
+    def __len__(self) -> int:
+        return len(self.system_ids)
+
+    def distances(self, sources: list[int], safe: bool = False) -> array:
+        """
+        jumps from the nearest of sources to every system, in system index order,
+        safe only routes through high sec, low and null sec systems next to it are reached but not passed through
+        """
+        dist = array("H", [UNREACHABLE]) * len(self)
+        queue = collections.deque()
+        for system_id in sources:
+            i = self.index.get(system_id)
+            if i is not None and dist[i]:
+                dist[i] = 0
+                queue.append(i)
+        indptr, indices, security = self.indptr, self.indices, self.security
+        while queue:
+            i = queue.popleft()
+            if safe and dist[i] and security[i] < HIGH_SEC:
+                continue
+            d = dist[i] + 1
+            for k in range(indptr[i], indptr[i + 1]):
+                j = indices[k]
+                if dist[j] == UNREACHABLE:
+                    dist[j] = d
+                    queue.append(j)
+        return dist
+
+
+class JumpIndex:
+    """
+    distance of every system from the closest of HOME_SYSTEMS, the graph is read from the sde on first use
+    and distances are computed once per change of HOME_SYSTEMS or SAFE_ROUTING
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.graph: JumpGraph | None = None
+        self.key: tuple | None = None
+        self.dist = array("H")
+        # region_id -> jumps to its closest system
+        self.regions: dict[int, int] = {}
+        return
+
+    def update(self, cur: sqlite3.Cursor) -> bool:
+        """refresh distances for current settings, returns whether any home system is set"""
+        homes = tuple(settings.home_systems)
+        if not homes:
+            return False
+        key = (homes, settings.safe_routing)
+        if key == self.key:
+            return True
+        with self.lock:
+            if key == self.key:
+                return True
+            start = time.perf_counter()
+            if self.graph is None:
+                self.graph = JumpGraph.from_db(cur)
+            dist = self.graph.distances(list(homes), settings.safe_routing)
+            regions: dict[int, int] = {}
+            for region_id, d in zip(self.graph.region_ids, dist):
+                regions[region_id] = min(regions.get(region_id, UNREACHABLE), d)
+            self.dist, self.regions, self.key = dist, regions, key
+            log.info(
+                f"Jump distances of {len(self.graph)} systems from {homes} in {time.perf_counter() - start:.2f}s"
+            )
+        return True
+
+    def jumps(self, system_id: int) -> int | None:
+        """jumps from the closest home system, None for systems not in the local database"""
+        i = self.graph.index.get(system_id) if self.graph else None
+        return None if i is None else self.dist[i]
+
+    def region_jumps(self, region_id: int) -> int | None:
+        return self.regions.get(region_id)
+
+
+jump_index = JumpIndex()
@@ -7,11 +7,11 @@ import sys
 import threading
 import time
 
+from eve_monitor import http_pool, log_queue, metrics, snapshots, transport
+from eve_monitor.arbitrage import ARBITRAGE, Arbitrage
+from eve_monitor.config import settings
 from eve_monitor.constants import (
-    SETTINGS,
-    DEBUG,
     SETTINGS_DIR,
-    LOG_TO_FILE,
     LOGS_DIR,
     MAIN_LOG_FILE,
     ERROR_LOG_FILE,
@@ -20,32 +20,43 @@ from eve_monitor.constants import (
 )
 from eve_monitor.contract_sniper import CONTRACT_SNIPER, ContractSniper
 from eve_monitor.core import BaseHistory
+from eve_monitor.latency import tracker
 from eve_monitor.market_monitor import MARKET_MONITOR, MarketMonitor
+from eve_monitor.market_salvager import MARKET_SALVAGER, MarketSalvager
+from eve_monitor.notifier import Notifier
+from eve_monitor.profiles import Profile, load_profiles
+from eve_monitor.profiling import CPU, MEMORY, DEFAULT_DURATION, profiler, save
+from eve_monitor.region_refresher import RegionRefresher
+from eve_monitor.state import state
 
 
 MAX_LOG_SIZE = 10 * 1024 * 1024  # 10 MB
 BACKUP_COUNT = 1
-FEATURES = SETTINGS["features_enabled"]
-POLL_RATE = SETTINGS["poll_rate_in_min"]
+LOG_FORMAT = "%(asctime)s %(name)15s %(levelname)s\t%(message)s"
+DUMP_HISTORY_INTERVAL = 60 * 60
+METRICS_LOG_INTERVAL = 15 * 60
 HISTORY_JSON = SETTINGS_DIR + "history.json"
-if not os.path.exists(HISTORY_JSON):
-    json.dump({}, open(HISTORY_JSON, "w+", encoding="utf-8", newline="\n"))
 
-history_file = json.load(open(HISTORY_JSON, "r", encoding="utf-8"))
+# populated by start, histories register themselves in it
+history_file: dict = {}
+dump_lock = threading.Lock()
 event = threading.Event()
 features = []
 threads = []
+notifier: Notifier | None = None
+profiles: list[Profile] = []
 
 
-def config_logging():
-    handlers = [logging.StreamHandler()]
+def config_logging(extra_handlers: list[logging.Handler] = []):
+    """extra handlers get the main log, formatted the same way as the log file"""
+    handlers = [logging.StreamHandler(), *extra_handlers]
     file_handler_args = {
         "mode": "a+",
         "maxBytes": MAX_LOG_SIZE,
         "backupCount": BACKUP_COUNT,
         "encoding": "utf-8",
     }
-    if LOG_TO_FILE:
+    if settings.log_to_file:
         if not os.path.exists(LOGS_DIR):
             os.makedirs(LOGS_DIR)
         main_log_handler = logging.handlers.RotatingFileHandler(
@@ -57,47 +68,165 @@ def config_logging():
         error_log_handler.setLevel(logging.WARNING)
         handlers += [main_log_handler, error_log_handler]
 
-    logging.basicConfig(
-        format="%(asctime)s %(name)15s %(levelname)s\t%(message)s",
-        level=logging.INFO,
-        handlers=handlers,
-    )
+    # feature threads only enqueue records, formatting and file writes happen on listener threads
+    formatter = logging.Formatter(LOG_FORMAT)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    log_queue.attach(root, handlers)
     logging.getLogger("urllib3").setLevel(logging.INFO)
 
     notification_log = logging.getLogger(NOTIFICATION_LOG)
-    notification_log.handlers.clear()
     notification_log.propagate = False
-    if LOG_TO_FILE:
-        notification_log.addHandler(
-            logging.handlers.RotatingFileHandler(
-                NOTIFICATION_LOG_FILE, **file_handler_args
-            )
+    if settings.log_to_file:
+        log_queue.attach(
+            notification_log,
+            [
+                logging.handlers.RotatingFileHandler(
+                    NOTIFICATION_LOG_FILE, **file_handler_args
+                )
+            ],
         )
+    else:
+        notification_log.handlers.clear()
     return
 
 
+def load_history() -> dict:
+    """load history file, creating an empty one if missing"""
+    if not os.path.exists(HISTORY_JSON):
+        json.dump({}, open(HISTORY_JSON, "w+", encoding="utf-8", newline="\n"))
+    return json.load(open(HISTORY_JSON, "r", encoding="utf-8"))
+
+
 def dump_history(history: dict[str, BaseHistory]):
-    """cleanup then dump history to file system"""
-    for k in history:
-        if issubclass(type(history[k]), BaseHistory):
-            history[k].trim()
+    """cleanup then dump history to file system, works on snapshots so features keep running"""
+    serializable = {}
+    for k, v in list(history.items()):
+        if isinstance(v, BaseHistory):
+            v.trim()
+            v = v.to_json_serializable()
+        serializable[k] = v
     temp_history = HISTORY_JSON + ".tmp"
-    json.dump(
-        history,
-        open(temp_history, "w+", encoding="utf-8", newline="\n"),
-        indent=4 if DEBUG else None,
-        default=lambda c: c.to_json_serializable(),
-    )
-    os.replace(temp_history, HISTORY_JSON)
+    with dump_lock:
+        json.dump(
+            serializable,
+            open(temp_history, "w+", encoding="utf-8", newline="\n"),
+            indent=4 if settings.debug else None,
+        )
+        os.replace(temp_history, HISTORY_JSON)
     return
 
 
-def handle_interrupt(_, __):
-    """dump file history then exist when interrupt"""
+def start(log_handlers: list[logging.Handler] = []):
+    """load settings and history, then start enabled features in their own threads"""
+    global notifier, profiles
+    # fail fast on missing settings instead of running on defaults
+    settings.load(strict=True)
+    config_logging(log_handlers)
+    history_file.update(load_history())
+    notifier = Notifier()
+    notifier.start()
+    profiles = load_profiles(notifier)
+
+    enabled = settings.features_enabled
+    if enabled.get(MARKET_MONITOR):
+        features.append(
+            MarketMonitor(
+                history_file, threaded=event, notifier=notifier, profiles=profiles
+            )
+        )
+    if enabled.get(CONTRACT_SNIPER):
+        features.append(
+            ContractSniper(
+                history_file, threaded=event, notifier=notifier, profiles=profiles
+            )
+        )
+    if enabled.get(MARKET_SALVAGER):
+        features.append(MarketSalvager(history_file, threaded=event, notifier=notifier))
+    if enabled.get(ARBITRAGE):
+        features.append(Arbitrage(history_file, threaded=event, notifier=notifier))
+    # every feature reads regions.json
+    if features and settings.region_refresh_interval:
+        features.append(RegionRefresher(threaded=event, notifier=notifier))
+
+    for feature in features:
+        state.register_feature(feature)
+        t = threading.Thread(
+            target=feature.run, args=(settings.poll_rate,), name=feature.name
+        )
+        t.start()
+        threads.append(t)
+
+    if features == []:
+        logging.error("Improperly configured, enable some features in settings")
+    return
+
+
+def serve_forever():
+    """periodically log metrics summary and dump history until shutdown"""
+    last_dump = time.time()
+    while not event.wait(METRICS_LOG_INTERVAL):
+        logging.getLogger("metrics").info(metrics.summary())
+        logging.getLogger("metrics").info(tracker.summary())
+        if time.time() - last_dump >= DUMP_HISTORY_INTERVAL:
+            dump_history(history_file)
+            last_dump = time.time()
+    return
+
+
+def shutdown():
+    """stop features, flush notifications then dump history"""
     event.set()
     for thread in threads:
         thread.join()
+    for feature in features:
+        if isinstance(feature, ContractSniper) and feature.archive:
+            feature.archive.close()
+    for profile in profiles:
+        if not profile.is_default:
+            profile.notifier.stop()
+    if notifier:
+        notifier.stop()
+    transport.close()
+    http_pool.close()
+    snapshots.close()
     dump_history(history_file)
+    log_queue.stop()
+    return
+
+
+def feature_threads() -> set[str] | None:
+    """names of running feature threads to profile, None for every thread"""
+    return {t.name for t in threads} or None
+
+
+def handle_profile(_, __):
+    """profile cpu and memory for a while without stopping features, results go to logs dir"""
+    if not os.path.exists(LOGS_DIR):
+        os.makedirs(LOGS_DIR)
+
+    def write(kind, result):
+        logging.info(f"Profile written to {', '.join(save(kind, result, LOGS_DIR))}")
+        return
+
+    for kind in (CPU, MEMORY):
+        if not profiler.start(kind, DEFAULT_DURATION, feature_threads(), write):
+            logging.warning(f"A {kind} profile is already running")
+    return
+
+
+def install_profile_signal():
+    """SIGUSR1 starts profiling, where the platform has it"""
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, handle_profile)
+    return
+
+
+def handle_interrupt(_, __):
+    """dump file history then exist when interrupt"""
+    shutdown()
     sys.exit(0)
     return
 
@@ -105,23 +234,9 @@ def handle_interrupt(_, __):
 def main():
     signal.signal(signal.SIGINT, handle_interrupt)
     signal.signal(signal.SIGTERM, handle_interrupt)
-    config_logging()
-
-    if FEATURES[MARKET_MONITOR]:
-        features.append(MarketMonitor(history_file, threaded=event))
-    if FEATURES[CONTRACT_SNIPER]:
-        features.append(ContractSniper(history_file, threaded=event))
-
-    for feature in features:
-        t = threading.Thread(target=feature.run, args=(POLL_RATE,))
-        t.start()
-        threads.append(t)
-
-    if features == []:
-        logging.error("Improperly configured, enable some features in settings")
-    while True:
-        time.sleep(60 * 60)
-        dump_history(history_file)
+    install_profile_signal()
+    start()
+    serve_forever()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,9 @@
+import pytest
+
+from benchmarks.synthetic import SyntheticUniverse
+
+
+@pytest.fixture(scope="session")
+def universe() -> SyntheticUniverse:
+    """seeded synthetic orders and contracts, for tests at production sizes"""
+    return SyntheticUniverse(seed=0, now=1_700_000_000)
@@ -0,0 +1,103 @@
+import time
+
+import pytest
+
+from eve_monitor import archive
+from eve_monitor.archive import ContractArchive
+from eve_monitor.latency import parse_esi_time
+
+
+def days_ago(days: int) -> str:
+    """whole seconds as listed by ESI, recent enough to be kept"""
+    return time.strftime(
+        "%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() - days * archive.DAY)
+    )
+
+
+ISSUED = days_ago(2)
+LATER = days_ago(1)
+
+
+def contract(contract_id, price, date_issued=ISSUED):
+    return {
+        "contract_id": contract_id,
+        "start_location_id": 60003760,
+        "issuer_id": 1,
+        "title": f"contract {contract_id}",
+        "price": price,
+        "volume": 10.0,
+        "date_issued": date_issued,
+    }
+
+
+TRITANIUM = (34, "Tritanium", 1000, True)
+PYERITE = (35, "Pyerite", 500, True)
+PLEX = (44992, "PLEX", 1, False)
+
+
+class TestContractArchive:
+    @pytest.fixture
+    def path(self, tmp_path):
+        return str(tmp_path / "contracts.db")
+
+    @pytest.fixture
+    def db(self, path):
+        db = ContractArchive(path, retention_days=30)
+        db.add(10000002, contract(1, 100.0), [TRITANIUM], 200.0, 0.0, True)
+        db.add(
+            10000002,
+            contract(2, 300.0, LATER),
+            [TRITANIUM, PYERITE, PLEX],
+            500.0,
+            50.0,
+            False,
+        )
+        db.add(10000043, contract(3, 1000.0), [PYERITE], 900.0, 0.0, False)
+        db.flush()
+        yield db
+        db.close()
+
+    def ids(self, path, **filters) -> list[int]:
+        return [c["contract_id"] for c in archive.search(path, **filters)["items"]]
+
+    def test_search(self, db, path):
+        page = archive.search(path, type_id=34)
+        assert [c["contract_id"] for c in page["items"]] == [2, 1]
+        assert page["more"] is False
+        newest = page["items"][0]
+        assert newest["date_issued"] == LATER
+        assert (newest["value"], newest["notified"]) == (450.0, 0)
+        assert sorted(
+            (i["name"], i["quantity"], i["is_included"]) for i in newest["items"]
+        ) == [("PLEX", 1, False), ("Pyerite", 500, True), ("Tritanium", 1000, True)]
+
+    def test_filters(self, db, path):
+        assert self.ids(path, type_name="pyerite") == [2, 3]
+        assert self.ids(path, type_name="Pyerite", region_id=10000043) == [3]
+        assert self.ids(path, min_price=200, max_price=500) == [2]
+        assert self.ids(path, since=parse_esi_time(LATER)) == [2]
+        assert self.ids(path, type_name="Mexallon") == []
+
+    def test_paging(self, db, path):
+        first = archive.search(path, limit=2)
+        assert (len(first["items"]), first["more"]) == (2, True)
+        last = archive.search(path, offset=2, limit=2)
+        assert (len(last["items"]), last["more"]) == (1, False)
+
+    def test_batched(self, path, monkeypatch):
+        monkeypatch.setattr(archive, "BATCH_SIZE", 2)
+        db = ContractArchive(path, retention_days=30)
+        db.add(10000002, contract(1, 100.0), [TRITANIUM], 200.0, 0.0, False)
+        assert self.ids(path) == []
+        db.add(10000002, contract(2, 100.0), [TRITANIUM], 200.0, 0.0, False)
+        assert self.ids(path) == [2, 1]
+        db.close()
+
+    def test_trim(self, db, path):
+        now = parse_esi_time(LATER) + 30 * archive.DAY
+        assert db.trim(now) == 2
+        assert self.ids(path) == [2]
+        assert db.conn.execute("select count(*) from contract_items").fetchone() == (3,)
+
+    def test_missing(self, path):
+        assert archive.search(path) == {"items": [], "more": False}
@@ -0,0 +1,134 @@
+import itertools
+import random
+from unittest.mock import Mock
+
+import pytest
+
+import backtest
+from eve_monitor import snapshots, transport
+
+
+def orders_record(at, type_id, orders):
+    return {"kind": snapshots.ORDERS, "at": at, "type_id": type_id, "orders": orders}
+
+
+def contract_record(at, contract_id, price, sold, requested=0.0, of_interest=()):
+    return {
+        "kind": snapshots.CONTRACT,
+        "at": at,
+        "contract_id": contract_id,
+        "price": price,
+        "sold": sold,
+        "requested": requested,
+        "of_interest": list(of_interest),
+    }
+
+
+class TestBacktestMarket:
+    def test_market(self):
+        records = [
+            orders_record(0, 34, [[1, 10.0, 5], [2, 12.0, 1]]),
+            # 1 repriced down, 3 listed
+            orders_record(backtest.DAY, 34, [[1, 8.0, 4], [3, 11.0, 2]]),
+            orders_record(2 * backtest.DAY, 34, [[3, 11.0, 2]]),
+            orders_record(2 * backtest.DAY, 35, []),
+        ]
+        targets = [
+            {"type_id": 34, "name": "Tritanium", "threshold": 10},
+            {"type_id": 35, "name": "Pyerite", "threshold": 10},
+        ]
+        outcomes = backtest.backtest_market(records, targets, [0.5, 1.0, 1.1])
+        assert list(outcomes) == [34]
+        # median lowest price is 10
+        low, base, high = outcomes[34]
+        assert (low.alerts, low.profit) == (0, 0.0)
+        assert (base.alerts, base.profit, base.per_day) == (1, 8.0, 0.5)
+        assert (high.alerts, high.profit) == (2, 8.0 - 2.0)
+
+
+class TestBacktestContracts:
+    def notified(self, c, arbitrage, special, min_value):
+        """the rule of ContractSniper.watch_contract"""
+        cost = c["price"] + c["requested"]
+        value = c["sold"] - c["requested"]
+        return (c["sold"] * arbitrage >= cost and value >= min_value) or (
+            bool(c["of_interest"]) and c["sold"] * special >= cost
+        )
+
+    def test_grid_matches_live_rule(self):
+        rng = random.Random(0)
+        records = [
+            contract_record(
+                i,
+                i,
+                price=rng.uniform(0, 300e6),
+                sold=rng.uniform(0, 400e6),
+                requested=rng.choice([0.0, rng.uniform(0, 50e6)]),
+                of_interest=[34] if rng.random() < 0.2 else [],
+            )
+            for i in range(2000)
+        ]
+        grid = ([0.3, 0.5, 0.6], [0.7, 0.8, 1.0], [50e6, 100e6])
+        outcomes = backtest.backtest_contracts(records, *grid)
+        assert len(outcomes) == 18
+        assert outcomes == sorted(outcomes, key=lambda o: o.profit, reverse=True)
+        for o in outcomes:
+            expected = [c for c in records if self.notified(c, *o.setting)]
+            assert o.alerts == len(expected)
+            assert o.profit == pytest.approx(
+                sum(c["sold"] - c["requested"] - c["price"] for c in expected)
+            )
+
+    def test_streamed(self):
+        records = (contract_record(i, i, 10e6, 200e6) for i in range(3))
+        (outcome,) = backtest.backtest_contracts(records, [0.5], [0.8], [100e6])
+        assert outcome.alerts == 3
+
+    def test_contract_counted_once(self):
+        records = [
+            contract_record(0, 1, 10e6, 200e6),
+            contract_record(1, 1, 10e6, 200e6),
+        ]
+        (outcome,) = backtest.backtest_contracts(records, [0.5], [0.8], [100e6])
+        assert outcome.alerts == 1
+
+
+class TestSnapshots:
+    def test_record(self, tmp_path, monkeypatch):
+        path = str(tmp_path / "snapshots.jsonl.gz")
+        monkeypatch.setattr(
+            snapshots, "settings", Mock(record_snapshots=True, snapshot_file=path)
+        )
+        snapshots.record(snapshots.ORDERS, 1.23456, type_id=34, orders=[(1, 2.0, 3)])
+        snapshots.close()
+        (recorded,) = snapshots.recordings(path)
+        assert recorded.startswith(str(tmp_path / "snapshots-"))
+        assert list(snapshots.read(path)) == [
+            {"kind": "orders", "at": 1.235, "type_id": 34, "orders": [[1, 2.0, 3]]}
+        ]
+
+    def test_run_killed(self, tmp_path, monkeypatch):
+        """a run killed while recording leaves the runs before and after it readable"""
+        path = str(tmp_path / "snapshots.jsonl.gz")
+        monkeypatch.setattr(
+            snapshots, "settings", Mock(record_snapshots=True, snapshot_file=path)
+        )
+        monkeypatch.setattr(transport, "FLUSH_INTERVAL", 0)
+        clock = Mock(return_value=1_700_000_000.0)
+        monkeypatch.setattr(snapshots.time, "time", clock)
+        for run in range(3):
+            clock.return_value += 60
+            snapshots.record(snapshots.CONTRACT, run, contract_id=run)
+            if run == 1:
+                # killed, its file is not closed before the next run
+                killed, snapshots.writer = snapshots.writer, None
+            else:
+                snapshots.close()
+        assert len(snapshots.recordings(path)) == 3
+        assert [r["contract_id"] for r in snapshots.read(path)] == [0, 1, 2]
+        killed.close()
+
+    def test_disabled(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(snapshots, "settings", Mock(record_snapshots=False))
+        snapshots.record(snapshots.ORDERS, 0)
+        assert snapshots.writer is None
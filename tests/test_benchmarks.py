@@ -0,0 +1,85 @@
+import json
+
+import pytest
+import requests
+
+from benchmarks import bench_logging, run
+from benchmarks.fake_esi import FakeEsi, FakeEsiConfig
+from benchmarks.synthetic import SyntheticUniverse, fake_types
+from eve_monitor.config import settings
+
+
+@pytest.fixture
+def esi():
+    esi = FakeEsi(FakeEsiConfig(regions=2, types=3, contracts=2500, error_burst=2))
+    esi.start()
+    yield esi
+    esi.stop()
+
+
+@pytest.fixture(autouse=True)
+def restore_settings(monkeypatch):
+    # run.configure points the shared settings at generated files
+    monkeypatch.setattr(settings, "paths", dict(settings.paths))
+    monkeypatch.setattr(settings, "_sections", {})
+
+
+class TestFakeEsi:
+    def test_paging(self, esi):
+        url = esi.esi_url + f"/contracts/public/{esi.region_ids[0]}"
+        res = requests.get(url)
+        assert res.headers["X-Pages"] == "2"
+        assert len(res.json()) == 1000
+        assert len(requests.get(url, params={"page": 2}).json()) == 250
+
+    def test_not_modified(self, esi):
+        url = esi.esi_url + f"/markets/{esi.region_ids[0]}/orders/"
+        res = requests.get(url, params={"type_id": esi.type_ids[0]})
+        assert "Expires" in res.headers
+        res = requests.get(
+            url,
+            params={"type_id": esi.type_ids[0]},
+            headers={"If-None-Match": res.headers["ETag"]},
+        )
+        assert res.status_code == 304
+        assert esi.not_modified == 1
+
+    def test_error_burst(self, esi):
+        esi.config.error_every = 3
+        statuses = [
+            requests.get(esi.esi_url + "/universe/regions/").status_code
+            for _ in range(6)
+        ]
+        assert statuses == [200, 200, 503, 503, 200, 503]
+
+    def test_deterministic(self, esi):
+        # same clock, issue dates are relative to it
+        other = FakeEsi(
+            esi.config,
+            SyntheticUniverse(fake_types(esi.config.types), now=esi.universe.now),
+        )
+        assert other.contract_pages == esi.contract_pages
+
+
+class TestRun:
+    def test_scenarios(self, tmp_path, capsys):
+        saved = tmp_path / "results.json"
+        argv = ["--targets", "2", "--regions", "2", "--contracts", "50"]
+        assert run.main([*argv, "--cycles", "1", "--save", str(saved)]) == 0
+        results = json.load(open(saved))
+        assert results["market"]["requests"] == 4
+        assert results["contracts"]["failed_cycles"] == 0
+        # requests go through the shared pool and reuse its connections
+        assert 0 < results["market"]["connections"] < results["market"]["requests"]
+        assert "contracts" in capsys.readouterr().out
+
+    def test_regression(self):
+        result = run.Result("market", [2.0], 10, 0, 0, 0, 1.0)
+        assert run.compare([result], {"market": {"mean_cycle": 1.0}}, 0.2)
+        assert not run.compare([result], {"market": {"mean_cycle": 1.9}}, 0.2)
+
+
+def test_bench_logging(capsys):
+    assert bench_logging.main(["--contracts", "20"]) == 0
+    out = capsys.readouterr().out
+    assert "before" in out and "after" in out
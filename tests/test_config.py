@@ -0,0 +1,105 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+
+from eve_monitor.config import APP, DEFAULT_APP_SETTINGS, REGIONS, TARGETS, Settings
+
+
+# generous for slow CI machines, importing is expected to take a few tens of ms
+IMPORT_TIME_BUDGET = 0.5
+ENTRY_MODULES = [
+    "eve_monitor.core",
+    "eve_monitor.market_monitor",
+    "eve_monitor.contract_sniper",
+    "tasks",
+]
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestSettings:
+    @pytest.fixture
+    def settings_dir(self, tmp_path):
+        json.dump({"DEBUG": True}, open(tmp_path / "appsettings.json", "w"))
+        json.dump({"market_monitor": []}, open(tmp_path / "targets.json", "w"))
+        json.dump([{"region_id": 1}], open(tmp_path / "regions.json", "w"))
+        return tmp_path
+
+    @pytest.fixture
+    def settings(self, settings_dir):
+        return Settings(
+            str(settings_dir / "appsettings.json"),
+            str(settings_dir / "targets.json"),
+            str(settings_dir / "regions.json"),
+        )
+
+    def test_init_reads_nothing(self, tmp_path):
+        settings = Settings(*(str(tmp_path / f) for f in ("a", "b", "c")))
+        assert settings._sections == {}
+
+    def test_lazy_load_on_access(self, settings):
+        assert settings.debug is True
+        assert list(settings._sections) == [APP]
+        assert settings.regions == [{"region_id": 1}]
+        assert TARGETS not in settings._sections
+
+    def test_missing_keys_use_defaults(self, settings):
+        assert settings.user_agent == DEFAULT_APP_SETTINGS["USER_AGENT"]
+        assert settings.decoupled_ui is False
+
+    def test_missing_file_uses_defaults(self, tmp_path):
+        settings = Settings(*(str(tmp_path / f) for f in ("a", "b", "c")))
+        assert settings.app == DEFAULT_APP_SETTINGS
+        assert settings.app is not DEFAULT_APP_SETTINGS
+        assert settings.targets == {}
+        assert settings.regions == []
+
+    def test_strict_load_missing_file(self, settings, settings_dir):
+        os.remove(settings_dir / "targets.json")
+        with pytest.raises(FileNotFoundError):
+            settings.load(strict=True)
+
+    def test_load_skips_loaded_sections(self, settings, settings_dir):
+        settings.load()
+        json.dump([], open(settings_dir / "regions.json", "w"))
+        settings.load()
+        assert settings.regions == [{"region_id": 1}]
+
+    def test_reload(self, settings, settings_dir):
+        settings.load()
+        json.dump([], open(settings_dir / "regions.json", "w"))
+        json.dump({"DEBUG": False}, open(settings_dir / "appsettings.json", "w"))
+        settings.reload(REGIONS)
+        assert settings.regions == []
+        assert settings.debug is True
+        settings.reload()
+        assert settings.debug is False
+
+    def test_save(self, settings, settings_dir):
+        regions = [{"region_id": 2}]
+        settings.save(REGIONS, regions)
+        assert settings.regions == regions
+        assert json.load(open(settings_dir / "regions.json")) == regions
+        assert not os.path.exists(settings_dir / "regions.json.tmp")
+
+
+class TestImportTime:
+    def test_import_without_settings_within_budget(self, tmp_path):
+        """importing entry points performs no file io and stays within budget"""
+        code = (
+            "import time\n"
+            "start = time.perf_counter()\n"
+            f"import {', '.join(ENTRY_MODULES)}\n"
+            "print(time.perf_counter() - start)\n"
+        )
+        res = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=tmp_path,
+            env={**os.environ, "PYTHONPATH": ROOT},
+            capture_output=True,
+            text=True,
+        )
+        assert res.returncode == 0, res.stderr
+        assert os.listdir(tmp_path) == []
+        assert float(res.stdout) < IMPORT_TIME_BUDGET
@@ -1,3 +1,6 @@
+import json
+import threading
+
 from eve_monitor.contract_sniper import (
     LAST_CONTRACTS_TO_CACHE,
     CONTRACT_SNIPER,
@@ -79,3 +82,99 @@ class TestContractHistory:
         assert history.is_contract_seen(123, 456) is True
         assert history.is_contract_seen(123, 789) is False
         assert history.is_contract_seen(234, 456) is False
+
+    def test_snapshot_is_independent_copy(self):
+        """Test snapshot is not affected by later writes"""
+        history = ContractHistory()
+        history.add_contract_seen(123, 456)
+        snapshot = history.snapshot()
+        history.add_contract_seen(123, 789)
+        history.add_contract_seen(234, 111)
+        assert list(snapshot) == [123]
+        assert list(snapshot[123]) == [456]
+
+    def test_trim_keeps_contracts_seen_after_snapshot(self, monkeypatch):
+        """Test trim does not evict a contract re-seen while it was picking evictions"""
+        history = ContractHistory()
+        history.contracts = {123: {i: i for i in range(LAST_CONTRACTS_TO_CACHE + 1)}}
+        snapshot = history.snapshot
+
+        def _snapshot():
+            result = snapshot()
+            history.add_contract_seen(123, 0)
+            return result
+
+        monkeypatch.setattr(history, "snapshot", _snapshot)
+        history.trim()
+        assert 0 in history.contracts[123]
+        assert len(history.contracts[123]) == LAST_CONTRACTS_TO_CACHE + 1
+
+    def test_concurrent_writers_while_dumping(self):
+        """Stress test trimming and serializing while feature threads keep writing"""
+        history = ContractHistory()
+        n_writers, n_contracts = 4, 5000
+        errors = []
+
+        def writer(region_id):
+            try:
+                for cid in range(n_contracts):
+                    history.add_contract_seen(region_id, cid)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=writer, args=(r,)) for r in range(n_writers)]
+        for t in threads:
+            t.start()
+        while any(t.is_alive() for t in threads):
+            try:
+                history.trim()
+                json.dumps(history.to_json_serializable())
+            except Exception as e:
+                errors.append(e)
+        for t in threads:
+            t.join()
+
+        assert errors == []
+        history.trim()
+        for region_id in range(n_writers):
+            assert len(history.contracts[region_id]) == LAST_CONTRACTS_TO_CACHE
+            assert history.is_contract_seen(region_id, n_contracts - 1)
+
+    def test_snapshot_is_not_copied(self):
+        """Test snapshot hands out the live maps and a write copies only the map it touches, once"""
+        history = ContractHistory()
+        history.contracts = {r: {i: i for i in range(1000)} for r in range(100)}
+        snapshot = history.snapshot()
+        assert snapshot is history.contracts
+        history.add_contract_seen(0, 1000)
+        first = history.contracts[0]
+        history.add_contract_seen(0, 1001)
+        assert history.contracts[0] is first
+        assert all(history.contracts[r] is snapshot[r] for r in range(1, 100))
+        assert 1000 not in snapshot[0]
+        assert len(history.snapshot()[0]) == 1002
+
+    def test_writers_not_blocked_while_dumping(self):
+        """Test a writer arriving while the history is snapshot, trimmed and serialized does not wait"""
+        history = ContractHistory()
+        blocked = []
+
+        def write():
+            thread = threading.Thread(target=history.add_contract_seen, args=(0, -1))
+            thread.start()
+            thread.join(timeout=0.5)
+            blocked.append(thread.is_alive())
+
+        class Contracts(dict):
+            def copy(self):
+                # a copy made by the dumping thread would be made while writers wait
+                if threading.current_thread() is threading.main_thread():
+                    write()
+                return Contracts(self)
+
+        history.contracts = {r: Contracts.fromkeys(range(5000), 0) for r in range(4)}
+        history.trim()
+        for _ in history.to_json_serializable().items():
+            write()
+        assert blocked == [False] * 4
+        assert len(history.contracts[0]) == LAST_CONTRACTS_TO_CACHE + 1
@@ -1,4 +1,5 @@
 import pytest
+from unittest.mock import Mock
 
 from eve_monitor.contract_sniper import ContractSniper, InventoryType
 
@@ -34,3 +35,62 @@ class TestContractSniper:
     # def test_(self, contract_sniper):
     #     assert True == contract_sniper.should_ignore_unseen_contract(contract_sniper.get_contract_items(226413101)[0])
     #     assert False == contract_sniper.should_ignore_unseen_contract(contract_sniper.get_contract_items(226414056)[0])
+
+
+class TestTargets:
+    @pytest.fixture
+    def contract_sniper(self, monkeypatch):
+        contract_sniper = ContractSniper()
+        contract_sniper.cur.executescript(
+            """
+            create table invTypes (typeID integer, typeName text, groupID integer);
+            create table invGroups (groupID integer, groupName text, categoryID integer);
+            create table invMetaTypes (typeID integer, parentTypeID integer, metaGroupID integer);
+            insert into invGroups values (27, 'Battleship', 6), (25, 'Frigate', 6), (18, 'Mineral', 4);
+            insert into invTypes values
+                (17738, 'Machariel', 27), (17636, 'Raven Navy Issue', 27),
+                (17843, 'Vengeance', 25), (34, 'Tritanium', 18);
+            insert into invMetaTypes values (17738, 0, 4), (17636, 638, 4);
+            """
+        )
+        return contract_sniper
+
+    def test_expand_targets(self, contract_sniper):
+        assert contract_sniper.expand_targets([34]) == {34}
+        assert contract_sniper.expand_targets([{"group_id": 27}, 1]) == {
+            17738,
+            17636,
+            1,
+        }
+        assert contract_sniper.expand_targets([{"category_id": 6}]) == {
+            17738,
+            17636,
+            17843,
+        }
+        assert contract_sniper.expand_targets([{"meta_group_id": 4}]) == {
+            17738,
+            17636,
+        }
+
+    def test_expand_targets_ignores_malformed(self, contract_sniper):
+        assert contract_sniper.expand_targets([{"name": "x"}]) == set()
+        assert contract_sniper.expand_targets([{"group_id": 1}]) == set()
+        assert (
+            contract_sniper.expand_targets([{"group_id": 27, "category_id": 6}])
+            == set()
+        )
+
+    def test_update_targets_only_on_change(self, contract_sniper, monkeypatch):
+        targets = [{"group_id": 27}]
+        monkeypatch.setattr(
+            "eve_monitor.contract_sniper.load_targets", lambda: list(targets)
+        )
+        contract_sniper.expand_targets = Mock(wraps=contract_sniper.expand_targets)
+        contract_sniper.update_targets()
+        contract_sniper.update_targets()
+        assert contract_sniper.expand_targets.call_count == 1
+        assert contract_sniper.targets == {17738, 17636}
+        targets.append(34)
+        contract_sniper.update_targets()
+        assert contract_sniper.expand_targets.call_count == 2
+        assert 34 in contract_sniper.targets
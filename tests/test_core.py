@@ -1,7 +1,9 @@
 import json
+import threading
 import pytest
 from unittest.mock import Mock
 
+from eve_monitor import metrics
 from eve_monitor.core import ESI_PAGE_KEY, Core
 
 
@@ -65,6 +67,30 @@ class TestCore:
         session.get.assert_called_with(URL, headers={"If-None-Match": "etag123"})
         return
 
+    def test_etag_per_query_and_page(self, core, session):
+        """Test each query and page sends back its own ETag"""
+
+        def side_effect(url, params={}, headers={}, **_):
+            res = self.basic_response(2, 200, [params])
+            res.headers["ETag"] = f'"{params.get("type_id")}-{params.get("page", 1)}"'
+            return res
+
+        session.get.side_effect = side_effect
+        for _ in range(2):
+            for type_id in (34, 35):
+                core.page_aware_get(URL, params={"type_id": type_id})
+        sent = [
+            (call.kwargs["params"], call.kwargs.get("headers", {}).get("If-None-Match"))
+            for call in session.get.call_args_list[4:]
+        ]
+        assert sent == [
+            ({"type_id": 34}, '"34-1"'),
+            ({"type_id": 34, "page": 2}, '"34-2"'),
+            ({"type_id": 35}, '"35-1"'),
+            ({"type_id": 35, "page": 2}, '"35-2"'),
+        ]
+        return
+
     def test_page_aware_get_single_page(self, core, session):
         """Test when response has no pagination"""
         session.get.return_value = self.basic_response(1, 200, [{"id": 1}, {"id": 2}])
@@ -130,6 +156,15 @@ class TestCore:
         session.get.assert_any_call(URL, headers={"Authorization": "Bearer token"})
         return
 
+    def test_page_aware_get_with_params(self, core, session):
+        """Test query params are kept when requesting later pages"""
+        self.setup_multiple_pages(session, 2)
+
+        result = core.page_aware_get(URL, params={"order_type": "all"})
+        assert result == [{"id": 1}, {"id": 2}]
+        session.get.assert_called_with(URL, params={"order_type": "all", "page": 2})
+        return
+
     def test_page_aware_get_update_next_poll(self, core, session):
         """Test updating next_poll based on Expires header"""
         mock_resp1 = self.basic_response(2, 200, [{"id": 1}])
@@ -145,3 +180,65 @@ class TestCore:
         expected_expiry = 1761031680  # Epoch time for "Tue, 21 Oct 2025 07:28:00 GMT"
         assert core.next_poll == expected_expiry
         return
+
+    def test_page_aware_stream_prefetch(self, core, session):
+        """Test the next page is requested while the current one is processed"""
+        self.setup_multiple_pages(session, 3)
+        second_requested = threading.Event()
+        side_effect = session.get.side_effect
+
+        def record(url, params={}, **kwargs):
+            if params.get("page") == 2:
+                second_requested.set()
+            return side_effect(url, params=params, **kwargs)
+
+        session.get.side_effect = record
+        stream = core.page_aware_stream(URL)
+        assert next(stream) == [{"id": 1}]
+        assert second_requested.wait(1)
+        assert next(stream) == [{"id": 2}]
+        stream.close()
+        assert session.get.call_count == 3
+        assert list(stream) == []
+        return
+
+    def test_page_aware_stream_not_modified(self, core, session):
+        """Test nothing is yielded when not modified"""
+        session.get.return_value = self.basic_response(3, 304)
+        assert list(core.page_aware_stream(URL)) == []
+        assert core.not_modified
+        return
+
+    def test_get_records_metrics(self, core, session):
+        """Test get reports latency, status, bytes and ETag outcome"""
+        path = metrics.endpoint(URL)
+        labels = ("test_core", "GET", path)
+        count = metrics.request_duration.count(*labels)
+        received = metrics.response_bytes.get("test_core", path)
+        hits = metrics.etag_requests.get("test_core", path, "hit")
+
+        mock_resp1 = self.basic_response(1, 200, [{"id": 1}])
+        mock_resp1.headers["ETag"] = "etag123"
+        session.get.return_value = mock_resp1
+        core.get(URL)
+        session.get.return_value = self.basic_response(1, 304)
+        core.get(URL)
+
+        assert metrics.request_duration.count(*labels) == count + 2
+        assert metrics.response_bytes.get("test_core", path) == received + len(
+            mock_resp1.content
+        )
+        assert metrics.etag_requests.get("test_core", path, "hit") == hits + 1
+        assert metrics.responses.get("test_core", path, 304) >= 1
+        return
+
+    def test_page_aware_get_records_pages(self, core, session):
+        """Test pages per call is reported"""
+        labels = ("test_core", metrics.endpoint(URL))
+        count = metrics.pages_per_call.count(*labels)
+        total = metrics.pages_per_call.total(*labels)
+        self.setup_multiple_pages(session, 3)
+        core.page_aware_get(URL)
+        assert metrics.pages_per_call.count(*labels) == count + 1
+        assert metrics.pages_per_call.total(*labels) == total + 3
+        return
@@ -0,0 +1,99 @@
+import gzip
+import http.server
+import threading
+
+import pytest
+
+from eve_monitor import http_pool, metrics
+
+BODY = b'{"orders": []}' * 1000
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # status codes to answer with before 200, shared by the server's threads
+    failures: list[int] = []
+
+    def do_GET(self):
+        if self.failures:
+            self.send_response(self.failures.pop(0))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        gzipped = "gzip" in self.headers.get("Accept-Encoding", "")
+        body = gzip.compress(BODY) if gzipped else BODY
+        self.send_response(200)
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return
+
+    def log_message(self, *args):
+        return
+
+
+@pytest.fixture
+def server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+    Handler.failures.clear()
+
+
+@pytest.fixture(autouse=True)
+def pool(monkeypatch):
+    http_pool.close()
+    monkeypatch.setattr(http_pool, "RETRY_BACKOFF", 0)
+    yield
+    http_pool.close()
+
+
+class TestHttpPool:
+    def test_sessions_share_adapter(self):
+        a, b = http_pool.session(), http_pool.session()
+        assert a.get_adapter("https://esi.evetech.net") is http_pool.get_adapter()
+        assert b.get_adapter("http://localhost") is http_pool.get_adapter()
+        # headers are per session
+        a.headers["X-Test"] = "1"
+        assert "X-Test" not in b.headers
+
+    def test_closing_a_session_keeps_the_pool(self, server):
+        a, b = http_pool.session(), http_pool.session()
+        a.get(server)
+        a.close()
+        b.get(server)
+        assert http_pool.get_adapter().stats()["127.0.0.1"] == (2, 1)
+
+    def test_connections_reused_across_sessions(self, server):
+        for _ in range(3):
+            for s in (http_pool.session(), http_pool.session()):
+                assert s.get(server).content == BODY
+        assert http_pool.get_adapter().stats()["127.0.0.1"] == (6, 1)
+        assert metrics.pool_requests.get("127.0.0.1") == 6
+        assert metrics.pool_connections.get("127.0.0.1") == 1
+        assert "reused 83%" in metrics.summary()
+
+    def test_gzip_counted_on_the_wire(self, server):
+        before = metrics.wire_bytes.get("127.0.0.1")
+        res = http_pool.session().get(server)
+        assert res.headers["Content-Encoding"] == "gzip"
+        assert metrics.wire_bytes.get("127.0.0.1") - before == len(gzip.compress(BODY))
+
+    def test_get_retried_on_gateway_error(self, server):
+        Handler.failures[:] = [503, 502]
+        assert http_pool.session().get(server).status_code == 200
+
+    def test_last_response_returned_once_out_of_retries(self, server):
+        Handler.failures[:] = [504] * 5
+        assert http_pool.session().get(server).status_code == 504
+        assert len(Handler.failures) == 2
+
+    def test_post_not_retried(self):
+        policy = http_pool.retry_policy(2)
+        assert not policy.is_retry("POST", 503)
+        assert policy.is_retry("GET", 503)
+        assert not policy.is_retry("GET", 420)
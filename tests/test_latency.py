@@ -0,0 +1,96 @@
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from eve_monitor import latency, metrics
+from eve_monitor.core import Core
+from eve_monitor.latency import Detection, LatencyTracker
+
+
+class ConcreteCore(Core):
+    def main(self):
+        pass
+
+
+def detection(total: float, now: float | None = None) -> Detection:
+    """detection delivered now, spread evenly over the stages"""
+    now = time.time() if now is None else now
+    step = total / 4
+    return Detection(now - 4 * step, now - 3 * step, now - 2 * step, now - step, now)
+
+
+class TestDetection:
+    def test_stages(self):
+        d = Detection(100, 160, 165, 170, 171)
+        assert d.stages() == {
+            "cache": 60,
+            "fetch": 5,
+            "appraisal": 5,
+            "dispatch": 1,
+            "total": 71,
+        }
+
+    def test_clock_skew_clamped(self):
+        # issued after we polled, ESI timestamps are only precise to the second
+        assert Detection(101, 100, 102, 103, 104).stages()["cache"] == 0
+
+    def test_parse_esi_time(self):
+        assert latency.parse_esi_time("1970-01-02T00:00:00Z") == 86400
+
+
+class TestLatencyTracker:
+    @pytest.fixture
+    def tracker(self):
+        tracker = LatencyTracker(slo=60, window=100)
+        tracker.started = 0
+        return tracker
+
+    def test_percentiles(self, tracker):
+        for total in range(1, 101):
+            tracker.record("test_latency", detection(total))
+        assert tracker.percentile("test_latency", 0.5) == pytest.approx(50)
+        assert tracker.percentile("test_latency", 0.95) == pytest.approx(95)
+        assert tracker.percentile("test_latency", 0.95, "cache") == pytest.approx(23.75)
+        assert metrics.detection_latency.count("test_latency", "total") >= 100
+
+    def test_rolling_window(self, tracker):
+        for total in [1000] * 100 + [1] * 100:
+            tracker.record("test_latency", detection(total))
+        assert tracker.percentile("test_latency", 0.95) == pytest.approx(1)
+
+    def test_ignores_issued_before_start(self, tracker):
+        tracker.started = time.time()
+        assert tracker.record("test_latency", detection(10)) is None
+        assert tracker.count("test_latency") == 0
+
+    def test_slo_alert_with_cooldown(self, tracker):
+        alerts = [
+            tracker.record("test_latency", detection(120))
+            for _ in range(latency.MIN_SAMPLES + 5)
+        ]
+        fired = [a for a in alerts if a]
+        assert len(fired) == 1
+        assert alerts.index(fired[0]) == latency.MIN_SAMPLES - 1
+        assert "p95 120s over the 60s objective" in fired[0]
+
+    def test_no_alert_within_slo(self, tracker):
+        for _ in range(latency.MIN_SAMPLES * 2):
+            assert tracker.record("test_latency", detection(30)) is None
+
+
+class TestCoreDetection:
+    def test_recorded_on_delivery(self, monkeypatch):
+        tracker = LatencyTracker(slo=60)
+        tracker.started = 0
+        monkeypatch.setattr("eve_monitor.core.tracker", tracker)
+        notifier = Mock()
+        core = ConcreteCore("test_latency_core", Mock(), notifier=notifier)
+        d = Detection(time.time() - 10, time.time() - 5, time.time())
+        core.send_notification("found", detection=d)
+        assert d.submitted
+        assert tracker.count("test_latency_core") == 0
+        # the notifier calls back once delivered
+        notifier.submit.call_args.args[2]()
+        assert tracker.count("test_latency_core") == 1
+        assert d.delivered >= d.submitted
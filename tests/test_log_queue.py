@@ -0,0 +1,62 @@
+import logging
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+from eve_monitor import log_queue
+from eve_monitor.log_queue import LazyMessage
+
+
+class Recorder(logging.Handler):
+    def __init__(self, level=logging.NOTSET):
+        super().__init__(level)
+        self.records = []
+        self.threads = set()
+        return
+
+    def emit(self, record):
+        self.records.append(self.format(record))
+        self.threads.add(threading.current_thread().name)
+        return
+
+
+class TestLogQueue:
+    @pytest.fixture
+    def log(self):
+        log = logging.getLogger("test_log_queue")
+        log.propagate = False
+        log.setLevel(logging.INFO)
+        yield log
+        log_queue.stop()
+        log.handlers.clear()
+
+    def test_lazy_message_not_built_when_filtered(self, log):
+        build = Mock(return_value="details")
+        log_queue.attach(log, [Recorder()])
+        log.debug(LazyMessage(build, 1, 2))
+        log_queue.stop()
+        build.assert_not_called()
+
+    def test_records_written_on_listener_thread(self, log):
+        build = Mock(return_value="details")
+        handler = Recorder()
+        errors = Recorder(logging.WARNING)
+        log_queue.attach(log, [handler, errors])
+        log.info(LazyMessage(build, 1, 2))
+        log.warning("found %d", 3)
+        log_queue.stop()
+        build.assert_called_once_with(1, 2)
+        assert handler.records == ["details", "found 3"]
+        assert errors.records == ["found 3"]
+        assert threading.current_thread().name not in handler.threads
+
+    def test_attach_replaces_handlers(self, log):
+        old = Recorder()
+        log.addHandler(old)
+        log_queue.attach(log, [Recorder()])
+        assert len(log.handlers) == 1
+        assert isinstance(log.handlers[0], log_queue.LocalQueueHandler)
+        log.info("x")
+        log_queue.stop()
+        assert old.records == []
@@ -0,0 +1,92 @@
+import os
+import pytest
+
+from eve_monitor import log_reader
+from eve_monitor.log_reader import LogIndex
+
+
+class TestLogIndex:
+    @pytest.fixture
+    def path(self, tmp_path):
+        path = tmp_path / "notification.log"
+        path.write_text("".join(f"line {i}\n" for i in range(100)))
+        return str(path)
+
+    @pytest.fixture
+    def index(self, path):
+        index = LogIndex(path)
+        index.refresh()
+        return index
+
+    def test_missing_file(self, tmp_path):
+        index = LogIndex(str(tmp_path / "missing.log"))
+        assert index.page() == ([], None)
+
+    def test_refresh_indexes_complete_lines(self, index):
+        assert len(index) == 100
+        assert index.read(0, 2) == ["line 0", "line 1"]
+        assert index.read(98, 200) == ["line 98", "line 99"]
+        assert index.read(5, 5) == []
+
+    def test_refresh_incrementally(self, index, path, monkeypatch):
+        with open(path, "a") as f:
+            f.write("line 100\npartial")
+        index.refresh()
+        assert len(index) == 101
+        assert index.read(100, 101) == ["line 100"]
+
+        # only the appended part is read
+        read_from = []
+        open_ = open
+
+        def _open(*args, **kwargs):
+            f = open_(*args, **kwargs)
+            seek = f.seek
+            f.seek = lambda pos, *a: read_from.append(pos) or seek(pos, *a)
+            return f
+
+        monkeypatch.setattr(log_reader, "open", _open, raising=False)
+        with open_(path, "a") as f:
+            f.write(" line\n")
+        index.refresh()
+        assert read_from == [index.offsets[-2]]
+        assert index.read(101, 102) == ["partial line"]
+
+    def test_refresh_after_rotation(self, index, path):
+        os.replace(path, path + ".1")
+        with open(path, "w") as f:
+            f.write("new\n")
+        index.refresh()
+        assert len(index) == 1
+        assert index.read(0, 1) == ["new"]
+
+    def test_refresh_after_truncation(self, index, path):
+        with open(path, "w") as f:
+            f.write("new\n")
+        index.refresh()
+        assert index.read(0, 1) == ["new"]
+
+    def test_page_latest(self, index):
+        lines, older = index.page(limit=10)
+        assert lines == [(i, f"line {i}") for i in range(90, 100)]
+        assert older == 90
+
+    def test_page_cursor(self, index):
+        lines, older = index.page(90, 10)
+        assert lines[0] == (80, "line 80")
+        assert older == 80
+        lines, older = index.page(5, 10)
+        assert [i for i, _ in lines] == [0, 1, 2, 3, 4]
+        assert older is None
+
+    def test_page_filter(self, index, monkeypatch):
+        monkeypatch.setattr(log_reader, "SCAN_LINES", 7)
+        lines, older = index.page(query="5", limit=3)
+        assert lines == [(75, "line 75"), (85, "line 85"), (95, "line 95")]
+        assert older == 75
+        lines, older = index.page(older, query="5", limit=100)
+        assert [i for i, _ in lines] == [5, 15, 25, 35, 45, *range(50, 60), 65]
+        assert older is None
+
+    def test_page_filter_no_match(self, index):
+        assert index.page(query="missing") == ([], None)
@@ -0,0 +1,125 @@
+import logging
+import os
+import threading
+import time
+import pytest
+
+from eve_monitor.log_stream import LogStream, follow, read_last_lines
+
+
+def text(lines: list[tuple[int, str]]) -> list[str]:
+    return [line for _, line in lines]
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+class TestLogStream:
+    @pytest.fixture
+    def stream(self):
+        return LogStream(5)
+
+    @pytest.fixture
+    def logger(self, stream):
+        logger = logging.getLogger("test_log_stream")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        stream.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+        logger.addHandler(stream)
+        yield logger
+        logger.removeHandler(stream)
+
+    def test_emit_formats_record(self, stream, logger):
+        logger.info("hello")
+        logger.debug("filtered")
+        assert text(stream.backlog(10)) == ["INFO hello"]
+
+    def test_multi_line_message(self, stream):
+        stream.append("a\nb")
+        assert text(stream.backlog(10)) == ["a", "b"]
+
+    def test_ring_buffer_keeps_last_lines(self, stream):
+        for i in range(10):
+            stream.append(str(i))
+        assert text(stream.backlog(10)) == ["5", "6", "7", "8", "9"]
+        assert text(stream.backlog(2)) == ["8", "9"]
+
+    def test_drain_batches_pending(self, stream):
+        assert stream.wait(0) is False
+        stream.append("a")
+        stream.append("b")
+        assert stream.wait(0) is True
+        assert stream.drain() == [(1, "a"), (2, "b")]
+        assert stream.drain() == []
+        assert stream.wait(0) is False
+
+    def test_since(self, stream):
+        assert stream.since(0) == []
+        for i in range(1, 8):
+            stream.append(str(i))
+        assert stream.since(7) == []
+        assert stream.since(5) == [(6, "6"), (7, "7")]
+        assert stream.since(2) == [(3, "3"), (4, "4"), (5, "5"), (6, "6"), (7, "7")]
+        # no longer buffered
+        assert stream.since(1) is None
+        # from before a restart
+        assert stream.since(8) is None
+
+    def test_upto(self, stream):
+        for i in range(1, 8):
+            stream.append(str(i))
+        assert stream.since(4, upto=6) == [(5, "5"), (6, "6")]
+        assert stream.since(6, upto=6) == []
+        assert stream.backlog(2, upto=6) == [(5, "5"), (6, "6")]
+        assert stream.backlog(2, upto=0) == []
+
+    def test_wait_wakes_on_append(self, stream):
+        threading.Timer(0.05, stream.append, args=("a",)).start()
+        assert stream.wait(5) is True
+
+
+class TestFollow:
+    @pytest.fixture
+    def path(self, tmp_path):
+        path = tmp_path / "main.log"
+        path.write_text("".join(f"{i}\n" for i in range(10)))
+        return str(path)
+
+    @pytest.fixture
+    def stream(self):
+        return LogStream(3)
+
+    @pytest.fixture
+    def follower(self, path, stream):
+        stop = threading.Event()
+        t = threading.Thread(target=follow, args=(path, stream, stop, 0.01))
+        t.start()
+        yield
+        stop.set()
+        t.join()
+
+    def test_read_last_lines(self, path):
+        assert read_last_lines(path, 3) == ["7", "8", "9"]
+        assert read_last_lines(path, 100) == [str(i) for i in range(10)]
+        assert read_last_lines(path + ".missing", 3) == []
+
+    def test_follow_appended_lines(self, path, stream, follower):
+        assert wait_for(lambda: text(stream.backlog(3)) == ["7", "8", "9"])
+        stream.drain()
+        with open(path, "a") as f:
+            f.write("10\n11")
+            f.flush()
+            assert wait_for(lambda: text(stream.backlog(1)) == ["10"])
+            f.write("\n")
+        assert wait_for(lambda: text(stream.backlog(1)) == ["11"])
+        assert text(stream.drain()) == ["10", "11"]
+
+    def test_follow_rotated_file(self, path, stream, follower):
+        os.replace(path, path + ".1")
+        with open(path, "w") as f:
+            f.write("new\n")
+        assert wait_for(lambda: text(stream.backlog(1)) == ["new"])
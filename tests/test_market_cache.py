@@ -1,4 +1,6 @@
+import json
 import pytest
+import threading
 import time
 
 from eve_monitor.market_monitor import (
@@ -133,3 +135,58 @@ class TestMarketHistory:
         assert type_ids == {34, 36}
         order_ids = {list(item["orders_seen"])[0] for item in data}
         assert order_ids == {1001, 2001}
+
+    def test_snapshot_is_independent_copy(self, history):
+        history.add_order_seen(34, "Tritanium", 1001)
+        snapshot = history.snapshot()
+        history.add_order_seen(34, "Tritanium", 1002)
+        history.add_order_seen(35, "Pyerite", 2001)
+        assert list(snapshot) == [34]
+        assert list(snapshot[34].orders_seen) == [1001]
+        assert snapshot[34] is not history.items[34]
+
+    def test_snapshot_is_not_copied(self, history):
+        history.add_order_seen(34, "Tritanium", 1001)
+        history.add_order_seen(35, "Pyerite", 2001)
+        snapshot = history.snapshot()
+        assert snapshot is history.items
+        history.add_order_seen(34, "Tritanium", 1002)
+        history.add_order_seen(34, "Tritanium", 1003)
+        assert history.items[35] is snapshot[35]
+        assert list(snapshot[34].orders_seen) == [1001]
+        assert list(history.items[34].orders_seen) == [1001, 1002, 1003]
+
+    def test_concurrent_writers_while_dumping(self, history, monkeypatch):
+        """Stress test trimming and serializing while feature threads keep writing"""
+        n_writers, n_orders = 4, 5000
+
+        def _load_targets():
+            return [{"type_id": type_id} for type_id in range(n_writers)]
+
+        monkeypatch.setattr("eve_monitor.market_monitor.load_targets", _load_targets)
+        errors = []
+
+        def writer(type_id):
+            try:
+                for oid in range(n_orders):
+                    history.add_order_seen(type_id, str(type_id), oid)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=writer, args=(t,)) for t in range(n_writers)]
+        for t in threads:
+            t.start()
+        while any(t.is_alive() for t in threads):
+            try:
+                history.trim()
+                json.dumps(history.to_json_serializable())
+            except Exception as e:
+                errors.append(e)
+        for t in threads:
+            t.join()
+
+        assert errors == []
+        history.trim()
+        for type_id in range(n_writers):
+            assert len(history.items[type_id].orders_seen) == LAST_ORDER_TO_CACHE
+            assert history.is_order_seen(type_id, n_orders - 1)
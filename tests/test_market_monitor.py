@@ -0,0 +1,159 @@
+from unittest.mock import Mock
+
+import pytest
+
+from eve_monitor.market_monitor import MarketMonitor
+from eve_monitor.order_book import PriceWindow
+
+THE_FORGE = {"name": "The Forge", "region_id": 10000002, "known_space": True}
+
+
+def order(order_id, price, is_buy_order=False):
+    return {
+        "order_id": order_id,
+        "type_id": 34,
+        "is_buy_order": is_buy_order,
+        "price": price,
+        "system_id": 30000142,
+        "volume_remain": 1,
+        "volume_total": 1,
+        "issued": "2024-01-01T00:00:00Z",
+    }
+
+
+class TestAlerts:
+    @pytest.fixture
+    def target(self, monkeypatch):
+        target = {"type_id": 34, "name": "Tritanium", "threshold": 0}
+        monkeypatch.setattr("eve_monitor.market_monitor.load_targets", lambda: [target])
+        monkeypatch.setattr(
+            "eve_monitor.market_monitor.settings", Mock(regions=[THE_FORGE])
+        )
+        monkeypatch.setattr("eve_monitor.market_monitor.state", Mock())
+        return target
+
+    @pytest.fixture
+    def monitor(self, target):
+        monitor = MarketMonitor()
+        monitor.get_item_orders_in_region = Mock(return_value=[])
+        monitor.get_system_info = Mock(return_value=("Jita", 0.9))
+        monitor.send_notification = Mock()
+        return monitor
+
+    def notified(self, monitor) -> list[str]:
+        return [call.args[0] for call in monitor.send_notification.call_args_list]
+
+    def test_buy_orders_above_sell_to(self, monitor, target):
+        target["sell_to"] = 10
+        # the best bid arrives on the second page
+        monitor.get_item_orders_in_region.return_value = [
+            [order(1, 5.0), order(3, 11.0, is_buy_order=True)],
+            [order(2, 12.0, is_buy_order=True), order(4, 9.0, is_buy_order=True)],
+        ]
+        monitor.watch_market()
+        monitor.get_item_orders_in_region.assert_called_once_with(34, 10000002, "all")
+        assert [msg.split(" in ")[0] for msg in self.notified(monitor)] == [
+            "Tritanium buy order at 12 isk",
+            "Tritanium buy order at 11 isk",
+        ]
+
+        # best bid left the book, the next one is under sell_to
+        monitor.get_item_orders_in_region.return_value = [
+            [order(3, 11.0, is_buy_order=True), order(4, 9.0, is_buy_order=True)]
+        ]
+        monitor.watch_market()
+        assert monitor.send_notification.call_count == 2
+        assert monitor.book.best_bid(34, 10000002) == 11.0
+
+    def test_price_drop_within_window(self, monitor, target, monkeypatch):
+        target.update({"drop": 0.2, "window": 900})
+        clock = Mock(return_value=1000.0)
+        monkeypatch.setattr("eve_monitor.market_monitor.time.time", clock)
+        for at, orders in [
+            (1000.0, [order(1, 100.0), order(2, 110.0)]),
+            (1300.0, [order(2, 110.0), order(3, 90.0)]),
+            # 75 is 25% under 100, listed 700s ago
+            (1700.0, [order(2, 110.0), order(3, 90.0), order(4, 75.0)]),
+        ]:
+            clock.return_value = at
+            monitor.get_item_orders_in_region.return_value = [orders]
+            monitor.watch_market()
+        monitor.get_item_orders_in_region.assert_called_with(34, 10000002, "sell")
+        assert self.notified(monitor) == [
+            "Tritanium dropped 25% to 75 isk within 15 minutes in Jita, The Forge, 1/1"
+        ]
+
+        # a drop measured against a high older than the window is not notified
+        clock.return_value = 2700.0
+        monitor.get_item_orders_in_region.return_value = [[order(5, 60.0)]]
+        monitor.watch_market()
+        assert monitor.send_notification.call_count == 1
+
+    def poll(self, monitor, clock, polls):
+        for at, orders in polls:
+            clock.return_value = at
+            monitor.get_item_orders_in_region.return_value = [orders]
+            monitor.watch_market()
+        return
+
+    def test_repriced_order_drops_again(self, monitor, target, monkeypatch):
+        target.update({"drop": 0.2, "window": 900})
+        clock = Mock()
+        monkeypatch.setattr("eve_monitor.market_monitor.time.time", clock)
+        self.poll(
+            monitor,
+            clock,
+            [
+                (1000.0, [order(1, 100.0)]),
+                (1300.0, [order(1, 100.0), order(2, 75.0)]),
+                # unchanged, already notified
+                (1400.0, [order(1, 100.0), order(2, 75.0)]),
+                # order 2 repriced, it keeps its id
+                (1500.0, [order(1, 100.0), order(2, 60.0)]),
+            ],
+        )
+        assert [msg.split(" within ")[0] for msg in self.notified(monitor)] == [
+            "Tritanium dropped 25% to 75 isk",
+            "Tritanium dropped 40% to 60 isk",
+        ]
+
+    def test_drop_of_order_notified_under_threshold(self, monitor, target, monkeypatch):
+        target.update({"threshold": 80, "drop": 0.2, "window": 900})
+        clock = Mock()
+        monkeypatch.setattr("eve_monitor.market_monitor.time.time", clock)
+        self.poll(
+            monitor,
+            clock,
+            [
+                (1000.0, [order(1, 100.0)]),
+                (1300.0, [order(1, 100.0), order(2, 75.0)]),
+            ],
+        )
+        assert [msg.split(" in ")[0] for msg in self.notified(monitor)] == [
+            "Tritanium selling for 75 isk",
+            "Tritanium dropped 25% to 75 isk within 15 minutes",
+        ]
+
+    def test_window_updated_once_per_snapshot(self, monitor, target, monkeypatch):
+        target.update({"drop": 0.2, "window": 900})
+        # a second target sharing the type and window, as another profile would
+        shared = {**target, "drop": 0.3}
+        monkeypatch.setattr(
+            "eve_monitor.market_monitor.load_targets", lambda: [target, shared]
+        )
+        add = Mock(side_effect=PriceWindow.add)
+        monkeypatch.setattr(PriceWindow, "add", lambda *args: add(*args))
+        clock = Mock()
+        monkeypatch.setattr("eve_monitor.market_monitor.time.time", clock)
+        self.poll(
+            monitor,
+            clock,
+            [
+                (1000.0, [order(1, 100.0)]),
+                (1300.0, [order(1, 100.0), order(2, 75.0)]),
+            ],
+        )
+        assert add.call_count == 2
+        assert [msg.split(" within ")[0] for msg in self.notified(monitor)] == [
+            "Tritanium dropped 25% to 75 isk"
+        ]
@@ -0,0 +1,185 @@
+import time
+from array import array
+from unittest.mock import Mock
+
+import pytest
+
+from eve_monitor import market_salvager
+from eve_monitor.market_salvager import (
+    LAST_ORDERS_TO_CACHE,
+    MARKET_SALVAGER,
+    MarketSalvager,
+    MaterialMatrix,
+    SalvageHistory,
+)
+
+# (type_id, material_type_id, quantity), 400mm plate and its tech I variant
+MATERIALS = [
+    (11293, 34, 100),
+    (11293, 35, 10),
+    (11295, 34, 120),
+    (11295, 36, 5),
+]
+
+
+class TestMaterialMatrix:
+    @pytest.fixture
+    def matrix(self):
+        return MaterialMatrix(MATERIALS)
+
+    def test_layout(self, matrix):
+        assert len(matrix) == 2
+        assert matrix.type_ids == [11293, 11295]
+        assert matrix.material_ids == [34, 35, 36]
+        assert list(matrix.indptr) == [0, 2, 4]
+        assert list(matrix.indices) == [0, 1, 0, 2]
+        assert list(matrix.data) == [100, 10, 120, 5]
+
+    def test_matvec(self, matrix):
+        assert list(matrix.matvec(array("d", [1.0, 2.0, 3.0]))) == [120.0, 135.0]
+
+    def test_values_missing_price_is_zero(self, matrix):
+        assert matrix.values({34: 2.0}) == {11293: 200.0, 11295: 240.0}
+
+    def test_materials_of(self, matrix):
+        assert matrix.materials_of([11295, 1]) == {34, 36}
+
+    def test_empty(self):
+        matrix = MaterialMatrix([])
+        assert len(matrix) == 0
+        assert matrix.values({34: 1.0}) == {}
+
+
+class TestSalvageHistory:
+    def test_init_with_history_data(self):
+        history_data = {MARKET_SALVAGER: {"1": 100}}
+        history = SalvageHistory(history_data)
+        assert history.orders == {1: 100}
+        assert history_data[MARKET_SALVAGER] is history
+
+    def test_add_order_seen(self):
+        history = SalvageHistory()
+        history.add_order_seen(1)
+        assert history.is_order_seen(1)
+        assert not history.is_order_seen(2)
+        assert history.to_json_serializable()[1] <= int(time.time())
+
+    def test_trim(self):
+        history = SalvageHistory()
+        history.orders = {i: i for i in range(LAST_ORDERS_TO_CACHE + 10)}
+        history.trim()
+        assert len(history) == LAST_ORDERS_TO_CACHE
+        assert min(history.orders) == 10
+
+    def test_snapshot_is_copied_on_write(self, monkeypatch):
+        history = SalvageHistory()
+        history.orders = {i: i for i in range(LAST_ORDERS_TO_CACHE + 10)}
+        snapshot = history.snapshot()
+        assert snapshot is history.orders
+        history.add_order_seen(0)
+        assert snapshot is not history.orders
+        assert 0 in snapshot and len(snapshot) == LAST_ORDERS_TO_CACHE + 10
+        # an order seen again while trim picks evictions is kept
+        monkeypatch.setattr(
+            history, "snapshot", lambda: (snapshot, history.add_order_seen(1))[0]
+        )
+        history.trim()
+        assert 0 in history.orders and 1 in history.orders
+        assert len(history) == LAST_ORDERS_TO_CACHE + 2
+
+
+def order(order_id, type_id, price, is_buy_order=False):
+    return {
+        "order_id": order_id,
+        "type_id": type_id,
+        "price": price,
+        "is_buy_order": is_buy_order,
+        "system_id": 30000142,
+        "volume_remain": 2,
+        "issued": "2024-01-01T00:00:00Z",
+    }
+
+
+class TestMarketSalvager:
+    @pytest.fixture
+    def salvager(self, monkeypatch):
+        salvager = MarketSalvager()
+        salvager.cur.executescript(
+            """
+            create table invTypeMaterials (typeID integer, materialTypeID integer, quantity integer);
+            create table invMetaTypes (typeID integer, parentTypeID integer, metaGroupID integer);
+            create table invTypes (typeID integer, typeName text);
+            create table mapSolarSystems (solarSystemID integer, solarSystemName text, security real);
+            insert into invMetaTypes values (11295, 11293, 1), (11297, 11293, 2);
+            insert into invTypes values
+                (11293, '400mm Steel Plates I'),
+                (11295, '400mm Reinforced Steel Plates I'),
+                (11297, '400mm Steel Plates II');
+            insert into mapSolarSystems values (30000142, 'Jita', 0.9);
+            """
+        )
+        salvager.cur.executemany(
+            "insert into invTypeMaterials values (?, ?, ?)", MATERIALS
+        )
+        monkeypatch.setattr(
+            market_salvager,
+            "load_targets",
+            lambda: [{"type_id": 11293, "name": "400mm Steel Plates I"}],
+        )
+        salvager.send_notification = Mock()
+        return salvager
+
+    def test_get_candidates_includes_tech_one_variants(self, salvager):
+        candidates = salvager.get_candidates(market_salvager.load_targets())
+        assert candidates == {
+            11293: "400mm Steel Plates I",
+            11295: "400mm Reinforced Steel Plates I",
+        }
+
+    def test_watch_salvage(self, salvager):
+        # pages of the region, the best prices may be on any of them
+        salvager.page_aware_stream = Mock(
+            side_effect=lambda *_, **__: iter(
+                [
+                    [
+                        # tritanium 4, pyerite 10, mexallon 50, the lower of best buy and sell
+                        order(1, 34, 5.0),
+                        order(3, 35, 10.0),
+                        order(4, 36, 50.0),
+                        # worth 0.5 * (400 + 100) = 250 and 0.5 * (480 + 250) = 365
+                        order(10, 11293, 200.0),
+                        order(11, 11293, 300.0),
+                    ],
+                    [
+                        order(2, 34, 4.0, is_buy_order=True),
+                        order(12, 11295, 364.0),
+                        order(13, 11295, 100.0, is_buy_order=True),
+                        order(14, 99, 1.0),
+                    ],
+                ]
+            )
+        )
+        salvager.watch_salvage()
+        assert salvager.send_notification.call_count == 2
+        assert salvager.history.orders.keys() == {10, 12}
+        msg = salvager.send_notification.call_args_list[0].args[0]
+        assert "400mm Steel Plates I selling for 200 isk in Jita" in msg
+        assert "reprocesses into 250 isk" in msg
+
+        # seen orders are not notified again, the matrix is loaded once
+        salvager.load_matrix = Mock()
+        salvager.watch_salvage()
+        assert salvager.send_notification.call_count == 2
+        salvager.load_matrix.assert_not_called()
+
+    def test_cheap_material_not_evaluated(self, salvager):
+        # mexallon reprocesses too, its sell order is under its own value
+        salvager.cur.execute("insert into invTypeMaterials values (36, 34, 100)")
+        salvager.page_aware_stream = Mock(
+            return_value=iter(
+                [[order(1, 34, 4.0), order(2, 35, 10.0), order(3, 36, 50.0)]]
+            )
+        )
+        salvager.watch_salvage()
+        assert salvager.matrix.values({34: 4.0})[36] * 0.5 > 50.0
+        salvager.send_notification.assert_not_called()
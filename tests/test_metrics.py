@@ -0,0 +1,65 @@
+import math
+import pytest
+
+from eve_monitor.metrics import Counter, Histogram, MetricsRegistry, endpoint
+
+
+class TestEndpoint:
+    @pytest.mark.parametrize(
+        "url, expected",
+        [
+            (
+                "https://esi.evetech.net/latest/markets/10000002/orders/",
+                "/markets/{id}/orders/",
+            ),
+            (
+                "https://esi.evetech.net/latest/contracts/public/items/123?page=2",
+                "/contracts/public/items/{id}",
+            ),
+            ("https://api.pushover.net/1/messages.json", "/{id}/messages.json"),
+        ],
+    )
+    def test_endpoint(self, url, expected):
+        assert endpoint(url) == expected
+
+
+class TestMetrics:
+    def test_counter(self):
+        counter = Counter("c", "help", ("a",))
+        counter.inc("x")
+        counter.inc("x", amount=2)
+        assert counter.get("x") == 3
+        assert counter.get("y") == 0
+        assert counter.render() == ['c{a="x"} 3']
+
+    def test_histogram(self):
+        histogram = Histogram("h", "help", ("a",), (1, 2, 4))
+        for value in (0.5, 1.5, 1.5, 3, 10):
+            histogram.observe("x", value=value)
+        assert histogram.count("x") == 5
+        assert histogram.total("x") == 16.5
+        assert histogram.render() == [
+            'h_bucket{a="x",le="1"} 1',
+            'h_bucket{a="x",le="2"} 3',
+            'h_bucket{a="x",le="4"} 4',
+            'h_bucket{a="x",le="+Inf"} 5',
+            'h_sum{a="x"} 16.5',
+            'h_count{a="x"} 5',
+        ]
+
+    def test_histogram_quantile(self):
+        histogram = Histogram("h", "help", (), (1, 2, 4))
+        assert math.isnan(histogram.quantile(0.5))
+        for value in (0.5, 1.5, 1.5, 1.5):
+            histogram.observe(value=value)
+        assert histogram.quantile(0.5) == pytest.approx(1 + 1 / 3)
+        assert histogram.quantile(1) == 2
+
+    def test_registry_render(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("c", "a counter", ("a",))
+        assert registry.counter("c", "a counter", ("a",)) is counter
+        counter.inc('quote"d')
+        assert registry.render() == (
+            "# HELP c a counter\n" '# TYPE c counter\nc{a="quote\\"d"} 1\n'
+        )
@@ -0,0 +1,197 @@
+import threading
+import time
+import pytest
+import requests
+from unittest.mock import Mock
+
+from eve_monitor import notifier as notifier_module
+from eve_monitor.notifier import (
+    HIGH,
+    MAX_RETRIES,
+    NORMAL,
+    PUSHOVER_LIMIT_REMAINING,
+    PUSHOVER_LIMIT_RESET,
+    PUSHOVER_MAX_MESSAGE,
+    Notifier,
+)
+
+
+class TestNotifier:
+    @pytest.fixture(autouse=True)
+    def no_sleep(self, monkeypatch):
+        monkeypatch.setattr(notifier_module, "MIN_SEND_INTERVAL", 0)
+        monkeypatch.setattr(notifier_module, "INIT_RETRY_BACKOFF", 0)
+
+    @pytest.fixture
+    def session(self):
+        session = Mock()
+        session.post.return_value = self.response(200)
+        return session
+
+    @pytest.fixture
+    def notifier(self, session):
+        return Notifier(session, 0.2, "token", "user", pushover=True, desktop=False)
+
+    def response(self, status_code, headers={}):
+        res = Mock()
+        res.status_code = status_code
+        res.headers = headers
+        res.content = b""
+        return res
+
+    def sent(self, session) -> list[dict]:
+        return [c.kwargs["data"] for c in session.post.call_args_list]
+
+    def test_submit_inline_when_not_started(self, notifier, session):
+        notifier.submit("hello")
+        assert self.sent(session)[0]["message"] == "hello"
+        assert self.sent(session)[0]["priority"] == NORMAL
+
+    def test_coalesce_burst_into_digest(self, notifier, session):
+        notifier.start()
+        for msg in ["a", "b", "a", "c"]:
+            notifier.submit(msg)
+        notifier.stop()
+        sent = self.sent(session)
+        assert len(sent) == 1
+        assert sent[0]["message"] == "a\n\nb\n\nc"
+        assert "3 notifications" in sent[0]["title"]
+
+    def test_coalesce_window_elapses_without_stop(self, notifier, session):
+        notifier.start()
+        notifier.submit("a")
+        notifier.submit("b")
+        deadline = time.time() + 5
+        while session.post.call_count == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        assert self.sent(session)[0]["message"] == "a\n\nb"
+        notifier.stop()
+
+    def test_critical_skips_digest(self, notifier, session):
+        notifier.start()
+        notifier.submit("normal")
+        notifier.submit("critical", critical=True)
+        deadline = time.time() + 5
+        while session.post.call_count == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        # critical is sent before the coalesce window of the normal one ends
+        assert self.sent(session)[0]["message"] == "critical"
+        # without the setting, critical notifications respect quiet hours
+        assert self.sent(session)[0]["priority"] == NORMAL
+        notifier.stop()
+        assert [s["message"] for s in self.sent(session)] == ["critical", "normal"]
+
+    def test_critical_priority_setting(self, session):
+        notifier = Notifier(
+            session, 0, pushover=True, desktop=False, critical_priority=HIGH
+        )
+        notifier.submit("critical", critical=True)
+        notifier.submit("normal")
+        assert [s["priority"] for s in self.sent(session)] == [HIGH, NORMAL]
+
+    def test_critical_delivered_before_queued_normal(self, notifier, session):
+        notifier.thread = Mock()  # queue without a running thread
+        notifier.submit("normal")
+        notifier.submit("critical", critical=True)
+        notifier.thread = None
+        notifier.start()
+        notifier.stop()
+        assert [s["message"] for s in self.sent(session)] == ["critical", "normal"]
+
+    def test_submit_does_not_wait_on_delivery(self, notifier, session):
+        release = threading.Event()
+        session.post.side_effect = lambda *_, **__: (
+            release.wait(5),
+            self.response(200),
+        )[1]
+        notifier.start()
+        start = time.time()
+        for i in range(100):
+            notifier.submit(str(i), critical=i % 2 == 0)
+        assert time.time() - start < 0.5
+        release.set()
+        notifier.stop()
+
+    def test_build_digests_within_limit(self, notifier):
+        msgs = ["x" * 600, "y" * 300, "z" * 300, "w" * 2000]
+        digests = notifier.build_digests(msgs)
+        assert digests == [
+            "x" * 600 + "\n\n" + "y" * 300,
+            "z" * 300,
+            "w" * PUSHOVER_MAX_MESSAGE,
+        ]
+
+    @pytest.mark.parametrize("status_code", [429, 500])
+    def test_retry_on_rate_limit_and_server_error(self, notifier, session, status_code):
+        session.post.side_effect = [self.response(status_code), self.response(200)]
+        notifier.submit("hello")
+        assert session.post.call_count == 2
+
+    def test_retry_on_connection_error(self, notifier, session):
+        session.post.side_effect = [
+            requests.exceptions.ConnectionError(),
+            self.response(200),
+        ]
+        notifier.submit("hello")
+        assert session.post.call_count == 2
+
+    def test_give_up_after_max_retries(self, notifier, session):
+        session.post.return_value = self.response(503)
+        notifier.submit("hello")
+        assert session.post.call_count == MAX_RETRIES
+
+    def test_retry_requeued_without_blocking_others(
+        self, notifier, session, monkeypatch
+    ):
+        monkeypatch.setattr(notifier_module, "INIT_RETRY_BACKOFF", 0.5)
+        session.post.side_effect = [self.response(503)] + [self.response(200)] * 2
+        notifier.start()
+        notifier.submit("first", critical=True)
+        notifier.submit("second", critical=True)
+        deadline = time.time() + 5
+        while session.post.call_count < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        notifier.stop()
+        # second goes out while first waits out its backoff
+        assert [s["message"] for s in self.sent(session)] == [
+            "first",
+            "second",
+            "first",
+        ]
+
+    def test_retry_digest_as_sent(self, notifier, session):
+        session.post.side_effect = [self.response(500), self.response(200)]
+        notifier.start()
+        notifier.submit("a")
+        notifier.submit("b")
+        notifier.stop()
+        sent = self.sent(session)
+        assert [s["message"] for s in sent] == ["a\n\nb", "a\n\nb"]
+        assert "2 notifications" in sent[1]["title"]
+
+    def test_no_retry_on_client_error(self, notifier, session):
+        session.post.return_value = self.response(400)
+        notifier.submit("hello")
+        assert session.post.call_count == 1
+
+    def test_drop_when_limit_exhausted(self, notifier, session):
+        reset = str(int(time.time()) + 3600)
+        session.post.return_value = self.response(
+            200, {PUSHOVER_LIMIT_REMAINING: "0", PUSHOVER_LIMIT_RESET: reset}
+        )
+        notifier.submit("first")
+        notifier.submit("second")
+        assert session.post.call_count == 1
+
+    def test_pushover_disabled(self, session):
+        notifier = Notifier(session, 0, pushover=False, desktop=False)
+        notifier.submit("hello")
+        session.post.assert_not_called()
+
+    def test_delivered_callback(self, notifier, session):
+        delivered = []
+        notifier.start()
+        notifier.submit("a", delivered=lambda: delivered.append("a"))
+        notifier.submit("b", delivered=lambda: delivered.append("b"))
+        notifier.stop()
+        assert sorted(delivered) == ["a", "b"]
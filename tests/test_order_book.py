@@ -0,0 +1,212 @@
+from unittest.mock import Mock
+
+import pytest
+
+from eve_monitor.arbitrage import ARBITRAGE, Arbitrage, ArbitrageHistory
+from eve_monitor.order_book import OrderBook, PriceWindow
+from eve_monitor.state import StateIndex
+
+
+def order(order_id, type_id, price, volume=1, is_buy_order=False, min_volume=1):
+    return {
+        "order_id": order_id,
+        "type_id": type_id,
+        "price": price,
+        "volume_remain": volume,
+        "is_buy_order": is_buy_order,
+        "min_volume": min_volume,
+    }
+
+
+class TestOrderBook:
+    @pytest.fixture
+    def book(self):
+        book = OrderBook()
+        book.apply_snapshot(
+            1,
+            [
+                order(1, 34, 10.0, volume=5),
+                order(2, 34, 12.0, volume=5),
+                order(3, 34, 8.0, is_buy_order=True),
+            ],
+        )
+        book.apply_snapshot(
+            2,
+            [
+                order(4, 34, 20.0, volume=3, is_buy_order=True),
+                order(5, 34, 13.0, volume=4, is_buy_order=True),
+                order(6, 34, 30.0),
+            ],
+        )
+        return book
+
+    def test_best_prices(self, book):
+        assert book.best_ask(34, 1) == 10.0
+        assert book.best_bid(34, 1) == 8.0
+        assert book.best_bid(34, 2) == 20.0
+        assert book.best_ask(35, 1) is None
+
+    def test_match_walks_depth(self, book):
+        opportunity = book.match(34, 1, 2, margin=0.1)
+        # 3 at 10 -> 20, 2 at 10 -> 13, 2 at 12 -> 13 is under the margin
+        assert opportunity.volume == 5
+        assert opportunity.cost == 50.0
+        assert opportunity.profit == 3 * 10 + 2 * 3
+        assert (opportunity.buy_price, opportunity.sell_price) == (10.0, 20.0)
+
+    def test_match_skips_bids_over_available_volume(self, book):
+        book.apply_snapshot(
+            2, [order(4, 34, 20.0, volume=30, is_buy_order=True, min_volume=20)]
+        )
+        assert book.match(34, 1, 2, margin=0.1) is None
+
+    def test_opportunities(self, book):
+        (opportunity,) = book.opportunities(margin=0.1)
+        assert (opportunity.buy_region_id, opportunity.sell_region_id) == (1, 2)
+        assert book.opportunities(margin=0.1, min_profit=100) == []
+        assert book.opportunities(margin=1.5) == []
+
+    def test_snapshot_updates_incrementally(self, book):
+        book.opportunities(margin=0.1)
+        assert not book.dirty
+        changed = book.apply_snapshot(
+            1,
+            [
+                order(1, 34, 25.0, volume=5),
+                order(2, 34, 12.0, volume=1),
+                order(7, 35, 1.0),
+            ],
+        )
+        # 1 repriced, 2 volume changed, 3 gone and 7 new
+        assert changed == 4
+        assert book.dirty == {34, 35}
+        assert book.best_ask(34, 1) == 12.0
+        assert book.best_bid(34, 1) is None
+        assert len(book) == 6
+
+        book.best_spread = Mock(wraps=book.best_spread)
+        (opportunity,) = book.opportunities(margin=0.1)
+        assert opportunity.volume == 1
+        assert book.best_spread.call_count == 2
+        # only dirty types are recomputed
+        book.opportunities(margin=0.1)
+        assert book.best_spread.call_count == 2
+
+    def test_unchanged_snapshot(self, book):
+        book.opportunities(margin=0.1)
+        snapshot = [
+            order(4, 34, 20.0, volume=3, is_buy_order=True),
+            order(5, 34, 13.0, volume=4, is_buy_order=True),
+            order(6, 34, 30.0),
+        ]
+        assert book.apply_snapshot(2, snapshot) == 0
+        assert not book.dirty
+
+    def test_region_emptied(self, book):
+        book.apply_snapshot(2, [])
+        assert 2 not in book.levels[34]
+        book.apply_snapshot(1, [])
+        assert 34 not in book.levels
+        assert book.opportunities(margin=0.1) == []
+
+    def test_type_snapshot_keeps_other_types(self, book):
+        book.apply_snapshot(1, [order(7, 35, 5.0)])
+        assert book.apply_snapshot(2, [order(6, 34, 25.0)], type_id=34) == 3
+        assert book.best_ask(34, 2) == 25.0
+        assert book.best_bid(34, 2) is None
+        assert book.best_ask(35, 1) == 5.0
+        assert book.region_orders[2] == {6}
+
+    def test_side_snapshot_keeps_other_side(self, book):
+        assert book.apply_snapshot(1, [order(1, 34, 9.0)], 34, is_buy=False) == 2
+        assert book.best_ask(34, 1) == 9.0
+        assert book.best_bid(34, 1) == 8.0
+        assert book.region_orders[1] == {1, 3}
+
+    def test_pages_applied_as_they_arrive(self, book):
+        def pages():
+            yield [order(1, 34, 10.0, volume=5), order(7, 35, 1.0)]
+            # the first page is in the book before the next one is fetched
+            assert book.best_ask(35, 1) == 1.0
+            assert not book.lock.locked()
+            yield [order(3, 34, 9.0, is_buy_order=True)]
+
+        # 7 new, 3 repriced, and 2 removed only once every page arrived
+        assert book.apply_pages(1, pages()) == 3
+        assert book.region_orders[1] == {1, 3, 7}
+        assert book.best_bid(34, 1) == 9.0
+
+    def test_no_pages_keep_region(self, book):
+        assert book.apply_pages(1, []) == 0
+        assert book.region_orders[1] == {1, 2, 3}
+
+
+class TestPriceWindow:
+    def test_highest_within_window(self):
+        window = PriceWindow(60)
+        assert window.add(0, 10.0) == 10.0
+        assert window.add(10, 12.0) == 12.0
+        assert window.add(20, 8.0) == 12.0
+        assert window.add(71, 9.0) == 9.0
+        # lower prices behind a higher one are never kept
+        assert list(window.prices) == [(71, 9.0)]
+
+
+class TestArbitrage:
+    @pytest.fixture
+    def arbitrage(self, monkeypatch):
+        arbitrage = Arbitrage()
+        snapshots = {
+            1: [order(1, 34, 10.0, volume=5_000_000)],
+            2: [order(2, 34, 20.0, volume=5_000_000, is_buy_order=True)],
+            3: [order(3, 34, 1.0)],
+        }
+        arbitrage.page_aware_stream = Mock(
+            side_effect=lambda url, **_: iter([snapshots[int(url.split("/")[-3])]])
+        )
+        arbitrage.send_notification = Mock()
+        arbitrage.get_type_name = Mock(return_value="Tritanium")
+        monkeypatch.setattr(
+            "eve_monitor.arbitrage.settings",
+            Mock(
+                esi_url="",
+                regions=[
+                    {"name": "A", "region_id": 1, "known_space": True},
+                    {"name": "B", "region_id": 2, "known_space": True},
+                    {"name": "W", "region_id": 3, "known_space": False},
+                ],
+                arbitrage_margin=0.1,
+                arbitrage_min_profit=1_000_000,
+                arbitrage_top=10,
+            ),
+        )
+        self.state = StateIndex()
+        monkeypatch.setattr("eve_monitor.arbitrage.state", self.state)
+        return arbitrage
+
+    def test_watch_spreads(self, arbitrage):
+        arbitrage.watch_spreads()
+        assert arbitrage.page_aware_stream.call_count == 2
+        arbitrage.send_notification.assert_called_once()
+        msg = arbitrage.send_notification.call_args.args[0]
+        assert "Tritanium buy 5,000,000 in A from 10 isk, sell in B from 20 isk" in msg
+        (item,) = self.state.get_opportunities()["items"]
+        assert item["profit"] == 50_000_000
+        assert item["sell_region_name"] == "B"
+
+        # same spread is not notified twice
+        arbitrage.watch_spreads()
+        arbitrage.send_notification.assert_called_once()
+
+    def test_region_kept_when_not_fetched(self, arbitrage):
+        arbitrage.watch_spreads()
+        # not modified or failed, the stream yields no page or an empty one
+        arbitrage.page_aware_stream.side_effect = lambda url, **_: iter([[]])
+        assert arbitrage.refresh_region(1) == 0
+        assert arbitrage.book.best_ask(34, 1) == 10.0
+
+    def test_history(self):
+        history_data = {ARBITRAGE: {"34:1:2:10.0:20.0": 100}}
+        history = ArbitrageHistory(history_data)
+        assert history.is_spread_seen("34:1:2:10.0:20.0")
+        assert history_data[ARBITRAGE] is history
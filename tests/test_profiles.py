@@ -0,0 +1,178 @@
+import json
+import re
+from unittest.mock import Mock
+
+import pytest
+
+from eve_monitor import profiles
+from eve_monitor.contract_sniper import CONTRACT_SNIPER, ContractSniper
+from eve_monitor.market_monitor import MARKET_MONITOR, MarketMonitor
+from eve_monitor.profiles import DEFAULT_PROFILE, Profile, load_profiles
+
+THE_FORGE = {"name": "The Forge", "region_id": 10000002, "known_space": True}
+
+
+def order(order_id, price):
+    return {
+        "order_id": order_id,
+        "type_id": 34,
+        "is_buy_order": False,
+        "price": price,
+        "system_id": 30000142,
+        "volume_remain": 1,
+        "volume_total": 1,
+        "issued": "2024-01-01T00:00:00Z",
+    }
+
+
+def contract(contract_id):
+    return {
+        "contract_id": contract_id,
+        "type": "item_exchange",
+        "issuer_id": 1,
+        "price": 1,
+        "title": "",
+        "volume": 1,
+        "start_location_id": 60003760,
+        "date_issued": "2024-01-01T00:00:00Z",
+    }
+
+
+class TestProfile:
+    def test_history_key(self):
+        assert Profile(DEFAULT_PROFILE, Mock()).history_key("x") == "x"
+        assert Profile("corp", Mock()).history_key("x") == "x@corp"
+
+    def test_targets(self, tmp_path):
+        targets_json = tmp_path / "corp_targets.json"
+        targets_json.write_text(json.dumps({MARKET_MONITOR: [{"type_id": 34}]}))
+        profile = Profile("corp", Mock(), str(targets_json))
+        assert profile.targets(MARKET_MONITOR) == [{"type_id": 34}]
+        assert profile.targets(CONTRACT_SNIPER) == []
+
+        # reloaded each time
+        targets_json.write_text(json.dumps({MARKET_MONITOR: []}))
+        assert profile.targets(MARKET_MONITOR) == []
+
+    def test_load_profiles(self, monkeypatch):
+        monkeypatch.setattr(
+            profiles,
+            "settings",
+            Mock(
+                profiles=[
+                    {"name": "corp", "TARGETS_JSON": "corp.json", "USER_KEY": "k"}
+                ]
+            ),
+        )
+        notifier_class = Mock()
+        monkeypatch.setattr(profiles, "Notifier", notifier_class)
+        notifier = Mock()
+        default, corp = load_profiles(notifier)
+        assert default.is_default and default.notifier is notifier
+        assert corp.name == "corp" and corp.targets_json == "corp.json"
+        assert notifier_class.call_args.kwargs["user_key"] == "k"
+        assert notifier_class.call_args.kwargs["app_token"] is None
+        corp.notifier.start.assert_called_once()
+
+    def test_default_name_reserved(self, monkeypatch):
+        monkeypatch.setattr(
+            profiles,
+            "settings",
+            Mock(profiles=[{"name": DEFAULT_PROFILE, "TARGETS_JSON": "x.json"}]),
+        )
+        with pytest.raises(ValueError):
+            load_profiles(Mock())
+
+
+class TestSharedDataPlane:
+    @pytest.fixture
+    def watchlists(self):
+        corp = Profile("corp", Mock())
+        corp.targets = Mock(
+            return_value=[{"type_id": 34, "name": "Tritanium", "threshold": 5}]
+        )
+        return [Profile(DEFAULT_PROFILE, Mock()), corp]
+
+    def test_market_monitor_fetches_once(self, watchlists, monkeypatch):
+        # the default profile reads the shared targets file
+        monkeypatch.setattr(
+            "eve_monitor.market_monitor.load_targets",
+            lambda: [{"type_id": 34, "name": "Tritanium", "threshold": 10}],
+        )
+        monkeypatch.setattr(
+            "eve_monitor.market_monitor.settings", Mock(regions=[THE_FORGE])
+        )
+        monkeypatch.setattr("eve_monitor.market_monitor.state", Mock())
+        history = {}
+        monitor = MarketMonitor(history, profiles=watchlists)
+        monitor.get_item_orders_in_region = Mock(
+            return_value=[[order(1, 4), order(2, 8), order(3, 20)]]
+        )
+        monitor.get_system_info = Mock(return_value=("Jita", 0.9))
+        monitor.send_notification = Mock()
+        monitor.watch_market()
+
+        monitor.get_item_orders_in_region.assert_called_once_with(34, 10000002, "sell")
+        notified = [
+            (call.kwargs["profile"].name, call.args[0].split(" ")[3])
+            for call in monitor.send_notification.call_args_list
+        ]
+        assert notified == [
+            (DEFAULT_PROFILE, "4"),
+            ("corp", "4"),
+            (DEFAULT_PROFILE, "8"),
+        ]
+        # each profile keeps its own history
+        assert set(history) == {MARKET_MONITOR, f"{MARKET_MONITOR}@corp"}
+        assert monitor.histories["corp"].is_order_seen(34, 1)
+        assert not monitor.histories["corp"].is_order_seen(34, 2)
+
+    def test_contract_sniper_targets_per_profile(self, watchlists, monkeypatch):
+        monkeypatch.setattr("eve_monitor.contract_sniper.load_targets", lambda: [34])
+        watchlists[1].targets = Mock(return_value=[35])
+        sniper = ContractSniper(profiles=watchlists)
+        sniper.update_targets()
+        assert sniper.profile_targets == {DEFAULT_PROFILE: {34}, "corp": {35}}
+        assert sniper.targets == {34, 35}
+
+    def test_contract_sniper_history_per_profile(self, watchlists, monkeypatch):
+        monkeypatch.setattr("eve_monitor.contract_sniper.load_targets", lambda: [34])
+        monkeypatch.setattr("eve_monitor.contract_sniper.state", Mock())
+        watchlists[1].targets = Mock(return_value=[34])
+        # the default profile saw contract 1 before corp was added
+        history = {CONTRACT_SNIPER: {"10000002": {"1": 0}}}
+        sniper = ContractSniper(history, profiles=watchlists)
+        monkeypatch.setattr(
+            "eve_monitor.contract_sniper.settings",
+            Mock(regions=[THE_FORGE], esi_url=""),
+        )
+        sniper.page_aware_stream = Mock(return_value=[[contract(1), contract(2)]])
+        sniper.region_too_far = Mock(return_value=False)
+        sniper.too_far = Mock(return_value=False)
+        sniper.get_station_info = Mock(return_value=("Jita IV", 30000142, 0.9))
+        sniper.get_contract_items = Mock(return_value=("Tritanium\t1", "", {34}, []))
+        sniper.get_appraisal_value = Mock(
+            side_effect=lambda items, buy=False: 0 if buy else 1e9
+        )
+        sniper.get_system_info = Mock(return_value=("Jita", 0.9))
+        sniper.get_character_name = Mock(return_value="issuer")
+        sniper.send_notification = Mock()
+        sniper.watch_contract()
+
+        # contracts are fetched once, whatever profiles saw them
+        assert [c.args for c in sniper.get_contract_items.call_args_list] == [
+            (1,),
+            (2,),
+        ]
+        notified = [
+            (
+                call.kwargs["profile"].name,
+                re.search(r"contract \((\d+)\)", call.args[0])[1],
+            )
+            for call in sniper.send_notification.call_args_list
+        ]
+        assert notified == [("corp", "1"), (DEFAULT_PROFILE, "2"), ("corp", "2")]
+        assert set(history) == {CONTRACT_SNIPER, f"{CONTRACT_SNIPER}@corp"}
+        for name in (DEFAULT_PROFILE, "corp"):
+            assert sniper.histories[name].is_contract_seen(10000002, 1)
+            assert sniper.histories[name].is_contract_seen(10000002, 2)
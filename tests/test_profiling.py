@@ -0,0 +1,119 @@
+import marshal
+import pstats
+import threading
+
+import pytest
+
+import ui
+from eve_monitor import profiling
+from eve_monitor.profiling import CPU, MEMORY, Profiler
+
+
+def busy(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+    return
+
+
+@pytest.fixture
+def busy_thread():
+    stop = threading.Event()
+    t = threading.Thread(target=busy, args=(stop,), name="busy")
+    t.start()
+    yield t
+    stop.set()
+    t.join()
+
+
+class TestSampling:
+    def test_sample_named_threads(self, busy_thread):
+        stacks = profiling.sample_stacks(0.1, 0.001, {"busy"})
+        assert stacks
+        assert all(
+            any(func == "busy" for _, _, func in stack) for stack in stacks.elements()
+        )
+
+    def test_excludes_sampling_thread(self):
+        stacks = profiling.sample_stacks(0.05, 0.001)
+        assert not any(
+            func == "sample_stacks" for stack in stacks for _, _, func in stack
+        )
+
+    def test_collapsed(self):
+        stacks = profiling.collections.Counter(
+            {(("a.py", 1, "main"), ("a.py", 5, "work")): 3}
+        )
+        assert profiling.to_collapsed(stacks) == "main (a.py:1);work (a.py:5) 3\n"
+
+    def test_pstats_loadable(self, tmp_path):
+        main, work, helper = ("a.py", 1, "main"), ("a.py", 5, "work"), ("b.py", 1, "h")
+        stacks = profiling.collections.Counter(
+            {(main, work): 3, (main, work, helper): 1, (main,): 1}
+        )
+        path = tmp_path / "cpu.pstats"
+        path.write_bytes(profiling.to_pstats(stacks, 0.01))
+        stats = pstats.Stats(str(path)).stats  # type: ignore
+        # own time only counts samples on top of the stack
+        assert stats[work][2] == pytest.approx(0.03)
+        assert stats[main][3] == pytest.approx(0.05)
+        assert stats[helper][4] == {work: (1, 1, pytest.approx(0.01), 0.01)}
+
+    def test_pstats_recursion_counted_once(self):
+        f = ("a.py", 1, "f")
+        stats = marshal.loads(
+            profiling.to_pstats(profiling.collections.Counter({(f, f, f): 2}), 1)
+        )
+        assert stats[f][3] == 2
+
+
+class TestProfiler:
+    def test_cpu_profile(self, busy_thread, tmp_path, monkeypatch):
+        monkeypatch.setattr(profiling, "SAMPLE_INTERVAL", 0.001)
+        done = threading.Event()
+        profiler = Profiler()
+        assert profiler.start(CPU, 0.1, {"busy"}, lambda *_: done.set())
+        assert not profiler.start(CPU, 0.1)
+        assert done.wait(5)
+        assert "busy" in profiler.result(CPU)  # type: ignore
+        assert profiler.result(CPU, "collapsed")
+        paths = profiling.save(CPU, profiler.results[CPU], str(tmp_path))
+        assert sorted(p.rsplit(".", 1)[1] for p in paths) == [
+            "collapsed",
+            "pstats",
+            "txt",
+        ]
+
+    def test_memory_profile(self):
+        done = threading.Event()
+        profiler = Profiler()
+        profiler.start(MEMORY, 0.05, callback=lambda *_: done.set())
+        assert done.wait(5)
+        assert "allocation sites" in profiler.result(MEMORY)  # type: ignore
+        assert not profiling.tracemalloc.is_tracing()
+
+
+class TestProfileEndpoint:
+    @pytest.fixture(autouse=True)
+    def profiler(self, monkeypatch):
+        profiler = Profiler()
+        monkeypatch.setattr(ui, "profiler", profiler)
+        return profiler
+
+    def test_start_and_download(self, profiler):
+        client = ui.app.test_client()
+        assert client.get("/debug/profile/cpu").status_code == 404
+        res = client.post("/debug/profile/cpu?seconds=0.05")
+        assert res.status_code == 202
+        profiler.running[CPU].join()
+        res = client.get("/debug/profile/cpu?format=pstats")
+        assert res.status_code == 200
+        assert "attachment" in res.headers["Content-Disposition"]
+
+    def test_already_running(self, profiler):
+        client = ui.app.test_client()
+        assert client.post("/debug/profile/memory?seconds=0.2").status_code == 202
+        assert client.post("/debug/profile/memory").status_code == 409
+        profiler.running[MEMORY].join()
+
+    def test_unknown_kind(self):
+        assert ui.app.test_client().post("/debug/profile/disk").status_code == 404
@@ -0,0 +1,100 @@
+import json
+import time
+from email.utils import formatdate
+from unittest.mock import Mock
+
+import pytest
+
+from eve_monitor.config import REGIONS, Settings
+from eve_monitor.region_refresher import RegionRefresher
+
+ESI_URL = "https://esi.test"
+DETAILS = {
+    10000001: {"name": "Derelik", "region_id": 10000001, "description": "x"},
+    11000001: {"name": "A-R00001", "region_id": 11000001},
+}
+
+
+def response(status_code, content=None, expires=None):
+    res = Mock(status_code=status_code, headers={})
+    res.json.return_value = content
+    if expires is not None:
+        res.headers["Expires"] = formatdate(expires, usegmt=True)
+    return res
+
+
+class TestRegionRefresher:
+    @pytest.fixture
+    def settings(self, tmp_path, monkeypatch):
+        json.dump({"ESI_URL": ESI_URL}, open(tmp_path / "appsettings.json", "w"))
+        json.dump([], open(tmp_path / "regions.json", "w"))
+        settings = Settings(
+            str(tmp_path / "appsettings.json"),
+            str(tmp_path / "targets.json"),
+            str(tmp_path / "regions.json"),
+        )
+        monkeypatch.setattr("eve_monitor.region_refresher.settings", settings)
+        return settings
+
+    @pytest.fixture
+    def refresher(self, settings):
+        refresher = RegionRefresher()
+        self.status = 200
+
+        def get(url, *args, **kwargs):
+            if url == ESI_URL + "/universe/regions/":
+                return response(self.status, list(DETAILS))
+            region_id = int(url.rstrip("/").rsplit("/", 1)[1])
+            return response(self.status, DETAILS[region_id], time.time() - 1)
+
+        refresher.get = Mock(side_effect=get)
+        return refresher
+
+    def test_refresh(self, refresher, settings):
+        refresher.refresh_regions()
+        expected = [
+            {"name": "Derelik", "region_id": 10000001, "known_space": True},
+            {"name": "A-R00001", "region_id": 11000001, "known_space": False},
+        ]
+        assert settings.regions == expected
+        assert json.load(open(settings.paths[REGIONS])) == expected
+        assert refresher.get.call_count == 3
+        assert refresher.next_poll > time.time()
+
+    def test_unchanged_not_written(self, refresher, settings):
+        refresher.refresh_regions()
+        settings.save = Mock()
+        self.status = 304
+        refresher.refresh_regions()
+        settings.save.assert_not_called()
+        assert len(settings.regions) == 2
+
+    def test_error_requested_again(self, refresher):
+        self.status = 420
+        refresher.refresh_regions()
+        assert refresher.expires == {}
+        self.status = 200
+        refresher.get.reset_mock()
+        refresher.refresh_regions()
+        assert refresher.get.call_count == 3
+
+    def test_not_requested_before_expiry(self, refresher):
+        refresher.refresh_regions()
+        refresher.expires[ESI_URL + "/universe/regions/"] = time.time() + 60
+        refresher.expires[ESI_URL + "/universe/regions/10000001/"] = time.time() + 60
+        refresher.get.reset_mock()
+        refresher.refresh_regions()
+        refresher.get.assert_called_once_with(
+            ESI_URL + "/universe/regions/11000001/", {200, 304}
+        )
+
+    def test_unknown_region_not_modified(self, refresher, settings):
+        refresher.refresh_regions()
+        settings.save(REGIONS, [settings.regions[0]])
+        url = ESI_URL + "/universe/regions/11000001/"
+        refresher.get_etags[url] = '"etag"'
+        self.status = 304
+        refresher.refresh_regions()
+        assert len(settings.regions) == 1
+        # fetched in full next time
+        assert url not in refresher.get_etags and url not in refresher.expires
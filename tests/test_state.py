@@ -0,0 +1,83 @@
+import pytest
+from unittest.mock import Mock
+
+from eve_monitor.state import CONTRACTS, ORDERS, StateIndex
+
+
+def order(order_id, price):
+    return {"order_id": order_id, "price": price}
+
+
+class TestStateIndex:
+    @pytest.fixture
+    def index(self):
+        return StateIndex(max_contracts=3)
+
+    def test_set_orders(self, index):
+        index.set_orders(34, "Tritanium", 10, 1, [order(1, 9), order(2, 5)])
+        index.set_orders(34, "Tritanium", 10, 2, [order(3, 7)])
+        result = index.get_orders()
+        assert result["total"] == 1
+        item = result["items"][0]
+        assert item["name"] == "Tritanium"
+        assert item["threshold"] == 10
+        assert [(o["region_id"], o["order_id"]) for o in item["orders"]] == [
+            (1, 2),
+            (2, 3),
+            (1, 1),
+        ]
+
+    def test_set_orders_replaces_region(self, index):
+        index.set_orders(34, "Tritanium", 10, 1, [order(1, 9)])
+        index.set_orders(34, "Tritanium", 10, 1, [order(2, 8)])
+        assert [o["order_id"] for o in index.get_orders()["items"][0]["orders"]] == [2]
+        index.set_orders(34, "Tritanium", 10, 1, [])
+        assert index.get_orders()["items"][0]["orders"] == []
+
+    def test_version_only_bumped_on_change(self, index):
+        etag = index.etag(ORDERS)
+        index.set_orders(34, "Tritanium", 10, 1, [order(1, 9)])
+        changed = index.etag(ORDERS)
+        assert changed != etag
+        index.set_orders(34, "Tritanium", 10, 1, [order(1, 9)])
+        assert index.etag(ORDERS) == changed
+        index.set_orders(34, "Tritanium", 11, 1, [order(1, 9)])
+        assert index.etag(ORDERS) != changed
+
+    def test_etag_differs_between_processes(self, index):
+        assert index.etag(ORDERS) != StateIndex().etag(ORDERS)
+
+    def test_retain_targets(self, index):
+        index.set_orders(34, "Tritanium", 10, 1, [order(1, 9)])
+        index.set_orders(35, "Pyerite", 10, 1, [order(2, 9)])
+        etag = index.etag(ORDERS)
+        index.retain_targets({35, 36})
+        assert [i["type_id"] for i in index.get_orders()["items"]] == [35]
+        assert index.etag(ORDERS) != etag
+
+    def test_orders_pagination(self, index):
+        for type_id in range(5):
+            index.set_orders(type_id, str(type_id), 10, 1, [])
+        result = index.get_orders(1, 2)
+        assert result["total"] == 5
+        assert [i["type_id"] for i in result["items"]] == [1, 2]
+
+    def test_contracts_newest_first_and_bounded(self, index):
+        for contract_id in range(5):
+            index.add_contract({"contract_id": contract_id})
+        result = index.get_contracts()
+        assert result["total"] == 3
+        assert [c["contract_id"] for c in result["items"]] == [4, 3, 2]
+        assert "valued_at" in result["items"][0]
+        assert [c["contract_id"] for c in index.get_contracts(1, 1)["items"]] == [3]
+        assert index.etag(CONTRACTS).endswith("-5")
+
+    def test_features(self, index):
+        feature = Mock()
+        feature.name = "market_monitor"
+        feature.next_poll = float("inf")
+        feature.history = [1, 2]
+        index.register_feature(feature)
+        assert index.get_features()["items"] == [
+            {"name": "market_monitor", "next_poll": None, "history_size": 2}
+        ]
@@ -0,0 +1,86 @@
+import collections
+import gzip
+import json
+
+import pytest
+
+from benchmarks import synthetic
+from benchmarks.fake_esi import FakeEsiConfig
+from benchmarks.sde import build_sde
+from benchmarks.synthetic import SHIP, SyntheticUniverse
+
+
+class TestSyntheticUniverse:
+    def test_deterministic(self, universe):
+        other = SyntheticUniverse(seed=0, now=universe.now)
+        assert list(other.orders(100)) == list(universe.orders(100))
+        assert list(other.contracts(20)) == list(universe.contracts(20))
+        different = SyntheticUniverse(seed=1, now=universe.now)
+        assert list(different.orders(100)) != list(universe.orders(100))
+
+    def test_orders_shape(self, universe):
+        orders = list(universe.orders(20_000))
+        assert len({o["order_id"] for o in orders}) == len(orders)
+        assert set(orders[0]) >= {
+            "order_id",
+            "type_id",
+            "is_buy_order",
+            "price",
+            "volume_remain",
+            "volume_total",
+            "issued",
+            "location_id",
+            "system_id",
+        }
+        assert all(1 <= o["volume_remain"] <= o["volume_total"] for o in orders)
+        buy_share = sum(o["is_buy_order"] for o in orders) / len(orders)
+        assert buy_share == pytest.approx(synthetic.BUY_SHARE, abs=0.02)
+
+    def test_type_distribution_follows_categories(self, universe):
+        counts = collections.Counter(
+            universe.categories[o["type_id"]] for o in universe.orders(20_000)
+        )
+        profiles = synthetic.CATEGORY_PROFILES
+        shares = {c: profiles[c][0] for c in set(universe.categories.values())}
+        for category, share in shares.items():
+            expected = share / sum(shares.values())
+            assert counts[category] / 20_000 == pytest.approx(expected, abs=0.02)
+
+    def test_orders_of_type(self, universe):
+        orders = list(universe.orders(50, type_id=1000, region_id=10000001))
+        assert {o["type_id"] for o in orders} == {1000}
+        sells = [o["price"] for o in orders if not o["is_buy_order"]]
+        assert min(sells) > universe.base_price(1000) / 2
+
+    def test_contracts_mixed(self, universe):
+        contracts = list(universe.contracts(2000))
+        counts = collections.Counter(c["type"] for c in contracts)
+        assert counts.keys() == set(synthetic.CONTRACT_TYPES)
+        assert counts["item_exchange"] > counts["courier"] > counts["auction"]
+        assert all("buyout" in c for c in contracts if c["type"] == "auction")
+        assert all("collateral" in c for c in contracts if c["type"] == "courier")
+
+    def test_contract_sizes_long_tailed(self, universe):
+        sizes = [len(universe.contract_items(cid)) for cid in range(1, 5001)]
+        assert min(sizes) == 1
+        assert sorted(sizes)[len(sizes) // 2] <= 3
+        assert max(sizes) > 10
+
+    def test_from_sde(self, tmp_path):
+        path = str(tmp_path / "sde.sqlite")
+        build_sde(path, FakeEsiConfig(types=6))
+        universe = SyntheticUniverse.from_sde(path)
+        assert len(universe.type_ids) == 6
+        assert universe.categories[1000] == SHIP
+
+    def test_write_jsonl(self, universe, tmp_path):
+        path = str(tmp_path / "orders.jsonl.gz")
+        assert synthetic.write_jsonl(universe.orders(1000), path) == 1000
+        with gzip.open(path, "rt") as f:
+            assert json.loads(next(f)) == next(universe.orders(1000))
+
+    def test_cli(self, tmp_path, capsys):
+        path = str(tmp_path / "contracts.jsonl")
+        assert synthetic.main(["contracts", "10", path]) == 0
+        assert len(open(path).readlines()) == 10
+        assert "10 contracts" in capsys.readouterr().out
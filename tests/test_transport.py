@@ -0,0 +1,181 @@
+import os
+import random
+import shutil
+
+import pytest
+import requests
+
+from benchmarks.fake_esi import FakeEsi, FakeEsiConfig
+from eve_monitor import http_pool, transport
+from eve_monitor.transport import (
+    CaptureWriter,
+    RecordingAdapter,
+    ReplayAdapter,
+    ReplayMissError,
+    read_capture,
+)
+
+
+@pytest.fixture(scope="module")
+def esi():
+    esi = FakeEsi(FakeEsiConfig(regions=1, types=2, contracts=10))
+    esi.start()
+    yield esi
+    esi.stop()
+
+
+@pytest.fixture
+def capture(tmp_path, esi):
+    """capture of a few requests against the fake esi"""
+    path = str(tmp_path / "capture.jsonl.gz")
+    writer = CaptureWriter(path)
+    s = requests.Session()
+    s.mount(esi.url, RecordingAdapter(writer))
+    region_id = esi.region_ids[0]
+    s.get(esi.esi_url + f"/markets/{region_id}/orders/", params={"type_id": 1000})
+    s.get(esi.esi_url + f"/markets/{region_id}/orders/", params={"type_id": 1001})
+    s.post(esi.appraisal_url, data=b"Type 1000\t2", headers={"X-ApiKey": "secret"})
+    s.get(esi.esi_url + "/universe/regions/")
+    s.get(esi.esi_url + "/universe/regions/")
+    writer.close()
+    return path
+
+
+def replay_session(esi, path, speed=transport.FAST) -> requests.Session:
+    s = requests.Session()
+    s.mount(esi.url, ReplayAdapter(read_capture(path), speed))
+    return s
+
+
+class TestRecordReplay:
+    def test_records_through_shared_pool(self, tmp_path, esi):
+        writer = CaptureWriter(str(tmp_path / "capture.jsonl.gz"))
+        s = requests.Session()
+        s.mount(esi.url, RecordingAdapter(writer))
+        # the next request gets a 503, the shared retry policy sends it again
+        esi.burst_left = 1
+        errors = esi.errors
+        res = s.get(esi.esi_url + "/universe/regions/")
+        writer.close()
+        assert res.status_code == 200
+        assert esi.errors == errors + 1
+        (record,) = read_capture(writer.path)
+        assert record["response"]["status"] == 200
+        assert http_pool.get_adapter().stats()["127.0.0.1"][0] > 0
+
+    def test_records_exchanges(self, capture):
+        records = read_capture(capture)
+        assert len(records) == 5
+        assert records[0]["response"]["status"] == 200
+        assert "ETag" in records[0]["response"]["headers"]
+        assert records[2]["request"]["headers"]["X-ApiKey"] == "<redacted>"
+        assert records[2]["request"]["text"] == "Type 1000\t2"
+
+    def test_replay_matches_live(self, esi, capture):
+        s = replay_session(esi, capture)
+        url = esi.esi_url + f"/markets/{esi.region_ids[0]}/orders/"
+        for type_id in (1001, 1000):
+            live = requests.get(url, params={"type_id": type_id})
+            replayed = s.get(url, params={"type_id": type_id})
+            assert replayed.status_code == 200
+            assert replayed.json() == live.json()
+            assert replayed.headers["ETag"] == live.headers["ETag"]
+        live = requests.post(esi.appraisal_url, data=b"Type 1000\t2")
+        res = s.post(esi.appraisal_url, data=b"Type 1000\t2")
+        assert res.json() == live.json()
+
+    def test_replay_does_not_touch_network(self, esi, capture):
+        s = replay_session(esi, capture)
+        before = esi.requests
+        s.get(esi.esi_url + "/universe/regions/")
+        assert esi.requests == before
+
+    def test_repeated_requests_in_order(self, esi, capture):
+        s = replay_session(esi, capture)
+        for _ in range(3):
+            assert s.get(esi.esi_url + "/universe/regions/").json() == esi.region_ids
+
+    def test_miss(self, esi, capture):
+        s = replay_session(esi, capture)
+        with pytest.raises(ReplayMissError):
+            s.get(esi.esi_url + "/universe/regions/1/")
+        with pytest.raises(ReplayMissError):
+            s.post(esi.appraisal_url, data=b"something else")
+
+    def test_original_speed(self, esi, capture, monkeypatch):
+        slept = []
+        monkeypatch.setattr(transport.time, "sleep", slept.append)
+        s = replay_session(esi, capture, transport.ORIGINAL)
+        s.get(esi.esi_url + "/universe/regions/")
+        assert slept == [read_capture(capture)[3]["elapsed"]]
+
+
+class TestMount:
+    def test_live_leaves_session(self, esi):
+        s = requests.Session()
+        transport.mount(s, [esi.url], transport.LIVE, "unused", transport.FAST)
+        assert esi.url not in s.adapters
+
+    def test_replay_shared(self, esi, capture):
+        sessions = [requests.Session(), requests.Session()]
+        for s in sessions:
+            transport.mount(s, [esi.url], transport.REPLAY, capture, transport.FAST)
+        assert sessions[0].adapters[esi.url] is sessions[1].adapters[esi.url]
+        transport.replays.clear()
+
+    def test_record_shared_writer(self, esi, tmp_path):
+        path = str(tmp_path / "nested" / "capture.jsonl.gz")
+        for _ in range(2):
+            s = requests.Session()
+            transport.mount(s, [esi.url], transport.RECORD, path, transport.FAST)
+            s.get(esi.esi_url + "/universe/regions/")
+        transport.close()
+        assert len(read_capture(path)) == 2
+
+
+class TestCaptureFile:
+    @pytest.fixture(autouse=True)
+    def flush_every_write(self, monkeypatch):
+        monkeypatch.setattr(transport, "FLUSH_INTERVAL", 0)
+
+    def records(self, start, n):
+        rng = random.Random(start)
+        return [
+            {"n": i, "data": rng.randbytes(40).hex()} for i in range(start, start + n)
+        ]
+
+    def killed(self, tmp_path, records) -> str:
+        """a capture as left by a process killed while recording"""
+        path = str(tmp_path / "capture.jsonl.gz")
+        writer = CaptureWriter(path)
+        for record in records:
+            writer.write(record)
+        copy = str(tmp_path / "killed.jsonl.gz")
+        shutil.copy(path, copy)
+        writer.close()
+        return copy
+
+    def test_writer_not_closed(self, tmp_path):
+        records = self.records(0, 200)
+        assert read_capture(self.killed(tmp_path, records)) == records
+
+    def test_cut_mid_record(self, tmp_path):
+        records = self.records(0, 200)
+        path = self.killed(tmp_path, records)
+        with open(path, "r+b") as f:
+            f.truncate(os.path.getsize(path) // 2)
+        read = read_capture(path)
+        assert 0 < len(read) < len(records)
+        assert read == records[: len(read)]
+
+    @pytest.mark.parametrize("chunk", [7, 64, transport.READ_CHUNK])
+    def test_appended_after_cut(self, tmp_path, monkeypatch, chunk):
+        monkeypatch.setattr(transport, "READ_CHUNK", chunk)
+        records = self.records(0, 200)
+        path = self.killed(tmp_path, records)
+        appended = self.records(200, 3)
+        writer = CaptureWriter(path)
+        for record in appended:
+            writer.write(record)
+        writer.close()
+        assert read_capture(path) == records + appended
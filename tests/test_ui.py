@@ -0,0 +1,195 @@
+import time
+from unittest.mock import Mock
+
+import pytest
+
+import ui
+from eve_monitor.archive import ContractArchive
+from eve_monitor.log_stream import LogStream
+from eve_monitor.region_refresher import RegionRefresher
+from eve_monitor.state import StateIndex
+
+
+class TestLogUpdates:
+    @pytest.fixture(autouse=True)
+    def log_stream(self, monkeypatch):
+        log_stream = LogStream(3)
+        monkeypatch.setattr(ui, "log_stream", log_stream)
+        return log_stream
+
+    def connect(self, auth=None) -> list[dict]:
+        client = ui.socketio.test_client(ui.app, auth=auth)
+        received = [r["args"][0] for r in client.get_received()]
+        client.disconnect()
+        return received
+
+    def log(self, log_stream, text):
+        """log lines that were broadcast already"""
+        log_stream.append(text)
+        log_stream.drain()
+
+    def test_connect_sends_backlog(self, log_stream):
+        self.log(log_stream, "a\nb\nc\nd")
+        assert self.connect() == [{"seq": 2, "lines": ["b", "c", "d"], "refresh": True}]
+
+    def test_connect_empty_backlog(self):
+        assert self.connect() == [{"seq": 1, "lines": [], "refresh": True}]
+
+    def test_reconnect_resumes(self, log_stream):
+        self.log(log_stream, "a\nb\nc\nd")
+        assert self.connect({"last_seq": 2}) == [
+            {"seq": 3, "lines": ["c", "d"], "refresh": False}
+        ]
+        assert self.connect({"last_seq": 4}) == []
+
+    def test_reconnect_too_far_behind(self, log_stream):
+        self.log(log_stream, "a\nb\nc\nd\ne")
+        assert self.connect({"last_seq": 1}) == [
+            {"seq": 3, "lines": ["c", "d", "e"], "refresh": True}
+        ]
+
+    def test_connect_then_update(self, log_stream):
+        """lines pending at connect are only sent by the next broadcast"""
+        self.log(log_stream, "a")
+        log_stream.append("b")
+        client = ui.socketio.test_client(ui.app)
+        log_stream.append("c")
+        ui.publish()
+        received = [r["args"][0] for r in client.get_received()]
+        client.disconnect()
+        assert received == [
+            {"seq": 1, "lines": ["a"], "refresh": True},
+            {"seq": 2, "lines": ["b", "c"], "refresh": False},
+        ]
+
+    def test_connect_before_first_broadcast(self, log_stream):
+        log_stream.append("a")
+        assert self.connect() == [{"seq": 1, "lines": [], "refresh": True}]
+        assert self.connect({"last_seq": 0}) == []
+
+    def test_batch(self, log_stream):
+        log_stream.append("a\nb")
+        assert ui.batch(log_stream.drain()) == {
+            "seq": 1,
+            "lines": ["a", "b"],
+            "refresh": False,
+        }
+
+
+class TestApi:
+    @pytest.fixture(autouse=True)
+    def state(self, monkeypatch):
+        state = StateIndex()
+        monkeypatch.setattr(ui, "state", state)
+        return state
+
+    @pytest.fixture
+    def client(self):
+        return ui.app.test_client()
+
+    def test_orders(self, client, state):
+        state.set_orders(34, "Tritanium", 10, 1, [{"order_id": 1, "price": 9}])
+        res = client.get("/api/orders")
+        assert res.status_code == 200
+        assert res.json["total"] == 1
+        assert res.json["items"][0]["orders"][0]["order_id"] == 1
+
+    def test_arbitrage(self, client, state):
+        etag = client.get("/api/arbitrage").headers["ETag"]
+        state.set_opportunities([{"type_id": 34, "profit": 1}])
+        res = client.get("/api/arbitrage", headers={"If-None-Match": etag})
+        assert res.status_code == 200
+        assert res.json["items"] == [{"type_id": 34, "profit": 1}]
+
+    def test_not_modified(self, client, state):
+        etag = client.get("/api/contracts").headers["ETag"]
+        res = client.get("/api/contracts", headers={"If-None-Match": etag})
+        assert res.status_code == 304
+        assert res.data == b""
+        state.add_contract({"contract_id": 1})
+        res = client.get("/api/contracts", headers={"If-None-Match": etag})
+        assert res.status_code == 200
+        assert res.headers["ETag"] != etag
+
+    def test_pagination(self, client, state):
+        for contract_id in range(5):
+            state.add_contract({"contract_id": contract_id})
+        res = client.get("/api/contracts?offset=1&limit=2")
+        assert res.json["offset"] == 1
+        assert res.json["total"] == 5
+        assert [c["contract_id"] for c in res.json["items"]] == [3, 2]
+
+    def test_limit_capped(self, client, state, monkeypatch):
+        monkeypatch.setattr(ui, "MAX_PAGE_SIZE", 2)
+        for contract_id in range(5):
+            state.add_contract({"contract_id": contract_id})
+        res = client.get("/api/contracts?limit=100")
+        assert len(res.json["items"]) == 2
+
+    def test_features_without_history(self, client, state):
+        state.register_feature(RegionRefresher())
+        res = client.get("/api/features")
+        assert res.status_code == 200
+        assert res.json["items"] == [
+            {"name": "region_refresher", "next_poll": None, "history_size": None}
+        ]
+
+    def test_features(self, client):
+        res = client.get("/api/features")
+        assert res.json == {"offset": 0, "total": 0, "items": []}
+        res = client.get(
+            "/api/features", headers={"If-None-Match": res.headers["ETag"]}
+        )
+        assert res.status_code == 304
+
+
+class TestMetricsEndpoint:
+    def test_metrics(self):
+        res = ui.app.test_client().get("/metrics")
+        assert res.status_code == 200
+        assert res.mimetype == "text/plain"
+        assert "# TYPE http_request_duration_seconds histogram" in res.text
+
+
+class TestArchive:
+    @pytest.fixture
+    def client(self, tmp_path, monkeypatch):
+        path = str(tmp_path / "contracts.db")
+        db = ContractArchive(path, retention_days=30)
+        for contract_id, type_ in [(1, (34, "Tritanium", 1, True)), (2, None)]:
+            db.add(
+                10000002,
+                {
+                    "contract_id": contract_id,
+                    "start_location_id": 60003760,
+                    "issuer_id": 1,
+                    "title": "",
+                    "price": 100.0 * contract_id,
+                    "volume": 1.0,
+                    "date_issued": time.strftime(
+                        "%Y-%m-%dT%H:%M:%SZ",
+                        time.gmtime(time.time() - 10 + contract_id),
+                    ),
+                },
+                [type_] if type_ else [],
+                1000.0,
+                0.0,
+                False,
+            )
+        db.close()
+        monkeypatch.setattr(ui, "settings", Mock(archive_db=path, regions=[]))
+        return ui.app.test_client()
+
+    def test_api(self, client):
+        res = client.get("/api/archive?type=Tritanium")
+        assert [c["contract_id"] for c in res.json["items"]] == [1]
+        res = client.get("/api/archive?type=34&max_price=150")
+        assert [c["contract_id"] for c in res.json["items"]] == [1]
+        res = client.get("/api/archive?limit=1")
+        assert res.json["more"] is True
+        assert [c["contract_id"] for c in res.json["items"]] == [2]
+
+    def test_page(self, client):
+        res = client.get("/archive?type=Tritanium")
+        assert res.status_code == 200
+        assert b"Tritanium" in res.data
@@ -0,0 +1,134 @@
+import sqlite3
+from unittest.mock import Mock
+
+import pytest
+
+from eve_monitor import universe
+from eve_monitor.core import Core
+from eve_monitor.universe import UNREACHABLE, JumpGraph, JumpIndex
+
+# 1 - 2 - 3 - 4 with a low sec shortcut 1 - 5 - 4, and 6 unconnected
+SYSTEMS = [
+    (1, 100, 0.9),
+    (2, 100, 0.8),
+    (3, 100, 0.7),
+    (4, 200, 0.5),
+    (5, 200, 0.2),
+    (6, 300, -0.5),
+]
+JUMPS = [(1, 2), (2, 3), (3, 4), (1, 5), (5, 4)]
+
+
+class TestJumpGraph:
+    @pytest.fixture
+    def graph(self):
+        return JumpGraph(SYSTEMS, JUMPS)
+
+    def neighbours(self, graph, system_id):
+        i = graph.index[system_id]
+        return {
+            graph.system_ids[j]
+            for j in graph.indices[graph.indptr[i] : graph.indptr[i + 1]]
+        }
+
+    def test_adjacency(self, graph):
+        assert len(graph) == 6
+        assert self.neighbours(graph, 1) == {2, 5}
+        assert self.neighbours(graph, 4) == {3, 5}
+        assert self.neighbours(graph, 6) == set()
+
+    def test_distances(self, graph):
+        assert list(graph.distances([1])) == [0, 1, 2, 2, 1, UNREACHABLE]
+
+    def test_distances_from_nearest_source(self, graph):
+        assert list(graph.distances([1, 3])) == [0, 1, 0, 1, 1, UNREACHABLE]
+
+    def test_safe_distances_avoid_low_sec(self, graph):
+        dist = graph.distances([1], safe=True)
+        # low sec 5 is reached but not routed through
+        assert list(dist) == [0, 1, 2, 3, 1, UNREACHABLE]
+
+    def test_unknown_source(self, graph):
+        assert set(graph.distances([7])) == {UNREACHABLE}
+
+
+class TestJumpIndex:
+    @pytest.fixture
+    def cur(self):
+        cur = sqlite3.connect(":memory:").cursor()
+        cur.executescript(
+            """
+            create table mapSolarSystems (solarSystemID integer, regionID integer, security real);
+            create table mapSolarSystemJumps (fromSolarSystemID integer, toSolarSystemID integer);
+            """
+        )
+        cur.executemany("insert into mapSolarSystems values (?, ?, ?)", SYSTEMS)
+        cur.executemany("insert into mapSolarSystemJumps values (?, ?)", JUMPS)
+        return cur
+
+    @pytest.fixture
+    def settings(self, monkeypatch):
+        settings = Mock(home_systems=[1], safe_routing=False, max_jumps=1)
+        monkeypatch.setattr(universe, "settings", settings)
+        return settings
+
+    def test_jumps(self, cur, settings):
+        index = JumpIndex()
+        assert index.update(cur)
+        assert index.jumps(4) == 2
+        assert index.jumps(7) is None
+        assert index.region_jumps(200) == 1
+        assert index.region_jumps(300) == UNREACHABLE
+
+    def test_recomputed_on_settings_change(self, cur, settings):
+        index = JumpIndex()
+        index.update(cur)
+        graph = index.graph
+        settings.safe_routing = True
+        index.update(cur)
+        assert index.jumps(4) == 3
+        # the graph itself is only read once
+        assert index.graph is graph
+
+    def test_no_home_systems(self, cur, settings):
+        settings.home_systems = []
+        index = JumpIndex()
+        assert not index.update(cur)
+        assert index.jumps(1) is None
+
+
+class TestCoreJumps:
+    @pytest.fixture
+    def core(self, monkeypatch):
+        class Feature(Core):
+            def main(self):
+                return
+
+        core = Feature("test")
+        core.cur.executescript(
+            """
+            create table mapSolarSystems (solarSystemID integer, regionID integer, security real);
+            create table mapSolarSystemJumps (fromSolarSystemID integer, toSolarSystemID integer);
+            """
+        )
+        core.cur.executemany("insert into mapSolarSystems values (?, ?, ?)", SYSTEMS)
+        core.cur.executemany("insert into mapSolarSystemJumps values (?, ?)", JUMPS)
+        settings = Mock(home_systems=[1], safe_routing=False, max_jumps=1)
+        monkeypatch.setattr(universe, "settings", settings)
+        monkeypatch.setattr("eve_monitor.core.settings", settings)
+        monkeypatch.setattr("eve_monitor.core.jump_index", JumpIndex())
+        return core
+
+    def test_too_far(self, core):
+        assert not core.too_far(2)
+        assert core.too_far(3)
+        assert core.too_far(6)
+        # unknown systems are kept
+        assert not core.too_far(7)
+        assert core.region_too_far(300)
+        assert not core.region_too_far(200)
+
+    def test_describe_jumps(self, core):
+        assert core.describe_jumps(3) == " (2 jumps)"
+        assert core.describe_jumps(6) == " (unreachable)"
+        assert core.describe_jumps(7) == ""
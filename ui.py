@@ -1,31 +1,46 @@
+import hashlib
+import json
 import logging
-import multiprocessing
-import select
 import signal
-import subprocess
 import sys
 import threading
-from flask import Flask, render_template, request
+import time
+from typing import Callable
+from flask import Flask, Response, jsonify, render_template, request
 from flask_socketio import SocketIO, emit
 
+import tasks
+from eve_monitor import archive, metrics
+from eve_monitor.config import settings
 from eve_monitor.constants import (
     MAIN_LOG_FILE,
     ERROR_LOG_FILE,
     NOTIFICATION_LOG_FILE,
-    DEBUG,
-    DECOUPLED_UI,
 )
-from tasks import main
+from eve_monitor.log_reader import LogIndex
+from eve_monitor.log_stream import LogStream, follow
+from eve_monitor.profiling import CPU, MEMORY, DEFAULT_DURATION, EXTENSIONS, profiler
+from eve_monitor.state import ARBITRAGE, CONTRACTS, ORDERS, state
 
 
 UPDATE = "update"
 SEND_LAST_LINES = 500
+FLUSH_INTERVAL = 0.5  # seconds to batch new log lines for
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_PROFILE_SECONDS = 300
 
 app = Flask(
     __name__, static_folder="frontend/static", template_folder="frontend/templates"
 )
 socketio = SocketIO(app)
 logger = logging.getLogger(__name__)
+log_stream = LogStream(SEND_LAST_LINES)
+# shared by all viewers, kept up to date on each request
+log_indexes = {
+    "/notifications": LogIndex(NOTIFICATION_LOG_FILE),
+    "/errors": LogIndex(ERROR_LOG_FILE),
+}
 
 
 @app.route("/")
@@ -36,62 +51,209 @@ def index():
 @app.route("/notifications")
 @app.route("/errors")
 def static_logs():
-    log_file_mapping = {
-        "/notifications": NOTIFICATION_LOG_FILE,
-        "/errors": ERROR_LOG_FILE,
+    """a page of log lines, ?before=<line> pages back from that line, ?q=<text> only shows lines containing text"""
+    before = request.args.get("before", type=int)
+    query = request.args.get("q", "")
+    lines, older = log_indexes[request.path].page(before, SEND_LAST_LINES, query)
+    return render_template(
+        "static_logs.html", logs=[line for _, line in lines], older=older, q=query
+    )
+
+
+@app.route("/arbitrage")
+def arbitrage():
+    return render_template(
+        "arbitrage.html", opportunities=state.get_opportunities()["items"]
+    )
+
+
+def api_response(etag: str, build: Callable[[int, int], dict]) -> Response:
+    """
+    answers 304 without building the body when the client already has etag,
+    otherwise the page of build(offset, limit) given by ?offset=&limit=
+    """
+    if request.if_none_match.contains(etag):
+        res = Response(status=304)
+    else:
+        offset = max(0, request.args.get("offset", 0, type=int))
+        limit = request.args.get("limit", DEFAULT_PAGE_SIZE, type=int)
+        res = jsonify(
+            {"offset": offset, **build(offset, min(max(0, limit), MAX_PAGE_SIZE))}
+        )
+    res.set_etag(etag)
+    return res
+
+
+@app.route("/api/orders")
+def api_orders():
+    """current orders below threshold per target"""
+    return api_response(state.etag(ORDERS), state.get_orders)
+
+
+@app.route("/api/contracts")
+def api_contracts():
+    """recent contract valuations, newest first"""
+    return api_response(state.etag(CONTRACTS), state.get_contracts)
+
+
+@app.route("/api/arbitrage")
+def api_arbitrage():
+    """most profitable cross region spreads"""
+    return api_response(state.etag(ARBITRAGE), state.get_opportunities)
+
+
+@app.route("/api/features")
+def api_features():
+    """history size and next poll time of running features"""
+    features = state.get_features()
+    # cheap enough to build every time, etag only saves the transfer
+    etag = hashlib.sha1(json.dumps(features).encode()).hexdigest()
+    return api_response(
+        etag,
+        lambda offset, limit: {
+            "total": features["total"],
+            "items": features["items"][offset : offset + limit],
+        },
+    )
+
+
+def archive_page(offset: int, limit: int) -> dict:
+    """
+    archived contracts filtered by the query string, ?type= takes a type id or an exact type name,
+    ?region=<region id>&min_price=&max_price= and ?days= for those issued in the last days
+    """
+    type_ = request.args.get("type", "").strip()
+    days = request.args.get("days", type=float)
+    return archive.search(
+        settings.archive_db,
+        type_id=int(type_) if type_.isdigit() else None,
+        type_name=type_ if type_ and not type_.isdigit() else None,
+        region_id=request.args.get("region", type=int),
+        min_price=request.args.get("min_price", type=float),
+        max_price=request.args.get("max_price", type=float),
+        since=time.time() - days * archive.DAY if days else None,
+        offset=offset,
+        limit=limit,
+    )
+
+
+@app.route("/archive")
+def archive_search():
+    offset = max(0, request.args.get("offset", 0, type=int))
+    regions = sorted(settings.regions, key=lambda r: r["name"])
+    return render_template(
+        "archive.html",
+        offset=offset,
+        page_size=DEFAULT_PAGE_SIZE,
+        regions=regions,
+        region_names={r["region_id"]: r["name"] for r in regions},
+        **archive_page(offset, DEFAULT_PAGE_SIZE),
+    )
+
+
+@app.route("/api/archive")
+def api_archive():
+    """archived contracts with their items, newest first, see archive_page for filters"""
+    offset = max(0, request.args.get("offset", 0, type=int))
+    limit = request.args.get("limit", DEFAULT_PAGE_SIZE, type=int)
+    return jsonify(
+        {"offset": offset, **archive_page(offset, min(max(0, limit), MAX_PAGE_SIZE))}
+    )
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """prometheus scrape endpoint"""
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/debug/profile/<kind>", methods=["POST"])
+def start_profile(kind: str):
+    """start a cpu or memory profile of ?seconds=, features keep polling meanwhile"""
+    if kind not in (CPU, MEMORY):
+        return jsonify({"error": f"unknown profile kind {kind}"}), 404
+    seconds = request.args.get("seconds", DEFAULT_DURATION, type=float)
+    seconds = min(max(0, seconds), MAX_PROFILE_SECONDS)
+    if not profiler.start(kind, seconds, tasks.feature_threads()):
+        return jsonify({"error": f"a {kind} profile is already running"}), 409
+    return jsonify({"kind": kind, "seconds": seconds}), 202
+
+
+@app.route("/debug/profile/<kind>")
+def download_profile(kind: str):
+    """last result of a profile, ?format= collapsed or pstats for cpu, top by default"""
+    fmt = request.args.get("format", "top")
+    result = profiler.result(kind, fmt)
+    if result is None:
+        status = "running" if profiler.is_running(kind) else "not available"
+        return jsonify({"error": f"{kind} {fmt} profile {status}"}), 404
+    return Response(
+        result,
+        mimetype="application/octet-stream" if fmt == "pstats" else "text/plain",
+        headers={
+            "Content-Disposition": f"attachment; filename={kind}{EXTENSIONS[fmt]}"
+        },
+    )
+
+
+def batch(
+    lines: list[tuple[int, str]], refresh: bool = False, upto: int | None = None
+) -> dict:
+    """update payload, seq is that of the first line, or the one after upto, by default the last drained"""
+    if upto is None:
+        upto = log_stream.drained
+    return {
+        "seq": lines[0][0] if lines else upto + 1,
+        "lines": [line for _, line in lines],
+        "refresh": refresh,
     }
-    lines = tail(log_file_mapping[request.path], SEND_LAST_LINES)
-    lines = [str(line, "utf-8") for line in lines]
-    return render_template("static_logs.html", logs=lines)
 
 
 @socketio.on("connect")
-def handle_connect():
+def handle_connect(auth: dict | None = None):
+    """
+    resume from auth.last_seq when still buffered, send the whole backlog otherwise,
+    lines not drained yet are left to the next broadcast so they are not sent twice
+    """
     logger.info("client connected")
-    lines = tail(MAIN_LOG_FILE, SEND_LAST_LINES)
-    res = "Connected\n"
-    for line in lines:
-        res += str(line, "utf-8")
-    emit(UPDATE, (res, True))
+    last_seq = (auth or {}).get("last_seq")
+    # read before the lines, a drain in between only makes the reply shorter
+    upto = log_stream.drained
+    lines = log_stream.since(last_seq, upto) if isinstance(last_seq, int) else None
+    if lines is None:
+        emit(UPDATE, batch(log_stream.backlog(SEND_LAST_LINES, upto), True, upto))
+    elif lines:
+        emit(UPDATE, batch(lines))
     return
 
 
-def tail(file: str, n: int) -> list[bytes]:
-    """return last n lines from file f with unix tail"""
-    proc = subprocess.Popen(["tail", "-n", str(n), file], stdout=subprocess.PIPE)
-    if proc.stdout == None:  # only to suppress type warnings
-        raise Exception("unexpected error")
-    lines = proc.stdout.readlines()
-    return lines
+event = threading.Event()
 
 
-event = threading.Event()
+def publish():
+    """broadcast lines logged since the last broadcast"""
+    lines = log_stream.drain()
+    if lines:
+        socketio.emit(UPDATE, batch(lines))
+    return
 
 
 def update():
-    """broadcast log updates to connected clients"""
-    f = subprocess.Popen(
-        ["tail", "-Fn", "0", MAIN_LOG_FILE],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    )
-    p = select.poll()
-    if f.stdout == None:  # only to suppress type warnings
-        raise Exception("unexpected error")
-    p.register(f.stdout)
-    while True:
-        if p.poll(1):
-            line = str(f.stdout.readline(), "utf-8")
-            if line != "":
-                socketio.emit(UPDATE, line)
-        if event.is_set():
-            break
+    """broadcast batches of new log lines to connected clients"""
+    while not event.is_set():
+        # idle until something is logged, then give the batch time to fill up
+        if not log_stream.wait(1):
+            continue
+        event.wait(FLUSH_INTERVAL)
+        publish()
     return
 
 
 def handle_interrupt(_, __):
     event.set()
     logger.info("Interrupt received, exiting")
+    if not settings.decoupled_ui:
+        tasks.shutdown()
     sys.exit(0)
     return
 
@@ -99,7 +261,17 @@ def handle_interrupt(_, __):
 if __name__ == "__main__":
     signal.signal(signal.SIGINT, handle_interrupt)
     signal.signal(signal.SIGTERM, handle_interrupt)
-    if not DECOUPLED_UI:
-        multiprocessing.Process(target=main).start()
-    threading.Thread(target=update).start()
-    socketio.run(app, debug=DEBUG)
+    if settings.decoupled_ui:
+        # main functions log from another process, pick up their log file instead
+        threading.Thread(
+            target=follow,
+            args=(MAIN_LOG_FILE, log_stream, event, FLUSH_INTERVAL),
+            daemon=True,
+        ).start()
+    else:
+        tasks.install_profile_signal()
+        tasks.start([log_stream])
+        threading.Thread(target=tasks.serve_forever, daemon=True).start()
+    threading.Thread(target=update, daemon=True).start()
+    # reloader would start the main functions a second time
+    socketio.run(app, debug=settings.debug, use_reloader=False)